@@ -0,0 +1,96 @@
+# 📍 payments/benchmarks/import_time.py
+"""
+Guard waktu import: tiap module di-import di interpreter baru, diukur
+dengan `python -X importtime`, lalu dicek:
+  - total waktu import di bawah budget (ms)
+  - tidak ada module berat yang ikut ter-import (mis. `supabase`)
+  - import tidak memasang handler di root logger (logging.basicConfig)
+
+    python benchmarks/import_time.py            # exit 1 kalau ada yang lewat budget
+    IMPORT_BUDGET_SCALE=2 python benchmarks/import_time.py
+"""
+
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module → (budget ms, module yang tidak boleh ikut ter-import)
+TARGETS = {
+    "lib.supabase_client": (100, ("supabase", "dotenv")),
+    "lib.repository": (100, ("supabase",)),
+    "gateaway.flip": (250, ("supabase", "config")),
+    "gateaway.midtrans": (250, ("supabase", "config")),
+    "disbursement.flip_disburse": (300, ("supabase",)),
+    "disbursement.midtrans_disburse": (300, ("supabase",)),
+    "webhooks.midtrans.payment": (400, ("supabase", "httpx")),
+    "webhooks.flip.payment": (400, ("supabase", "httpx")),
+    "webhooks.midtrans.disbursement": (400, ("supabase", "httpx")),
+    "webhooks.flip.disbursement": (400, ("supabase", "httpx")),
+}
+
+_PROBE = """
+import logging, sys
+import {module}
+forbidden = [m for m in {forbidden!r} if m in sys.modules]
+print("FORBIDDEN=" + ",".join(forbidden))
+print("ROOT_HANDLERS=" + str(len(logging.getLogger().handlers)))
+"""
+
+
+def measure(module: str, forbidden: tuple[str, ...]) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, forbidden=forbidden)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "import gagal"}
+
+    # Baris terakhir -X importtime untuk module target = waktu kumulatif (us)
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if parts[2] == module and parts[1].isdigit():
+            cumulative_us = int(parts[1])
+
+    out = dict(line.split("=", 1) for line in proc.stdout.strip().splitlines() if "=" in line)
+    return {
+        "ms": cumulative_us / 1000,
+        "forbidden": [m for m in out.get("FORBIDDEN", "").split(",") if m],
+        "root_handlers": int(out.get("ROOT_HANDLERS", "0")),
+    }
+
+
+def main() -> int:
+    scale = float(os.getenv("IMPORT_BUDGET_SCALE", "1"))
+    failed = False
+    for module, (budget, forbidden) in TARGETS.items():
+        result = measure(module, forbidden)
+        if "error" in result:
+            print(f"❌ {module}: {result['error']}")
+            failed = True
+            continue
+
+        problems = []
+        if result["ms"] > budget * scale:
+            problems.append(f"{result['ms']:.1f}ms > budget {budget * scale:.0f}ms")
+        if result["forbidden"]:
+            problems.append(f"ikut import {', '.join(result['forbidden'])}")
+        if result["root_handlers"]:
+            problems.append("memasang handler di root logger")
+
+        if problems:
+            failed = True
+            print(f"❌ {module}: {'; '.join(problems)}")
+        else:
+            print(f"✅ {module}: {result['ms']:.1f}ms (budget {budget * scale:.0f}ms)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+# 📍 payments/benchmarks/run.py
+"""
+Benchmark offline: semua call gateway & Supabase diarahkan ke stub lokal
+(benchmarks/stubs.py), jadi tidak butuh sandbox Midtrans / Flip / Supabase.
+
+    python -m benchmarks.run                                  # semua skenario
+    python -m benchmarks.run -s flip_disburse -n 2000 -c 100
+    python -m benchmarks.run --latency 0.02 --error-rate 0.01
+    python -m benchmarks.run --save-baseline                  # tulis benchmarks/baseline.json
+    python -m benchmarks.run --threshold 0.2                  # exit 1 kalau regresi > 20%
+
+Tiap skenario melaporkan request/detik, p50 dan p99 latency (ms). Kalau
+benchmarks/baseline.json ada, rps yang turun atau p99 yang naik melebihi
+--threshold dianggap regresi.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from benchmarks.stubs import StubConfig, GatewayStub, FakePostgrest
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CALLBACK_TOKEN = "bench-callback-token"
+# Key Supabase dummy, formatnya harus mirip JWT supaya lolos validasi client
+SUPABASE_KEY = "bench.bench.bench"
+
+
+# ================= Wiring =================
+def configure(gateway_url: str, postgrest_url: str):
+    """Arahkan semua config factory package ke stub. Dipanggil sebelum call pertama."""
+    os.environ.update({
+        "SUPABASE_URL": postgrest_url,
+        "SUPABASE_KEY": SUPABASE_KEY,
+        "FLIP_SECRET_KEY": "bench",
+        "FLIP_CALLBACK_TOKEN": CALLBACK_TOKEN,
+        "MIDTRANS_DISBURSEMENT_KEY": "bench",
+        "MIDTRANS_BASE_URL": f"{gateway_url}/iris/api/v1/payouts",
+    })
+
+    from gateaway import flip, midtrans
+    from disbursement import flip_disburse, midtrans_disburse
+
+    midtrans.get_midtrans_config = lambda: {
+        "snap_url": f"{gateway_url}/snap/v1/transactions",
+        "api_url": f"{gateway_url}/v2",
+        "headers": {"Accept": "application/json", "Content-Type": "application/json",
+                    "Authorization": "Basic YmVuY2g6"},
+    }
+    flip.get_flip_config = lambda: {"api_key": "bench", "base_url": f"{gateway_url}/v1"}
+    flip_disburse.get_flip_disburse_config = lambda: {
+        "env": "production", "base_url": f"{gateway_url}/bigflip", "auth_header": "Basic YmVuY2g6",
+    }
+    midtrans_disburse.get_iris_config.cache_clear()
+
+
+def build_app():
+    from fastapi import FastAPI
+    from webhooks.midtrans.payment import router as midtrans_payment
+    from webhooks.flip.payment import router as flip_payment
+    from webhooks.midtrans.disbursement import router as midtrans_disbursement
+    from webhooks.flip.disbursement import router as flip_disbursement
+
+    app = FastAPI()
+    for router in (midtrans_payment, flip_payment, midtrans_disbursement, flip_disbursement):
+        app.include_router(router)
+    return app
+
+
+def _order(i: int, gateway: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "order_id": f"WD-{i}", "token": "USDT", "amount_idr": 150_000,
+        "payout_bank": "BCA", "payout_name": "Bench User", "payout_account": f"{1_000_000 + i}",
+        "payout_gateway": gateway, "status": "pending",
+    }
+
+
+# ================= Skenario =================
+# Tiap skenario: async fn(ctx) → list coroutine factory `op(i)`; satu op = satu sampel latency.
+# Data di-seed untuk ctx.rows index: 0..requests-1 diukur, sisanya dipakai warmup,
+# jadi op yang diukur tidak kena row yang sudah diproses warmup (mis. order sudah dispatch).
+
+async def scenario_midtrans_create(ctx):
+    from gateaway.midtrans import create_midtrans_transaction
+
+    return lambda i: create_midtrans_transaction(f"ORD-{uuid.uuid4().hex[:12]}", 10_000, "Bench", "bench@example.com")
+
+
+async def scenario_flip_create(ctx):
+    from gateaway.flip import FlipGateway
+
+    flip = FlipGateway()
+    return lambda i: flip.create_transaction(f"ORD-{i}", 10_000, "bca", "bni", f"{1_000_000 + i}", "Bench")
+
+
+async def scenario_flip_status(ctx):
+    from gateaway.flip import FlipGateway
+
+    flip = FlipGateway()
+    return lambda i: flip.get_transaction_status(str(i))
+
+
+async def scenario_flip_disburse(ctx):
+    from disbursement import flip_disburse
+
+    orders = [_order(i, "flip") for i in range(ctx.rows)]
+    ctx.db.seed("TransactionsJual", orders)
+    return lambda i: flip_disburse.disburse(orders[i])
+
+
+async def scenario_midtrans_disburse(ctx):
+    from disbursement import midtrans_disburse
+
+    orders = [_order(i, "midtrans") for i in range(ctx.rows)]
+    ctx.db.seed("TransactionsJual", orders)
+    return lambda i: midtrans_disburse.disburse(orders[i])
+
+
+async def _webhook_client(ctx):
+    import httpx
+
+    if ctx.client is None:
+        ctx.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app()), base_url="http://bench")
+    return ctx.client
+
+
+async def scenario_webhook_midtrans_payment(ctx):
+    client = await _webhook_client(ctx)
+    ctx.db.seed("Transactions", [
+        {"id": str(uuid.uuid4()), "order_id": f"WH-M-{i}", "transaction_status": "pending"}
+        for i in range(ctx.rows)
+    ])
+    return lambda i: client.post("/midtrans", json={
+        "order_id": f"WH-M-{i}", "transaction_status": "settlement", "transaction_id": str(uuid.uuid4()),
+        "payment_type": "qris", "gross_amount": "10000.00", "signature_key": "x" * 64,
+    })
+
+
+async def scenario_webhook_flip_payment(ctx):
+    client = await _webhook_client(ctx)
+    ctx.db.seed("Transactions", [
+        {"id": str(uuid.uuid4()), "transaction_id": f"WH-F-{i}", "transaction_status": "PENDING"}
+        for i in range(ctx.rows)
+    ])
+    return lambda i: client.post("/flip", json={"id": f"WH-F-{i}", "status": "SUCCESSFUL", "amount": 10_000})
+
+
+async def scenario_webhook_iris_disbursement(ctx):
+    client = await _webhook_client(ctx)
+    ctx.db.seed("Payouts", [
+        {"id": str(uuid.uuid4()), "midtrans_ref_id": f"WH-I-{i}", "status": "pending"} for i in range(ctx.rows)
+    ])
+    return lambda i: client.post("/disbursement/midtrans", json={"reference_no": f"WH-I-{i}", "status": "success"})
+
+
+async def scenario_webhook_flip_disbursement(ctx):
+    client = await _webhook_client(ctx)
+    ctx.db.seed("Payouts", [
+        {"id": str(uuid.uuid4()), "flip_ref_id": f"WH-D-{i}", "status": "pending"} for i in range(ctx.rows)
+    ])
+    return lambda i: client.post("/disbursement/flip", data={
+        "data": json.dumps({"id": f"WH-D-{i}", "status": "DONE"}), "token": CALLBACK_TOKEN,
+    })
+
+
+async def scenario_webhook_decode(ctx):
+    """CPU saja: decode + validasi + mapping kolom satu body webhook Midtrans."""
+    from webhooks.schemas import MidtransPayment
+
+    raw = json.dumps({
+        "order_id": "ORD-1", "transaction_status": "settlement", "transaction_id": str(uuid.uuid4()),
+        "payment_type": "qris", "gross_amount": "10000.00", "signature_key": "x" * 128,
+        "transaction_time": "2024-01-01 00:00:00", "fraud_status": "accept", "currency": "IDR",
+    }).encode()
+
+    async def op(i):
+        return MidtransPayment.decode(raw).changes()
+
+    return op
+
+
+SCENARIOS = {
+    "midtrans_create": scenario_midtrans_create,
+    "flip_create": scenario_flip_create,
+    "flip_status": scenario_flip_status,
+    "flip_disburse": scenario_flip_disburse,
+    "midtrans_disburse": scenario_midtrans_disburse,
+    "webhook_midtrans_payment": scenario_webhook_midtrans_payment,
+    "webhook_flip_payment": scenario_webhook_flip_payment,
+    "webhook_iris_disbursement": scenario_webhook_iris_disbursement,
+    "webhook_flip_disbursement": scenario_webhook_flip_disbursement,
+    "webhook_decode": scenario_webhook_decode,
+}
+
+
+# ================= Runner =================
+class Context:
+    def __init__(self, requests: int, gateway: GatewayStub, db: FakePostgrest, warmup: int = 0):
+        self.requests = requests
+        self.warmup = warmup
+        self.rows = requests + warmup  # index warmup: requests..rows-1
+        self.gateway = gateway
+        self.db = db
+        self.client = None
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def measure(op, requests: int, concurrency: int, offset: int = 0) -> dict:
+    """Jalankan op(offset)..op(offset + requests - 1) dengan `concurrency` worker."""
+    latencies: list[float] = []
+    errors = 0
+    next_index = iter(range(offset, offset + requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                result = await op(i)
+                if getattr(result, "status_code", 200) >= 400 or result is False:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Daftar regresi: rps turun / p99 naik lebih dari `threshold` dibanding baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {result['rps']} < baseline {base['rps']}")
+        if result["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {result['p99_ms']}ms > baseline {base['p99_ms']}ms")
+    return regressions
+
+
+async def run(args) -> dict:
+    stub_config = StubConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    gateway = await GatewayStub(stub_config).start()
+    db = await FakePostgrest(StubConfig(latency=args.db_latency)).start()
+    configure(gateway.url, db.url)
+
+    from lib.lifespan import startup, shutdown
+
+    await startup()
+    warmup = min(args.warmup, args.requests)
+    ctx = Context(args.requests, gateway, db, warmup)
+    results = {}
+    try:
+        for name in args.scenarios or SCENARIOS:
+            op = await SCENARIOS[name](ctx)
+            await measure(op, warmup, args.concurrency, offset=args.requests)
+            results[name] = await measure(op, args.requests, args.concurrency)
+            r = results[name]
+            print(f"{name:<28} {r['rps']:>9} req/s   p50 {r['p50_ms']:>8}ms   p99 {r['p99_ms']:>8}ms"
+                  f"   errors {r['errors']}")
+    finally:
+        if ctx.client is not None:
+            await ctx.client.aclose()
+        await shutdown()
+        await gateway.stop()
+        await db.stop()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenarios", nargs="*", choices=sorted(SCENARIOS))
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="latency stub gateway (detik)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="latency fake PostgREST (detik)")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", help="tulis hasil ke file JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline disimpan ke {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"❌ Regresi {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+# 📍 payments/benchmarks/stubs.py
+"""
+Stub server lokal untuk benchmark, tanpa dependency tambahan (asyncio murni):
+  - GatewayStub  : Snap, Midtrans Core v2, Flip v1, bigflip (bank list, inquiry,
+                   v3 disbursement), IRIS payouts
+  - FakePostgrest: /rest/v1/<table> (select eq / update / insert) + RPC
+                   apply_status_update & bulk_update, data in-memory
+
+Latency & error injection diatur lewat StubConfig, bisa per prefix path:
+
+    stub = GatewayStub(StubConfig(latency=0.02, error_rate=0.01),
+                       routes={"/bigflip/v3/disbursement": StubConfig(latency=0.2)})
+    await stub.start()   # stub.url → http://127.0.0.1:<port>
+"""
+
+import json
+import uuid
+import random
+import asyncio
+import itertools
+from dataclasses import dataclass
+from urllib.parse import urlsplit, parse_qsl
+
+_REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.0          # detik, ditambah tiap response
+    jitter: float = 0.0           # detik, acak 0..jitter ditambah ke latency
+    error_rate: float = 0.0       # peluang response error
+    error_status: int = 503
+
+    async def apply(self) -> bool:
+        """Tidur sesuai latency; return True kalau request ini harus dibalas error."""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        return bool(self.error_rate) and random.random() < self.error_rate
+
+
+class StubServer:
+    """HTTP/1.1 minimal (keep-alive, body Content-Length) di 127.0.0.1."""
+
+    def __init__(self, config: StubConfig | None = None, routes: dict[str, StubConfig] | None = None):
+        self.config = config or StubConfig()
+        self.routes = routes or {}
+        self.requests = 0
+        self._server: asyncio.AbstractServer | None = None
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _config_for(self, path: str) -> StubConfig:
+        for prefix, config in self.routes.items():
+            if path.startswith(prefix):
+                return config
+        return self.config
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                self.requests += 1
+                parts = urlsplit(target)
+                config = self._config_for(parts.path)
+                if await config.apply():
+                    status, payload = config.error_status, {"error": "injected"}
+                else:
+                    try:
+                        status, payload = await self.handle(method, parts.path, dict(parse_qsl(parts.query)),
+                                                            headers, body)
+                    except Exception as e:  # bug di stub tidak boleh mematikan koneksi
+                        status, payload = 500, {"error": str(e)}
+
+                data = b"" if payload is None else json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Status')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"{'Retry-After: 1' + chr(13) + chr(10) if status == 429 else ''}\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, method: str, path: str, query: dict, headers: dict, body: bytes):
+        return 404, {"error": f"no route {method} {path}"}
+
+
+def _parse_body(headers: dict, body: bytes) -> dict:
+    if not body:
+        return {}
+    if headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+        return dict(parse_qsl(body.decode()))
+    return json.loads(body)
+
+
+class GatewayStub(StubServer):
+    """
+    Path yang dilayani (prefix base URL yang dipakai benchmark):
+      POST /snap/v1/transactions                         Midtrans Snap
+      GET  /v2/{order_id}/status                         Midtrans Core API
+      POST /v1/transactions, GET /v1/transactions/{id}   Flip v1
+      GET  /bigflip/v2/general/banks                     bigflip bank list
+      POST /bigflip/v2/disbursement/bank-account-inquiry bigflip inquiry
+      POST /bigflip/v3/disbursement, GET /bigflip/v3/... bigflip disbursement
+      POST /iris/api/v1/payouts, GET /iris/api/v1/payouts/{ref}
+    """
+
+    BANKS = [{"bank_code": code, "name": name} for code, name in (
+        ("bca", "BCA"), ("bni", "BNI"), ("bri", "BRI"), ("mandiri", "Mandiri"), ("cimb", "CIMB Niaga"),
+    )]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ids = itertools.count(1)
+
+    async def handle(self, method, path, query, headers, body):
+        data = _parse_body(headers, body)
+
+        if path == "/snap/v1/transactions" and method == "POST":
+            token = uuid.uuid4().hex
+            return 201, {"token": token, "redirect_url": f"{self.url}/snap/v2/vtweb/{token}"}
+        if path.startswith("/v2/") and path.endswith("/status"):
+            return 200, {"order_id": path[4:-7], "transaction_status": "settlement", "status_code": "200"}
+
+        if path == "/v1/transactions" and method == "POST":
+            return 200, {**data, "id": next(self._ids), "status": "PENDING"}
+        if path.startswith("/v1/transactions/"):
+            return 200, {"id": path.rsplit("/", 1)[1], "status": "SUCCESSFUL"}
+
+        if path == "/bigflip/v2/general/banks":
+            return 200, self.BANKS
+        if path == "/bigflip/v2/disbursement/bank-account-inquiry":
+            return 200, {**data, "account_holder": "BENCH USER", "status": "SUCCESS"}
+        if path == "/bigflip/v3/disbursement" and method == "POST":
+            return 200, {"id": next(self._ids), "amount": data.get("amount"), "status": "pending"}
+        if path == "/bigflip/v3/disbursement":
+            return 200, {"data": [], "total_page": 1}
+        if path == "/bigflip/v3/get-disbursement":
+            return 200, {"id": query.get("id"), "status": "DONE"}
+
+        if path == "/iris/api/v1/payouts" and method == "POST":
+            return 201, {"payouts": [
+                {"status": "queued", "reference_no": uuid.uuid4().hex[:20]} for _ in data.get("payouts", [])
+            ]}
+        if path.startswith("/iris/api/v1/payouts/"):
+            return 200, {"reference_no": path.rsplit("/", 1)[1], "status": "completed"}
+
+        return await super().handle(method, path, query, headers, body)
+
+
+class FakePostgrest(StubServer):
+    """
+    Cukup untuk query yang dipakai lib/repository & lib/outbox: filter
+    `col=eq.` / `in.(..)` / `is.null` (boleh diawali `not.`), `or=(..)`,
+    limit, PATCH, POST (insert), dan RPC apply_status_update / bulk_update.
+    """
+
+    # Parameter query PostgREST yang bukan filter
+    RESERVED = ("select", "limit", "offset", "order", "on_conflict", "columns")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tables: dict[str, list[dict]] = {}
+        self._index: dict[tuple[str, str], dict] = {}
+
+    def seed(self, table: str, rows: list[dict]):
+        self.tables.setdefault(table, []).extend(rows)
+        self._index = {k: v for k, v in self._index.items() if k[0] != table}
+
+    def _lookup(self, table: str, column: str, value) -> dict | None:
+        index = self._index.get((table, column))
+        if index is None:
+            index = self._index[(table, column)] = {str(r.get(column)): r for r in self.tables.get(table, [])}
+        return index.get(str(value))
+
+    @staticmethod
+    def _split(text: str) -> list[str]:
+        """Pisah `a,b.in.(c,d)` di koma level teratas (koma di dalam kurung / kutip diabaikan)."""
+        parts, depth, quoted, current = [], 0, False, ""
+        for char in text:
+            if char == '"':
+                quoted = not quoted
+            elif not quoted and char in "()":
+                depth += 1 if char == "(" else -1
+            elif not quoted and depth == 0 and char == ",":
+                parts.append(current)
+                current = ""
+                continue
+            current += char
+        return parts + [current] if current else parts
+
+    @classmethod
+    def _condition(cls, expr: str):
+        """`op.value` → predicate(cell); mis. `eq.1`, `not.in.(a,b)`, `is.null`."""
+        negate = expr.startswith("not.")
+        op, _, arg = expr[4 if negate else 0:].partition(".")
+        if op == "eq":
+            test = lambda cell: str(cell) == arg.strip('"')
+        elif op == "in":
+            values = {v.strip('"') for v in cls._split(arg[1:-1])}
+            test = lambda cell: str(cell) in values
+        elif op == "is":
+            expected = {"null": None, "true": True, "false": False}[arg]
+            test = lambda cell: cell is expected
+        else:
+            raise ValueError(f"operator {op} tidak didukung FakePostgrest")
+        return (lambda cell: not test(cell)) if negate else test
+
+    def _filtered(self, table: str, query: dict) -> list[dict]:
+        filters = {k: v for k, v in query.items() if k not in self.RESERVED}
+        if len(filters) == 1:
+            (column, value), = filters.items()
+            if column != "or" and value.startswith("eq."):
+                row = self._lookup(table, column, value[3:])
+                return [row] if row else []
+
+        checks = []
+        for column, value in filters.items():
+            if column == "or":
+                # or=(col.op.value,col.op.value)
+                options = [(c, self._condition(e)) for c, _, e in (i.partition(".") for i in self._split(value[1:-1]))]
+                checks.append(lambda r, options=options: any(test(r.get(c)) for c, test in options))
+            else:
+                checks.append(lambda r, column=column, test=self._condition(value): test(r.get(column)))
+        return [r for r in self.tables.get(table, []) if all(check(r) for check in checks)]
+
+    async def handle(self, method, path, query, headers, body):
+        if not path.startswith("/rest/v1/"):
+            return await super().handle(method, path, query, headers, body)
+        name = path[len("/rest/v1/"):]
+        data = json.loads(body) if body else None
+
+        if name.startswith("rpc/"):
+            return self._rpc(name[4:], data or {})
+
+        if method == "GET":
+            rows = self._filtered(name, query)
+            return 200, rows[: int(query["limit"])] if "limit" in query else rows
+        if method == "PATCH":
+            rows = self._filtered(name, query)
+            for row in rows:
+                row.update(data)
+            return 200, rows
+        if method == "POST":
+            rows = data if isinstance(data, list) else [data]
+            rows = [{"id": r.get("id") or str(uuid.uuid4()), **r} for r in rows]
+            self.seed(name, rows)
+            return 201, rows
+        return 405, {"error": "method not allowed"}
+
+    def _rpc(self, fn: str, args: dict):
+        if fn == "apply_status_update":
+            row = self._lookup(args["p_table"], args["p_key"], args["p_value"])
+            if row is None:
+                return 200, {"found": False, "applied": False, "previous": None}
+            previous = dict(row)
+            ranks = args.get("p_ranks") or {}
+            old_rank = ranks.get(str(row.get(args["p_status_column"]) or "").lower())
+            new_rank = ranks.get(str(args["p_changes"].get(args["p_status_column"]) or "").lower())
+            applied = old_rank is None or new_rank is None or new_rank > old_rank
+            if applied:
+                row.update(args["p_changes"])
+            columns = args.get("p_columns")
+            if columns:
+                previous = {k: v for k, v in previous.items() if k in columns}
+            return 200, {"found": True, "applied": applied, "previous": previous}
+        if fn == "bulk_update":
+            updated = 0
+            for change in args.get("p_rows") or []:
+                row = self._lookup(args["p_table"], args["p_key"], change.get(args["p_key"]))
+                if row is not None:
+                    row.update(change)
+                    updated += 1
+            return 200, updated
+        return 404, {"message": f"function {fn} tidak ada di FakePostgrest"}
@@ -1,52 +1,106 @@
 # 📍 payments/webhooks/flip/disbursement.py
-import os
 import logging
-import aiohttp
 import base64
 import uuid
+import asyncio
 from datetime import datetime
-from lib.supabase_client import supabase
+from functools import lru_cache
+from lib import repository, outbox
+from lib.settings import env
+from lib import codec
+from lib.http_client import get_transport, UNKNOWN_OUTCOME
+from lib.bank_directory import bank_directory
+from lib.rate_limit import RateLimited, TokenBucket, retry_after_seconds
+from lib.bulk import stream_limited
+from lib.resilience import CircuitOpen
+from lib.cache import EnvCache, SingleFlight
+from lib import metrics
+from lib.profiling import profiled
+from lib.log import fields
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s %(name)s]: %(message)s")
 
 # ================= Flip Config =================
-FLIP_SECRET_KEY = os.getenv("FLIP_SECRET_KEY")
-FLIP_ENV = os.getenv("FLIP_ENV", "sandbox")  # 'sandbox' atau 'production'
-BASE_URL = "https://bigflip.id/api" if FLIP_ENV == "production" else "https://bigflip.id/big_sandbox_api"
+@lru_cache(maxsize=1)
+def get_flip_disburse_config() -> dict:
+    """Config Flip Business + header auth, dibaca saat pertama dipakai (bukan saat import)."""
+    flip_env = env("FLIP_ENV", "sandbox")  # 'sandbox' atau 'production'
+    auth_string = base64.b64encode(f"{env('FLIP_SECRET_KEY')}:".encode()).decode()
+    return {
+        "env": flip_env,
+        "base_url": "https://bigflip.id/api" if flip_env == "production" else "https://bigflip.id/big_sandbox_api",
+        "auth_header": f"Basic {auth_string}",
+    }
+
+# Field response Flip yang boleh masuk log (sisanya, mis. nomor rekening penuh, dibuang)
+FLIP_RESPONSE_LOG_FIELDS = (
+    "id", "status", "amount", "bank_code", "account_number", "account_holder", "reason", "code", "errors",
+)
+
+# ================= Inquiry Cache =================
+# Hasil inquiry rekening di-cache per (bank_code, account_number)
+INQUIRY_POSITIVE = ("SUCCESS", "SUSPECTED_ACCOUNT")
+INQUIRY_NEGATIVE = ("INVALID_ACCOUNT_NUMBER", "BLACKLISTED", "CLOSED_ACCOUNT")
+
+inquiry_cache = EnvCache("FLIP_INQUIRY_CACHE_PATH")  # mis. .cache/inquiry.sqlite3
+_inquiry_flight = SingleFlight()
 
-# ================= Auth Header =================
-auth_string = base64.b64encode(f"{FLIP_SECRET_KEY}:".encode()).decode()
+
+@lru_cache(maxsize=1)
+def get_inquiry_config() -> dict:
+    """Tuning inquiry rekening, dibaca saat pertama dipakai (bukan saat import)."""
+    return {
+        "positive_ttl": float(env("FLIP_INQUIRY_POSITIVE_TTL", "86400")),
+        "negative_ttl": float(env("FLIP_INQUIRY_NEGATIVE_TTL", "600")),
+        "concurrency": int(env("FLIP_INQUIRY_CONCURRENCY", "10")),
+        "rate": float(env("FLIP_INQUIRY_RATE", "10")),  # request/detik, 0 = tanpa batas
+        "callback_timeout": float(env("FLIP_INQUIRY_CALLBACK_TIMEOUT", "60")),
+    }
 
 # ================= Helper =================
-async def _post(endpoint: str, data: dict, extra_headers: dict = None):
-    url = f"{BASE_URL}/{endpoint}"
+async def _post(endpoint: str, data: dict, extra_headers: dict = None, idempotent: bool | None = None,
+                strict: bool = False):
+    """strict=True: response 5xx (setelah retry) → httpx.HTTPStatusError, bukan body error-nya."""
+    config = get_flip_disburse_config()
+    url = f"{config['base_url']}/{endpoint}"
     headers = {
         "Content-Type": "application/x-www-form-urlencoded",
-        "Authorization": f"Basic {auth_string}"
+        "Authorization": config["auth_header"]
     }
     if extra_headers:
         headers.update(extra_headers)
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, data=data) as resp:
-            res = await resp.json()
-            logger.info("POST %s | Status: %s | Response: %s", endpoint, resp.status, res)
-            return res
-
-
-async def _get(endpoint: str):
-    url = f"{BASE_URL}/{endpoint}"
-    headers = {"Authorization": f"Basic {auth_string}"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            res = await resp.json()
-            # ✨ Jangan tampilkan full response untuk list bank
-            if endpoint == "v2/general/banks":
-                logger.info("GET %s | Status: %s | Response: <hidden bank list>", endpoint, resp.status)
-            else:
-                logger.info("GET %s | Status: %s | Response: %s", endpoint, resp.status, res)
-            return res
+    resp = await get_transport().request(
+        "bigflip", "POST", url, endpoint=endpoint, idempotent=idempotent, headers=headers, data=data
+    )
+    if resp.status_code == 429:
+        raise RateLimited("flip", retry_after_seconds(resp.headers))
+    if strict and resp.status_code >= 500:
+        resp.raise_for_status()
+    res = codec.loads(resp.content)
+    logger.info(
+        "POST %s | Status: %s | Response: %s", endpoint, resp.status_code, fields(res, FLIP_RESPONSE_LOG_FIELDS),
+        extra={"event": "gateway.response", "gateway": "flip"},
+    )
+    return res
+
+
+async def _get(endpoint: str, params: dict = None):
+    config = get_flip_disburse_config()
+    url = f"{config['base_url']}/{endpoint}"
+    headers = {"Authorization": config["auth_header"]}
+    resp = await get_transport().request("bigflip", "GET", url, endpoint=endpoint, headers=headers, params=params)
+    if resp.status_code == 429:
+        raise RateLimited("flip", retry_after_seconds(resp.headers))
+    res = codec.loads(resp.content)
+    # ✨ Jangan tampilkan full response untuk list bank / list disbursement
+    logger.info(
+        "GET %s | Status: %s | Response: %s", endpoint, resp.status_code,
+        "<hidden list>" if isinstance(res, list) or endpoint in ("v2/general/banks", "v3/disbursement")
+        else fields(res, FLIP_RESPONSE_LOG_FIELDS),
+        extra={"event": "gateway.response", "gateway": "flip"},
+    )
+    return res
 
 # ================= Bank List =================
 async def get_banks():
@@ -58,60 +112,236 @@ async def get_banks():
 
 async def resolve_bank_code(bank_name: str):
     """
-    Cari bank_code dari nama bank.
+    Cari bank_code dari nama bank (lewat bank_directory, tanpa fetch ulang tiap panggilan).
     """
-    banks = await get_banks()
-    bank_name_upper = bank_name.upper()
-    for b in banks:
-        if b["name"].upper() == bank_name_upper:
-            return b["bank_code"]
-    return None
+    return await bank_directory.resolve(bank_name, "flip")
+
+
+bank_directory.register_source("flip", get_banks)
+
+# ================= Status Disbursement =================
+async def get_disbursement(disbursement_id):
+    """Status satu disbursement Flip berdasarkan id."""
+    return await _get("v3/get-disbursement", {"id": disbursement_id})
+
+
+async def list_disbursements(page: int = 1, pagination: int = 100):
+    """Daftar disbursement Flip per halaman, terbaru dulu."""
+    return await _get("v3/disbursement", {"pagination": pagination, "page": page, "sort": "-id"})
 
 # ================= Bank Account Inquiry =================
-async def check_account(order: dict):
-    bank_code = await resolve_bank_code(order.get("payout_bank", ""))
+async def check_account(order: dict, bank_code: str | None = None):
+    if bank_code is None:
+        bank_code = await resolve_bank_code(order.get("payout_bank", ""))
     if not bank_code:
         return {"status": "INVALID_BANK", "error": f"Bank {order.get('payout_bank')} belum support"}
 
+    account_number = order.get("payout_account")
+    key = f"{bank_code}:{account_number}"
+    cached = await inquiry_cache.get(key)
+    if cached is not None:
+        return cached
+    # Inquiry bersamaan untuk rekening yang sama cukup satu request
+    return await _inquiry_flight.do(key, lambda: _inquire(bank_code, account_number))
+
+
+async def _inquire(bank_code: str, account_number: str):
     inquiry_key = str(uuid.uuid4())
     data = {
         "bank_code": bank_code,
-        "account_number": order.get("payout_account"),
+        "account_number": account_number,
         "inquiry_key": inquiry_key
     }
-    res = await _post("v2/disbursement/bank-account-inquiry", data)
+    # inquiry_key sama di tiap retry → aman diulang
+    res = await _post("v2/disbursement/bank-account-inquiry", data, idempotent=True)
+
+    status = res.get("status")
+    if status == "PENDING":
+        # Hasil final datang lewat callback inquiry, dikorelasikan dengan inquiry_key
+        res.setdefault("inquiry_key", inquiry_key)
+    await _cache_inquiry(bank_code, account_number, res)
     return res
 
+
+async def _cache_inquiry(bank_code: str, account_number: str, res: dict):
+    status = res.get("status")
+    config = get_inquiry_config()
+    ttl = config["positive_ttl"] if status in INQUIRY_POSITIVE else config["negative_ttl"] if status in INQUIRY_NEGATIVE else 0
+    if ttl > 0:
+        await inquiry_cache.set(f"{bank_code}:{account_number}", res, ttl)
+
+
+# ================= Bulk Inquiry =================
+# inquiry_key → future hasil callback (satu per penunggu), hanya untuk inquiry yang sedang ditunggu
+_inquiry_waiters: dict[str, list[asyncio.Future]] = {}
+
+
+async def resolve_inquiry(result: dict) -> bool:
+    """
+    Dipanggil callback inquiry Flip (webhooks/flip/disbursement.py). Hasil
+    final masuk inquiry_cache (jadi disburse berikutnya tidak inquiry ulang)
+    lalu membangunkan yang menunggu inquiry_key tsb. Return True kalau ada
+    yang menunggu di proses ini.
+    """
+    bank_code, account_number = result.get("bank_code"), result.get("account_number")
+    if bank_code and account_number:
+        await _cache_inquiry(bank_code, account_number, result)
+    woken = 0
+    for future in _inquiry_waiters.pop(result.get("inquiry_key"), []):
+        if not future.done():
+            future.set_result(result)
+            woken += 1
+    return woken > 0
+
+
+async def _wait_inquiry(bank_code: str, account_number: str, pending: dict, timeout: float) -> dict:
+    """Tunggu hasil inquiry PENDING: callback di proses ini, atau cache (callback di proses lain)."""
+    inquiry_key = pending.get("inquiry_key")
+    cache_key = f"{bank_code}:{account_number}"
+    future = asyncio.get_running_loop().create_future()
+    if inquiry_key:
+        # Inquiry yang sama bisa ditunggu beberapa order sekaligus (single-flight check_account)
+        _inquiry_waiters.setdefault(inquiry_key, []).append(future)
+    try:
+        # Daftar dulu baru cek cache: callback yang datang sebelum ini sudah tertulis di cache
+        cached = await inquiry_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return await inquiry_cache.get(cache_key) or pending
+    finally:
+        futures = _inquiry_waiters.get(inquiry_key)
+        if futures and future in futures:
+            futures.remove(future)
+            if not futures:
+                del _inquiry_waiters[inquiry_key]
+
+
+def _verdict(order: dict, bank_code: str | None, res: dict) -> dict:
+    status = res.get("status")
+    ok = status in INQUIRY_POSITIVE
+    return {
+        "id": order.get("id"),
+        "ok": ok,
+        "status": status,
+        "bank_code": bank_code,
+        "account_holder": res.get("account_holder"),
+        "error": None if ok else res.get("error") or f"Inquiry: {status}",
+    }
+
+
+async def check_accounts_many(
+    orders,
+    concurrency: int | None = None,
+    rate: float | None = None,
+    callback_timeout: float | None = None,
+):
+    """
+    Validasi banyak rekening payout sebelum payout run (di luar jalur disburse).
+    Async generator verdict per order, urut sesuai selesainya:
+      {"id", "ok", "status", "bank_code", "account_holder", "error"}
+
+    Bank code di-resolve sekali per nama bank dari bank_directory. Inquiry
+    lewat check_account (cache + single-flight), maksimal `concurrency`
+    request bersamaan dan `rate` request/detik. Hasil PENDING ditunggu sampai
+    callback inquiry datang (maks `callback_timeout` detik, tanpa memakai
+    slot concurrency); lewat dari itu verdict tetap PENDING. Argumen None →
+    FLIP_INQUIRY_CONCURRENCY / FLIP_INQUIRY_RATE / FLIP_INQUIRY_CALLBACK_TIMEOUT.
+    """
+    config = get_inquiry_config()
+    concurrency = concurrency or config["concurrency"]
+    rate = config["rate"] if rate is None else rate
+    callback_timeout = config["callback_timeout"] if callback_timeout is None else callback_timeout
+    orders = list(orders)
+    bank_codes = {}
+    for name in {order.get("payout_bank", "") for order in orders}:
+        bank_codes[name] = await resolve_bank_code(name)
+    bucket = TokenBucket(rate) if rate > 0 else None
+
+    async def inquire(order):
+        bank_code = bank_codes[order.get("payout_bank", "")]
+        if not bank_code:
+            return None, {"status": "INVALID_BANK", "error": f"Bank {order.get('payout_bank')} belum support"}
+        cached = await inquiry_cache.get(f"{bank_code}:{order.get('payout_account')}")
+        if cached is not None:
+            return bank_code, cached
+        if bucket is not None:
+            await bucket.acquire()
+        return bank_code, await check_account(order, bank_code)
+
+    verdicts: asyncio.Queue = asyncio.Queue()
+    waiters: set[asyncio.Task] = set()
+    done = object()
+
+    async def wait_callback(order, bank_code, pending):
+        res = await _wait_inquiry(bank_code, order.get("payout_account"), pending, callback_timeout)
+        verdicts.put_nowait(_verdict(order, bank_code, res))
+
+    async def produce():
+        try:
+            async for _, order, result, error in stream_limited(orders, inquire, concurrency):
+                if error is not None:
+                    verdicts.put_nowait({
+                        "id": order.get("id"), "ok": False, "status": "ERROR",
+                        "bank_code": bank_codes.get(order.get("payout_bank", "")),
+                        "account_holder": None, "error": str(error),
+                    })
+                    continue
+                bank_code, res = result
+                if res.get("status") == "PENDING" and bank_code:
+                    task = asyncio.create_task(wait_callback(order, bank_code, res))
+                    waiters.add(task)
+                    task.add_done_callback(waiters.discard)
+                else:
+                    verdicts.put_nowait(_verdict(order, bank_code, res))
+            await asyncio.gather(*waiters)
+        finally:
+            verdicts.put_nowait(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (verdict := await verdicts.get()) is not done:
+            metrics.inc(metrics.OUTCOMES, "inquiry.flip", str(verdict["status"]).lower())
+            yield verdict
+        await producer  # exception di producer (mis. fetch bank list) diteruskan ke caller
+    finally:
+        producer.cancel()
+        for task in list(waiters):
+            task.cancel()
+        await asyncio.gather(producer, *waiters, return_exceptions=True)
+
 # ================= Adapter disburse =================
+@profiled("flip_disburse.disburse")
 async def disburse(order: dict):
+    """
+    Kirim payout via Flip v3. Return True kalau diterima Flip.
+    Raise RateLimited kalau Flip balas 429, atau CircuitOpen kalau Flip sedang
+    down (order tetap 'dispatching', aman diulang dengan idempotency key yang sama).
+    """
+    # Simpan intent dulu; order yang sudah dikirim sebelumnya tidak dikirim lagi
+    idempotency_key = await outbox.begin(order, "flip")
+    if idempotency_key is None:
+        return await outbox.already_dispatched(order)
+
+    sent = False
     try:
+        bank_code = await resolve_bank_code(order.get("payout_bank", ""))
+
         # ===== Cek rekening dulu =====
-        account_res = await check_account(order)
+        account_res = await check_account(order, bank_code)
         acc_status = account_res.get("status")
         if acc_status not in ("SUCCESS", "SUSPECTED_ACCOUNT"):
-            if FLIP_ENV == "sandbox" and acc_status == "PENDING":
-                logger.info(f"ℹ️ Sandbox mode: rekening masih PENDING, lanjutkan disburse")
+            if get_flip_disburse_config()["env"] == "sandbox" and acc_status == "PENDING":
+                logger.info("ℹ️ Sandbox mode: rekening masih PENDING, lanjutkan disburse")
             else:
                 error_msg = account_res.get("error") or f"Inquiry failed: {acc_status}"
-                logger.error(f"❌ Rekening invalid / blacklisted: {acc_status}")
-                supabase.table("TransactionsJual").update({
-                    "payout_status": acc_status.lower(),
-                    "payout_error": error_msg,
-                    "status": "failed"
-                }).eq("id", order["id"]).execute()
+                logger.error("❌ Rekening invalid / blacklisted: %s", acc_status)
+                metrics.inc(metrics.OUTCOMES, "disbursement.flip", acc_status.lower())
+                await repository.update_order(order["id"], outbox.failed_before_send(acc_status.lower(), error_msg))
                 return False
 
-        bank_code = await resolve_bank_code(order.get("payout_bank", ""))
-        if not bank_code:
-            logger.error(f"❌ Bank {order.get('payout_bank')} tidak ditemukan di Flip")
-            supabase.table("TransactionsJual").update({
-                "payout_status": "failed",
-                "payout_error": f"Bank {order.get('payout_bank')} tidak ditemukan",
-                "status": "failed"
-            }).eq("id", order["id"]).execute()
-            return False
-
-        idempotency_key = str(uuid.uuid4())
         timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
         remark = f"WD {order.get('token')} {order.get('order_id')}"[:18]
 
@@ -128,25 +358,35 @@ async def disburse(order: dict):
         }
 
         # ===== Disbursement =====
-        res = await _post("v3/disbursement", data, extra_headers)
+        sent = True
+        res = await _post("v3/disbursement", data, extra_headers, strict=True)
 
         disb_id = res.get("id") or str(uuid.uuid4())
         status = res.get("status", "pending")
-        supabase.table("TransactionsJual").update({
+        await repository.update_order(order["id"], {
             "flip_ref_id": disb_id,
             "payout_status": status,
             "status": "waiting_callback" if status in ("queued", "pending") else status,
             "payout_error": None if status in ("success","queued","pending") else str(res)
-        }).eq("id", order["id"]).execute()
+        })
 
-        logger.info(f"✅ Flip disbursement {status}: {disb_id}")
+        logger.info("✅ Flip disbursement %s: %s", status, disb_id, extra={"event": "disbursement.created"})
+        metrics.inc(metrics.OUTCOMES, "disbursement.flip", status)
         return True if status in ("success","queued","pending") else False
 
+    except (RateLimited, CircuitOpen):
+        raise
+    except UNKNOWN_OUTCOME as e:
+        # Belum tahu disbursement terbuat atau tidak → biarkan 'dispatching', dikirim ulang oleh resume
+        logger.warning("⚠️ Flip disbursement %s tanpa jawaban jelas (%r), menunggu resume", order["id"], e)
+        metrics.inc(metrics.OUTCOMES, "disbursement.flip", "unknown")
+        return False
     except Exception as e:
-        logger.exception(f"❌ Exception saat Flip disbursement: {e}")
-        supabase.table("TransactionsJual").update({
-            "payout_status": "failed",
-            "payout_error": str(e),
-            "status": "failed"
-        }).eq("id", order["id"]).execute()
+        logger.exception("❌ Exception saat Flip disbursement: %s", e)
+        metrics.inc(metrics.OUTCOMES, "disbursement.flip", "error")
+        if sent:
+            changes = {"payout_status": "failed", "payout_error": str(e), "status": "failed"}
+        else:
+            changes = outbox.failed_before_send("failed", str(e))
+        await repository.update_order(order["id"], changes)
         return False
@@ -1,17 +1,28 @@
 # payments/webhooks/midtrans/disbursement.py
-import aiohttp
 import logging
-import os
-import uuid
 import re
-from lib.supabase_client import supabase
+from functools import lru_cache
+import asyncio
+from lib import repository, outbox
+from lib.settings import env
+from lib import codec
+from lib.http_client import get_transport, UNKNOWN_OUTCOME
+from lib.bank_directory import bank_directory
+from lib import metrics
+from lib.profiling import profiled
+from lib.rate_limit import RateLimited, retry_after_seconds
+from lib.resilience import CircuitOpen
 
 logger = logging.getLogger(__name__)
 
-# 📌 Environment variable Midtrans
-MIDTRANS_DISBURSEMENT_KEY = os.getenv("MIDTRANS_DISBURSEMENT_KEY")
-# Lo bisa switch ke production nanti tinggal ganti URL
-MIDTRANS_BASE_URL = os.getenv("MIDTRANS_BASE_URL", "https://app.sandbox.midtrans.com/iris/api/v1/payouts")
+# 📌 Environment variable Midtrans, dibaca saat pertama dipakai (bukan saat import)
+@lru_cache(maxsize=1)
+def get_iris_config() -> dict:
+    return {
+        "auth": (env("MIDTRANS_DISBURSEMENT_KEY"), ""),
+        # Lo bisa switch ke production nanti tinggal ganti URL
+        "base_url": env("MIDTRANS_BASE_URL", "https://app.sandbox.midtrans.com/iris/api/v1/payouts"),
+    }
 
 # 📌 Mapping bank/e-wallet sesuai IRIS
 BANK_MAP = {
@@ -35,87 +46,290 @@ BANK_MAP = {
     "OVO": "ovo",        # khusus OVO → harus di-handle custom
     "GOPAY": "gopay",
 }
+bank_directory.register_static("iris", BANK_MAP)
 
-async def disburse(order: dict):
+
+@lru_cache(maxsize=1)
+def payout_batch_size() -> int:
+    return int(env("MIDTRANS_PAYOUT_BATCH_SIZE", "100"))
+
+
+def _build_payout(order: dict):
     """
-    Kirim payout ke user via Midtrans IRIS.
-    order dict harus ada:
-      payout_name, payout_account, payout_bank, amount_idr, token, order_id, id
+    Susun 1 item `payouts` IRIS dari order. Return None kalau bank belum support.
     """
-    bank_code = BANK_MAP.get(order["payout_bank"].upper())
+    bank_code = bank_directory.lookup(order["payout_bank"], "iris")
     if not bank_code:
-        error_msg = f"Bank {order['payout_bank']} belum support di Midtrans"
-        logger.error(f"❌ {error_msg}")
-        supabase.table("TransactionsJual").update({
-            "payout_status": "failed",
-            "payout_error": error_msg,
-            "status": "failed"
-        }).eq("id", order["id"]).execute()
-        return False
+        return None
 
+    account = order["payout_account"]
     # 📌 Special handling untuk OVO
     if bank_code == "ovo":
         bank_code = "cimb_va"  # Midtrans butuh cimb_va untuk OVO
-        order["payout_account"] = f"8099{order['payout_account']}"
-
-    # Idempotency key supaya request aman dari duplikat
-    idempotency_key = str(uuid.uuid4())
+        account = f"8099{account}"
 
     # Bersihkan token dan order_id dari karakter ilegal di notes
     token_clean = re.sub(r'[^A-Za-z0-9 ]+', '', order['token'])
     order_id_clean = re.sub(r'[^A-Za-z0-9 ]+', '', order['order_id'])
     notes_clean = f"WD Crypto {token_clean} Order {order_id_clean}"
 
-    payload = {
-        "payouts": [
-            {
-                "beneficiary_name": order["payout_name"],
-                "beneficiary_account": order["payout_account"],
-                "beneficiary_bank": bank_code,
-                "amount": order["amount_idr"],
-                "notes": notes_clean
-            }
-        ]
+    return {
+        "beneficiary_name": order["payout_name"],
+        "beneficiary_account": account,
+        "beneficiary_bank": bank_code,
+        "amount": order["amount_idr"],
+        "notes": notes_clean
     }
 
+
+async def _post_payouts(payouts: list[dict], idempotency_key: str):
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
+        # Key deterministik dari outbox: kirim ulang batch yang sama tidak bikin payout dobel
         "X-Idempotency-Key": idempotency_key
     }
+    config = get_iris_config()
+    resp = await get_transport().request(
+        "iris", "POST", config["base_url"], endpoint="payouts", json={"payouts": payouts}, headers=headers,
+        auth=config["auth"]
+    )
+    if resp.status_code == 429:
+        raise RateLimited("midtrans", retry_after_seconds(resp.headers))
+    # 5xx setelah retry: payout mungkin sudah terbuat, bukan penolakan
+    if resp.status_code >= 500:
+        resp.raise_for_status()
+    return resp.status_code, codec.loads(resp.content)
 
-    auth = aiohttp.BasicAuth(MIDTRANS_DISBURSEMENT_KEY, "")
-    async with aiohttp.ClientSession(auth=auth) as session:
-        try:
-            async with session.post(MIDTRANS_BASE_URL, json=payload, headers=headers) as resp:
-                data = await resp.json()
-                if resp.status in (200, 201):
-                    # Ambil reference_no dari Midtrans (sandbox & production)
-                    payout_ref = data["payouts"][0].get("reference_no")
-                    logger.info(f"✅ Midtrans payout queued: {payout_ref}")
-
-                    # Update DB dengan reference_no asli, jangan pakai dummy
-                    supabase.table("TransactionsJual").update({
-                        "midtrans_ref_id": payout_ref,  # <- kunci untuk webhook nanti
-                        "payout_status": "queued",
-                        "status": "waiting_callback",
-                        "payout_error": None
-                    }).eq("id", order["id"]).execute()
-                    return True
-                else:
-                    error_msg = str(data)
-                    logger.error(f"❌ Gagal request Midtrans: {resp.status} {error_msg}")
-                    supabase.table("TransactionsJual").update({
-                        "payout_status": "failed",
-                        "payout_error": error_msg,
-                        "status": "failed"
-                    }).eq("id", order["id"]).execute()
-                    return False
-        except Exception as e:
-            logger.exception(f"❌ Exception saat request payout: {e}")
-            supabase.table("TransactionsJual").update({
+
+@profiled("midtrans_disburse.disburse")
+async def disburse(order: dict):
+    """
+    Kirim payout ke user via Midtrans IRIS.
+    order dict harus ada:
+      payout_name, payout_account, payout_bank, amount_idr, token, order_id, id
+    Raise RateLimited kalau IRIS balas 429, atau CircuitOpen kalau IRIS sedang
+    down (order tetap 'dispatching', aman diulang dengan idempotency key yang sama).
+    """
+    payout = _build_payout(order)
+    if payout is None:
+        error_msg = f"Bank {order['payout_bank']} belum support di Midtrans"
+        logger.error("❌ %s", error_msg)
+        metrics.inc(metrics.OUTCOMES, "disbursement.iris", "unsupported_bank")
+        await repository.update_order(order["id"], outbox.failed_before_send("failed", error_msg))
+        return False
+
+    # Simpan intent dulu; order yang sudah dikirim sebelumnya tidak dikirim lagi
+    idempotency_key = await outbox.begin(order, "midtrans")
+    if idempotency_key is None:
+        return await outbox.already_dispatched(order)
+
+    try:
+        status_code, data = await _post_payouts([payout], idempotency_key)
+        if status_code in (200, 201):
+            # Ambil reference_no dari Midtrans (sandbox & production)
+            payout_ref = data["payouts"][0].get("reference_no")
+            logger.info("✅ Midtrans payout queued: %s", payout_ref, extra={"event": "disbursement.created"})
+            metrics.inc(metrics.OUTCOMES, "disbursement.iris", "queued")
+
+            # Update DB dengan reference_no asli, jangan pakai dummy
+            await repository.update_order(order["id"], {
+                "midtrans_ref_id": payout_ref,  # <- kunci untuk webhook nanti
+                "payout_status": "queued",
+                "status": "waiting_callback",
+                "payout_error": None
+            })
+            return True
+        else:
+            error_msg = str(data)
+            logger.error("❌ Gagal request Midtrans: %s %s", status_code, error_msg)
+            metrics.inc(metrics.OUTCOMES, "disbursement.iris", "rejected")
+            await repository.update_order(order["id"], {
                 "payout_status": "failed",
-                "payout_error": str(e),
+                "payout_error": error_msg,
                 "status": "failed"
-            }).eq("id", order["id"]).execute()
+            })
             return False
+    except (RateLimited, CircuitOpen):
+        raise
+    except UNKNOWN_OUTCOME as e:
+        # Belum tahu payout terbuat atau tidak → biarkan 'dispatching', dikirim ulang oleh resume
+        logger.warning("⚠️ Payout %s tanpa jawaban jelas (%r), menunggu resume", order["id"], e)
+        metrics.inc(metrics.OUTCOMES, "disbursement.iris", "unknown")
+        return False
+    except Exception as e:
+        logger.exception("❌ Exception saat request payout: %s", e)
+        metrics.inc(metrics.OUTCOMES, "disbursement.iris", "error")
+        await repository.update_order(order["id"], {
+            "payout_status": "failed",
+            "payout_error": str(e),
+            "status": "failed"
+        })
+        return False
+
+
+async def get_payout(reference_no: str):
+    """Detail satu payout IRIS berdasarkan reference_no."""
+    resp = await get_transport().request(
+        "iris", "GET", f"{get_iris_config()['base_url']}/{reference_no}", endpoint="payouts/{reference_no}",
+        headers={"Accept": "application/json"}, auth=get_iris_config()["auth"]
+    )
+    if resp.status_code == 429:
+        raise RateLimited("midtrans", retry_after_seconds(resp.headers))
+    return codec.loads(resp.content)
+
+
+# ================= Batch =================
+def _item_errors(data) -> dict[int, str]:
+    """
+    Ambil error per item dari response gagal IRIS, mis.
+    {"errors": {"0": ["Beneficiary account is invalid"]}}. Key = index di batch.
+    """
+    errors = data.get("errors") if isinstance(data, dict) else None
+    if not isinstance(errors, dict):
+        return {}
+    result = {}
+    for key, value in errors.items():
+        index = key.split(".")[0].removeprefix("payouts[").rstrip("]")
+        if index.isdigit():
+            result[int(index)] = str(value)
+    return result
+
+
+async def _send_batch(batch: list[tuple[dict, dict]], results: dict, updates: list[dict], rate_limit_retries: int = 3):
+    claimed, idempotency_key = await outbox.begin_many([order for order, _ in batch], "midtrans")
+    claimed_ids = {order["id"] for order in claimed}
+    for order, _ in batch:
+        if order["id"] not in claimed_ids:
+            results[order["id"]] = {
+                "id": order["id"], "ok": False, "reference_no": None, "skipped": True,
+                "error": "Order sudah dikirim sebelumnya",
+            }
+    batch = [item for item in batch if item[0]["id"] in claimed_ids]
+    if not batch:
+        return
+
+    orders = [order for order, _ in batch]
+    try:
+        status_code, data = await _post_payouts([payout for _, payout in batch], idempotency_key)
+    except (RateLimited, CircuitOpen) as e:
+        if rate_limit_retries <= 0:
+            # Ditolak sebelum sampai gateway: key dilepas supaya order bisa di-claim ulang
+            for order in orders:
+                _mark_failed(order, str(e), results, updates, sent=False)
+            return
+        logger.warning("⚠️ %s, tunggu %ss sebelum kirim ulang batch", e, e.retry_after or 1)
+        await asyncio.sleep(e.retry_after or 1)
+        await _send_batch(batch, results, updates, rate_limit_retries - 1)
+        return
+    except UNKNOWN_OUTCOME as e:
+        # Belum tahu batch terbuat atau tidak → biarkan 'dispatching', dikirim ulang oleh resume
+        logger.warning("⚠️ Batch payout (%s order) tanpa jawaban jelas (%r), menunggu resume", len(batch), e)
+        for order in orders:
+            results[order["id"]] = {"id": order["id"], "ok": False, "reference_no": None, "error": str(e)}
+        return
+    except Exception as e:
+        logger.exception("❌ Exception saat request batch payout (%s order): %s", len(batch), e)
+        for order in orders:
+            _mark_failed(order, str(e), results, updates)
+        return
+
+    if status_code in (200, 201):
+        for order, item in zip(orders, data.get("payouts", [])):
+            payout_ref = item.get("reference_no")
+            results[order["id"]] = {"id": order["id"], "ok": True, "reference_no": payout_ref, "error": None}
+            updates.append({
+                "id": order["id"],
+                "midtrans_ref_id": payout_ref,
+                "payout_status": "queued",
+                "status": "waiting_callback",
+                "payout_error": None
+            })
+        for order in orders[len(data.get("payouts", [])):]:
+            _mark_failed(order, "reference_no tidak dikembalikan Midtrans", results, updates)
+        logger.info("✅ Midtrans batch payout queued: %s order", len(orders), extra={"event": "disbursement.created"})
+        return
+
+    # IRIS menolak satu batch utuh kalau ada item invalid → kirim ulang sisanya sekali
+    item_errors = _item_errors(data)
+    if item_errors and len(item_errors) < len(batch):
+        logger.warning("⚠️ %s item batch ditolak Midtrans, kirim ulang sisanya", len(item_errors))
+        for index, error_msg in item_errors.items():
+            _mark_failed(batch[index][0], error_msg, results, updates)
+        retry = [item for index, item in enumerate(batch) if index not in item_errors]
+        await _send_batch(retry, results, updates)
+        return
+
+    error_msg = str(data)
+    logger.error("❌ Gagal request batch Midtrans: %s %s", status_code, error_msg)
+    for index, order in enumerate(orders):
+        _mark_failed(order, item_errors.get(index, error_msg), results, updates)
+
+
+def _mark_failed(order: dict, error_msg: str, results: dict, updates: list[dict], sent: bool = True):
+    """sent=False: request tidak pernah sampai ke gateway (lihat outbox.failed_before_send)."""
+    results[order["id"]] = {"id": order["id"], "ok": False, "reference_no": None, "error": error_msg}
+    if not sent:
+        updates.append({"id": order["id"], **outbox.failed_before_send("failed", error_msg)})
+        return
+    updates.append({
+        "id": order["id"],
+        "payout_status": "failed",
+        "payout_error": error_msg,
+        "status": "failed"
+    })
+
+
+@profiled("midtrans_disburse.disburse_many")
+async def disburse_many(orders: list[dict], batch_size: int | None = None):
+    """
+    Kirim banyak payout via Midtrans IRIS, `batch_size` order per POST
+    (None → MIDTRANS_PAYOUT_BATCH_SIZE).
+    Return list hasil per order (urutan sama dengan input):
+      {"id", "ok", "reference_no", "error", "persisted"}
+    Update TransactionsJual ditulis sekaligus per batch. persisted=False:
+    bulk update batch-nya gagal, order masih 'dispatching' di DB dan akan
+    dikirim ulang oleh resume dengan idempotency key yang sama.
+    """
+    batch_size = batch_size or payout_batch_size()
+    results = {}
+    valid = []
+    for order in orders:
+        payout = _build_payout(order)
+        if payout is None:
+            results[order["id"]] = {
+                "id": order["id"], "ok": False, "reference_no": None,
+                "error": f"Bank {order['payout_bank']} belum support di Midtrans"
+            }
+        else:
+            valid.append((order, payout))
+
+    invalid_updates = [
+        {"id": r["id"], **outbox.failed_before_send("failed", r["error"])}
+        for r in results.values()
+    ]
+    if invalid_updates:
+        logger.error("❌ %s order pakai bank yang belum support di Midtrans", len(invalid_updates))
+        await repository.update_orders(invalid_updates)
+
+    for r in results.values():
+        r["persisted"] = True
+    for i in range(0, len(valid), batch_size):
+        batch = valid[i:i + batch_size]
+        updates = []
+        await _send_batch(batch, results, updates)
+        persisted = True
+        try:
+            await repository.update_orders(updates)
+        except Exception:
+            logger.exception("❌ Gagal bulk update TransactionsJual untuk batch payout (%s order)", len(updates))
+            persisted = False
+        for order, _ in batch:
+            results[order["id"]]["persisted"] = persisted
+
+    succeeded = sum(1 for r in results.values() if r["ok"] and r["persisted"])
+    unpersisted = sum(1 for r in results.values() if not r["persisted"])
+    metrics.inc(metrics.OUTCOMES, "disbursement.iris", "queued", value=succeeded)
+    metrics.inc(metrics.OUTCOMES, "disbursement.iris", "unpersisted", value=unpersisted)
+    metrics.inc(metrics.OUTCOMES, "disbursement.iris", "failed", value=len(results) - succeeded - unpersisted)
+    return [results[order["id"]] for order in orders]
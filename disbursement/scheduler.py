@@ -0,0 +1,243 @@
+# 📍 payments/disbursement/scheduler.py
+"""
+Scheduler disbursement: terima stream order TransactionsJual lalu dispatch
+ke flip_disburse / midtrans_disburse dengan:
+  - concurrency per gateway
+  - token bucket rate limit per gateway
+  - slowdown adaptif saat gateway balas 429 (rate turun setengah, naik pelan lagi)
+  - priority lane (VIP / nominal kecil duluan) + round-robin antar user
+
+Contoh:
+    scheduler = DisbursementScheduler()
+    results = await scheduler.run(orders)   # {order_id: True/False}
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from lib.settings import env
+from lib.rate_limit import TokenBucket, RateLimited
+from lib.resilience import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+
+# 📌 Tuning scheduler, dibaca saat pertama dipakai (bukan saat import) supaya .env ikut terbaca
+@lru_cache(maxsize=1)
+def small_withdrawal_idr() -> int:
+    return int(env("SMALL_WITHDRAWAL_IDR", "1000000"))
+
+
+@lru_cache(maxsize=1)
+def default_gateways() -> dict:
+    return {
+        "flip": {
+            "concurrency": int(env("FLIP_DISBURSE_CONCURRENCY", "5")),
+            "rate": float(env("FLIP_DISBURSE_RATE", "10")),
+        },
+        "midtrans": {
+            "concurrency": int(env("MIDTRANS_DISBURSE_CONCURRENCY", "5")),
+            "rate": float(env("MIDTRANS_DISBURSE_RATE", "10")),
+        },
+    }
+
+
+def default_priority(order: dict) -> int:
+    """0 = VIP, 1 = nominal kecil, 2 = sisanya."""
+    if order.get("is_vip"):
+        return 0
+    if (order.get("amount_idr") or 0) <= small_withdrawal_idr():
+        return 1
+    return 2
+
+
+def default_gateway(order: dict) -> str:
+    return (order.get("payout_gateway") or "flip").lower()
+
+
+def default_dispatchers() -> dict:
+    from disbursement import flip_disburse, midtrans_disburse
+
+    return {"flip": flip_disburse.disburse, "midtrans": midtrans_disburse.disburse}
+
+
+class _FairQueue:
+    """Priority lane; di dalam tiap lane order diambil round-robin per user."""
+
+    def __init__(self):
+        self._lanes: dict[int, OrderedDict] = {}
+        self._size = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return self._size
+
+    def push(self, lane: int, user, order: dict, front: bool = False):
+        users = self._lanes.setdefault(lane, OrderedDict())
+        queue = users.setdefault(user, deque())
+        if front:
+            queue.appendleft(order)
+            users.move_to_end(user, last=False)
+        else:
+            queue.append(order)
+        self._size += 1
+        self._ready.set()
+
+    async def pop(self) -> tuple[int, object, dict]:
+        while not self._size:
+            self._ready.clear()
+            await self._ready.wait()
+        lane = min(lane for lane, users in self._lanes.items() if users)
+        users = self._lanes[lane]
+        user, queue = next(iter(users.items()))
+        order = queue.popleft()
+        if queue:
+            users.move_to_end(user)
+        else:
+            del users[user]
+        self._size -= 1
+        return lane, user, order
+
+
+class _GatewayLane:
+    def __init__(self, name: str, dispatch, concurrency: int, rate: float, burst: float | None = None):
+        self.name = name
+        self.dispatch = dispatch
+        self.concurrency = concurrency
+        self.base_rate = rate
+        self.min_rate = max(rate / 16, 0.1)
+        self.bucket = TokenBucket(rate, burst)
+        self.queue = _FairQueue()
+        self.paused_until = 0.0
+        self.stats = {"dispatched": 0, "succeeded": 0, "failed": 0, "rate_limited": 0}
+
+    def slow_down(self, retry_after: float | None):
+        loop = asyncio.get_running_loop()
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+        self.paused_until = max(self.paused_until, loop.time() + (retry_after or 1.0))
+        logger.warning("🐢 %s rate limited, rate turun ke %.2f/s", self.name, self.bucket.rate)
+
+    def speed_up(self):
+        if self.bucket.rate < self.base_rate:
+            self.bucket.set_rate(min(self.base_rate, self.bucket.rate + self.base_rate / 20))
+
+
+class DisbursementScheduler:
+    def __init__(
+        self,
+        gateways: dict | None = None,
+        dispatchers: dict | None = None,
+        priority=default_priority,
+        gateway_for=default_gateway,
+        user_key=lambda order: order.get("user_id") or order.get("payout_account"),
+        max_pending: int = 10000,
+        max_rate_limit_retries: int = 5,
+    ):
+        dispatchers = dispatchers or default_dispatchers()
+        config = gateways or default_gateways()
+        self.lanes = {
+            name: _GatewayLane(name, dispatchers[name], cfg["concurrency"], cfg["rate"], cfg.get("burst"))
+            for name, cfg in config.items()
+        }
+        self.priority = priority
+        self.gateway_for = gateway_for
+        self.user_key = user_key
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.results: dict = {}
+        self._slots = asyncio.Semaphore(max_pending)
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers: list[asyncio.Task] = []
+        self._retries: dict = {}
+
+    # ================= Intake =================
+    async def submit(self, order: dict):
+        """Masukkan order ke lane gateway-nya. Nunggu kalau order pending sudah max_pending."""
+        gateway = self.gateway_for(order)
+        lane = self.lanes.get(gateway)
+        if lane is None:
+            logger.error("❌ Gateway %s tidak dikenal untuk order %s", gateway, order.get("id"))
+            self.results[order["id"]] = False
+            return
+        await self._slots.acquire()
+        self._unfinished += 1
+        self._idle.clear()
+        lane.queue.push(self.priority(order), self.user_key(order), order)
+        self.start()
+
+    async def run(self, orders) -> dict:
+        """Proses semua order (iterable biasa atau async iterable), return {order_id: bool}."""
+        if hasattr(orders, "__aiter__"):
+            async for order in orders:
+                await self.submit(order)
+        else:
+            for order in orders:
+                await self.submit(order)
+        await self.join()
+        await self.stop()
+        return self.results
+
+    async def join(self):
+        await self._idle.wait()
+
+    # ================= Workers =================
+    def start(self):
+        if self._workers:
+            return
+        for lane in self.lanes.values():
+            for _ in range(lane.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(lane)))
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self, lane: _GatewayLane):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, user, order = await lane.queue.pop()
+            delay = lane.paused_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await lane.bucket.acquire()
+
+            lane.stats["dispatched"] += 1
+            try:
+                ok = await lane.dispatch(order)
+            except (RateLimited, CircuitOpen) as e:
+                lane.stats["rate_limited"] += 1
+                lane.slow_down(e.retry_after)
+                retries = self._retries.get(order["id"], 0) + 1
+                if retries <= self.max_rate_limit_retries:
+                    self._retries[order["id"]] = retries
+                    lane.queue.push(priority, user, order, front=True)
+                    continue
+                logger.error("❌ Order %s tetap rate limited setelah %s percobaan", order["id"], retries - 1)
+                ok = False
+            except Exception:
+                logger.exception("❌ Dispatch order %s ke %s gagal", order.get("id"), lane.name)
+                ok = False
+            else:
+                lane.speed_up()
+
+            lane.stats["succeeded" if ok else "failed"] += 1
+            self.results[order["id"]] = ok
+            self._retries.pop(order["id"], None)
+            self._done()
+
+    def _done(self):
+        self._slots.release()
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._idle.set()
+
+    def stats(self) -> dict:
+        return {
+            name: {**lane.stats, "queued": len(lane.queue), "rate": lane.bucket.rate}
+            for name, lane in self.lanes.items()
+        }
@@ -2,27 +2,59 @@
 
 import httpx
 import logging
-from config import FLIP_API_KEY, FLIP_IS_PRODUCTION
+from functools import lru_cache
+from lib import codec, metrics, repository, status_cache
+from lib.bulk import BatchInserter, mark_recorded, stream_limited
+from lib.http_client import get_transport
+from lib.log import fields
 
 logger = logging.getLogger(__name__)
 
-FLIP_URL = (
-    "https://api.flip.id/v1" if FLIP_IS_PRODUCTION else "https://sandbox.flip.id/v1"
-)
+FLIP_TRANSACTION_LOG_FIELDS = ("id", "order_id", "status", "amount", "source_bank", "destination_bank")
 
-if not FLIP_API_KEY:
-    raise RuntimeError("❌ FLIP_API_KEY tidak ditemukan di .env")
+
+@lru_cache(maxsize=1)
+def get_flip_config() -> dict:
+    """Config Flip dari module `config`, dibaca & divalidasi saat pertama dipakai."""
+    from config import FLIP_API_KEY, FLIP_IS_PRODUCTION
+
+    if not FLIP_API_KEY:
+        raise RuntimeError("❌ FLIP_API_KEY tidak ditemukan di .env")
+    return {
+        "api_key": FLIP_API_KEY,
+        "base_url": "https://api.flip.id/v1" if FLIP_IS_PRODUCTION else "https://sandbox.flip.id/v1",
+    }
+
+
+@lru_cache(maxsize=None)
+def _auth_headers(api_key: str) -> dict:
+    return {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    }
+
+
+def _transaction_row(item: dict, data: dict) -> dict:
+    """Row Transactions untuk transaksi Flip yang baru dibuat."""
+    return {
+        "order_id": item["order_id"],
+        "transaction_id": data.get("id"),
+        "transaction_status": data.get("status"),
+        "amount": item["amount"],
+        "source_bank": item["source_bank"],
+        "destination_bank": item["destination_bank"],
+        "account_number": item["account_number"],
+        "account_name": item["account_name"],
+    }
 
 
 class FlipGateway:
-    def __init__(self, api_key: str = FLIP_API_KEY):
-        self.api_key = api_key
-        self.base_url = FLIP_URL
-        self.headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
-        }
+    def __init__(self, api_key: str | None = None):
+        config = get_flip_config()
+        self.api_key = api_key or config["api_key"]
+        self.base_url = config["base_url"]
+        self.headers = _auth_headers(self.api_key)
 
     async def create_transaction(
         self,
@@ -46,40 +78,86 @@ class FlipGateway:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/transactions", headers=self.headers, json=payload
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"✅ Flip transaction created: {data}")
-                return data
+            response = await get_transport().request(
+                "flip", "POST", f"{self.base_url}/transactions",
+                endpoint="transactions", headers=self.headers, json=payload,
+            )
+            response.raise_for_status()
+            data = codec.loads(response.content)
+            logger.info(
+                "✅ Flip transaction created: %s", fields(data, FLIP_TRANSACTION_LOG_FIELDS),
+                extra={"event": "gateway.response", "gateway": "flip"},
+            )
+            return data
         except httpx.HTTPStatusError as e:
             logger.error(
-                f"❌ Flip HTTP error: {e.response.status_code} - {e.response.text}"
+                "❌ Flip HTTP error: %s - %s", e.response.status_code, e.response.text
             )
             raise RuntimeError(f"❌ Flip HTTP error: {e}")
         except Exception as e:
             logger.exception("❌ Gagal membuat transaksi Flip")
             raise RuntimeError(f"❌ Flip error: {e}")
 
+    async def create_transactions_bulk(self, items, concurrency: int | None = None,
+                                       record=_transaction_row):
+        """
+        Buat banyak transaksi Flip sekaligus. `items`: iterable dict argumen
+        create_transaction (order_id, amount, source_bank, ...).
+
+        Async iterator hasil per item:
+          {"index", "order_id", "ok", "data", "error", "recorded"}
+        Transaksi yang berhasil di-insert ke Transactions per batch
+        (BULK_INSERT_BATCH row) dan hasilnya baru di-yield setelah batch-nya
+        ditulis; recorded=False (ok tetap True, transaksi sudah ada di Flip)
+        kalau insert row-nya gagal. record=None → tidak ditulis ke DB
+        (recorded None) dan hasil di-yield begitu selesai.
+        """
+        inserter = BatchInserter(repository.insert_transactions)
+        try:
+            async for index, item, data, error in stream_limited(
+                items, lambda item: self.create_transaction(**item), concurrency
+            ):
+                if error is not None:
+                    metrics.inc(metrics.OUTCOMES, "bulk.flip", "failed")
+                    yield {"index": index, "order_id": item.get("order_id"), "ok": False, "data": None,
+                           "error": str(error), "recorded": None}
+                    continue
+                metrics.inc(metrics.OUTCOMES, "bulk.flip", "created")
+                entry = {"index": index, "order_id": item["order_id"], "ok": True, "data": data, "error": None,
+                         "recorded": None}
+                if record is None:
+                    yield entry
+                    continue
+                for entry in mark_recorded(await inserter.add(record(item, data), entry)):
+                    yield entry
+            for entry in mark_recorded(await inserter.flush()):
+                yield entry
+        finally:
+            await inserter.flush()
+
     async def get_transaction_status(self, transaction_id: str):
         """
-        Cek status transaksi Flip
+        Cek status transaksi Flip. Lookup bersamaan untuk id yang sama digabung
+        dan hasilnya di-cache (lihat lib/status_cache).
         """
+        return await status_cache.flip.get(transaction_id, lambda: self._fetch_transaction_status(transaction_id))
+
+    async def _fetch_transaction_status(self, transaction_id: str):
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/transactions/{transaction_id}",
-                    headers=self.headers,
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"ℹ️ Flip transaction status: {data}")
-                return data
+            response = await get_transport().request(
+                "flip", "GET", f"{self.base_url}/transactions/{transaction_id}",
+                endpoint="transactions/{id}", headers=self.headers,
+            )
+            response.raise_for_status()
+            data = codec.loads(response.content)
+            logger.info(
+                "ℹ️ Flip transaction status: %s", fields(data, FLIP_TRANSACTION_LOG_FIELDS),
+                extra={"event": "gateway.response", "gateway": "flip"},
+            )
+            return data
         except httpx.HTTPStatusError as e:
             logger.error(
-                f"❌ Flip HTTP error: {e.response.status_code} - {e.response.text}"
+                "❌ Flip HTTP error: %s - %s", e.response.status_code, e.response.text
             )
             raise RuntimeError(f"❌ Flip HTTP error: {e}")
         except Exception as e:
@@ -3,20 +3,54 @@
 import httpx
 import base64
 import logging
-from config import MIDTRANS_SERVER_KEY, MIDTRANS_IS_PRODUCTION
+from functools import lru_cache
+from lib import codec, metrics, repository, status_cache
+from lib.bulk import BatchInserter, mark_recorded, stream_limited
+from lib.http_client import get_transport
+from lib.cache import EnvCache, SingleFlight
+from lib.settings import env
 
 logger = logging.getLogger(__name__)
 
-MIDTRANS_URL = (
-    "https://app.midtrans.com/snap/v1/transactions"
-    if MIDTRANS_IS_PRODUCTION
-    else "https://app.sandbox.midtrans.com/snap/v1/transactions"
-)
 
-if not MIDTRANS_SERVER_KEY:
-    raise RuntimeError("❌ MIDTRANS_SERVER_KEY tidak ditemukan di .env")
+@lru_cache(maxsize=1)
+def get_midtrans_config() -> dict:
+    """
+    Config Midtrans dari module `config` + header auth yang sudah dihitung,
+    dibaca & divalidasi saat pertama dipakai (bukan saat import).
+    """
+    from config import MIDTRANS_SERVER_KEY, MIDTRANS_IS_PRODUCTION
 
-basic_auth = base64.b64encode(f"{MIDTRANS_SERVER_KEY}:".encode()).decode()
+    if not MIDTRANS_SERVER_KEY:
+        raise RuntimeError("❌ MIDTRANS_SERVER_KEY tidak ditemukan di .env")
+
+    basic_auth = base64.b64encode(f"{MIDTRANS_SERVER_KEY}:".encode()).decode()
+    return {
+        "snap_url": (
+            "https://app.midtrans.com/snap/v1/transactions"
+            if MIDTRANS_IS_PRODUCTION
+            else "https://app.sandbox.midtrans.com/snap/v1/transactions"
+        ),
+        "api_url": "https://api.midtrans.com/v2" if MIDTRANS_IS_PRODUCTION else "https://api.sandbox.midtrans.com/v2",
+        "headers": {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Basic {basic_auth}",
+        },
+    }
+
+
+# ================= Snap Cache =================
+# Hasil Snap (redirect_url, data) di-cache per order_id sampai token Snap kedaluwarsa
+# (default Snap 24 jam, cache dibuat sedikit lebih pendek). Bisa diganti backend
+# lain yang punya get/set/delete async, mis. `midtrans.snap_cache = RedisCache(...)`.
+snap_cache = EnvCache("MIDTRANS_SNAP_CACHE_PATH")  # mis. .cache/snap.sqlite3
+_snap_flight = SingleFlight()
+
+
+@lru_cache(maxsize=1)
+def snap_cache_ttl() -> float:
+    return float(env("MIDTRANS_SNAP_CACHE_TTL", "82800"))
 
 
 async def create_midtrans_transaction(
@@ -26,11 +60,22 @@ async def create_midtrans_transaction(
     customer_email: str,
     enabled_payments: list[str] | None = None,
 ):
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Basic {basic_auth}",
-    }
+    """
+    Buat transaksi Snap, return (redirect_url, data).
+    Call ulang untuk order_id yang sama (double-click, retry frontend) memakai
+    hasil yang sudah ada; call bersamaan cukup satu request ke Midtrans.
+    """
+    cached = await snap_cache.get(order_id) if snap_cache_ttl() > 0 else None
+    if cached is not None:
+        return cached["redirect_url"], cached
+    return await _snap_flight.do(
+        order_id,
+        lambda: _create_snap_transaction(order_id, gross_amount, customer_name, customer_email, enabled_payments),
+    )
+
+
+async def _create_snap_transaction(order_id, gross_amount, customer_name, customer_email, enabled_payments):
+    config = get_midtrans_config()
 
     payload = {
         "transaction_details": {"order_id": order_id, "gross_amount": gross_amount},
@@ -40,16 +85,94 @@ async def create_midtrans_transaction(
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(MIDTRANS_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            return data["redirect_url"], data
+        response = await get_transport().request(
+            "midtrans", "POST", config["snap_url"], endpoint="snap/transactions", headers=config["headers"], json=payload
+        )
+        response.raise_for_status()
+        data = codec.loads(response.content)
+        if snap_cache_ttl() > 0:
+            await snap_cache.set(order_id, data, snap_cache_ttl())
+        return data["redirect_url"], data
     except httpx.HTTPStatusError as e:
         logger.error(
-            f"❌ Midtrans HTTP error: {e.response.status_code} - {e.response.text}"
+            "❌ Midtrans HTTP error: %s - %s", e.response.status_code, e.response.text
         )
         raise RuntimeError(f"❌ Midtrans HTTP error: {e}")
     except Exception as e:
         logger.exception("❌ Gagal membuat transaksi Midtrans")
         raise RuntimeError(f"❌ Midtrans error: {e}")
+
+
+def _transaction_row(item: dict, data: dict) -> dict:
+    """Row Transactions untuk Snap yang baru dibuat."""
+    return {"order_id": item["order_id"], "amount": item["gross_amount"], "transaction_status": "pending"}
+
+
+async def create_midtrans_transactions_bulk(
+    items,
+    concurrency: int | None = None,
+    record=_transaction_row,
+):
+    """
+    Buat banyak transaksi Snap sekaligus. `items`: iterable dict argumen
+    create_midtrans_transaction (order_id, gross_amount, customer_name, ...).
+
+    Async iterator hasil per item:
+      {"index", "order_id", "ok", "redirect_url", "data", "error", "recorded"}
+    Transaksi yang berhasil di-insert ke Transactions per batch
+    (BULK_INSERT_BATCH row) dan hasilnya baru di-yield setelah batch-nya
+    ditulis; recorded=False (ok tetap True, Snap sudah terbuat) kalau insert
+    row-nya gagal, mis. order_id sudah ada. record=None → tidak ditulis ke
+    DB (recorded None) dan hasil di-yield begitu selesai.
+    """
+    inserter = BatchInserter(repository.insert_transactions)
+    try:
+        async for index, item, result, error in stream_limited(
+            items, lambda item: create_midtrans_transaction(**item), concurrency
+        ):
+            if error is not None:
+                metrics.inc(metrics.OUTCOMES, "bulk.midtrans", "failed")
+                yield {"index": index, "order_id": item.get("order_id"), "ok": False,
+                       "redirect_url": None, "data": None, "error": str(error), "recorded": None}
+                continue
+            redirect_url, data = result
+            metrics.inc(metrics.OUTCOMES, "bulk.midtrans", "created")
+            entry = {"index": index, "order_id": item["order_id"], "ok": True,
+                     "redirect_url": redirect_url, "data": data, "error": None, "recorded": None}
+            if record is None:
+                yield entry
+                continue
+            for entry in mark_recorded(await inserter.add(record(item, data), entry)):
+                yield entry
+        for entry in mark_recorded(await inserter.flush()):
+            yield entry
+    finally:
+        await inserter.flush()
+
+
+async def get_midtrans_transaction_status(order_id: str):
+    """
+    Cek status transaksi Midtrans (Core API /v2/{order_id}/status).
+    Lookup bersamaan untuk order_id yang sama digabung dan hasilnya di-cache
+    (lihat lib/status_cache).
+    """
+    return await status_cache.midtrans.get(order_id, lambda: _fetch_transaction_status(order_id))
+
+
+async def _fetch_transaction_status(order_id: str):
+    config = get_midtrans_config()
+    try:
+        response = await get_transport().request(
+            "midtrans", "GET", f"{config['api_url']}/{order_id}/status",
+            endpoint="v2/{order_id}/status", headers=config["headers"],
+        )
+        response.raise_for_status()
+        return codec.loads(response.content)
+    except httpx.HTTPStatusError as e:
+        logger.error(
+            "❌ Midtrans HTTP error: %s - %s", e.response.status_code, e.response.text
+        )
+        raise RuntimeError(f"❌ Midtrans HTTP error: {e}")
+    except Exception as e:
+        logger.exception("❌ Gagal ambil status transaksi Midtrans")
+        raise RuntimeError(f"❌ Midtrans error: {e}")
@@ -0,0 +1,363 @@
+# 📍 payments/jobs/reconcile.py
+"""
+Rekonsiliasi transaksi & payout yang tidak pernah dapat callback.
+
+Kandidat di-stream dengan keyset cursor (updated_at, id), status dicek ke
+gateway secara paralel (dibatasi semaphore), lalu hasilnya ditulis dengan
+bulk update (payout) atau lewat jalur webhook (transaksi, supaya event &
+callback settlement ikut jalan). Checkpoint (updated_at, id) hanya maju
+sampai sebelum row pertama yang status gateway-nya belum final, jadi run
+berikutnya mulai dari row itu lagi: row yang belum selesai selalu dicek
+ulang, row yang sudah selesai tidak cocok lagi dengan filter status. Row
+yang lebih muda dari `min_age` dilewati dulu (callback-nya mungkin masih
+jalan).
+Order yang tertinggal di 'dispatching' (lihat lib/outbox.py) dikirim ulang
+dengan idempotency key yang sama.
+
+    python -m jobs.reconcile
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from lib import repository
+from lib.settings import env
+from lib.status import MIDTRANS_PAYMENT_RANKS, FLIP_PAYMENT_RANKS
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_reconcile_config() -> dict:
+    """Tuning rekonsiliasi, dibaca saat pertama dipakai (bukan saat import) supaya .env ikut terbaca."""
+    return {
+        "checkpoint": env("RECONCILE_CHECKPOINT", ".cache/reconcile.json"),
+        "page_size": int(env("RECONCILE_PAGE_SIZE", "500")),
+        "parallelism": int(env("RECONCILE_PARALLELISM", "10")),
+        "min_age": float(env("RECONCILE_MIN_AGE", "900")),  # detik
+        "cursor_column": env("RECONCILE_CURSOR_COLUMN", "updated_at"),
+        "flip_list_max_pages": int(env("FLIP_LIST_MAX_PAGES", "20")),
+        "resume_min_age": float(env("RESUME_DISPATCHING_MIN_AGE", "300")),  # detik
+    }
+
+
+# Status gateway → update TransactionsJual
+FLIP_DISBURSEMENT_FINAL = {"DONE": "success", "CANCELLED": "failed"}
+IRIS_PAYOUT_FINAL = {"completed": "success", "failed": "failed", "rejected": "failed"}
+
+
+# ================= Checkpoint =================
+class Checkpoint:
+    """Simpan posisi cursor terakhir per job di file JSON lokal."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or get_reconcile_config()["checkpoint"]
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def load(self, job: str) -> tuple | None:
+        state = self._read().get(job)
+        return (state["cursor"], state["key"]) if state else None
+
+    def save(self, job: str, cursor, key):
+        data = self._read()
+        data[job] = {"cursor": cursor, "key": key}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self, job: str):
+        data = self._read()
+        if data.pop(job, None) is not None:
+            with open(self.path, "w") as f:
+                json.dump(data, f)
+
+
+# ================= Helper =================
+async def _gather_limited(items, fn, parallelism: int) -> list:
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def run(item):
+        async with semaphore:
+            try:
+                return await fn(item)
+            except Exception as e:
+                logger.warning("⚠️ Cek status %s gagal: %s", item, e)
+                return None
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+class _FlipDisbursementIndex:
+    """
+    Status disbursement Flip lewat endpoint list (per halaman), di-cache selama
+    satu run. Id yang tidak ketemu dalam FLIP_LIST_MAX_PAGES dicek satu-satu.
+    """
+
+    def __init__(self, parallelism: int):
+        self.parallelism = parallelism
+        self._statuses: dict[str, str] = {}
+        self._next_page = 1
+        self._exhausted = False
+        self.max_pages = get_reconcile_config()["flip_list_max_pages"]
+
+    async def statuses(self, ids: set[str]) -> dict[str, str]:
+        from disbursement import flip_disburse
+
+        while not self._exhausted and ids - self._statuses.keys() and self._next_page <= self.max_pages:
+            res = await flip_disburse.list_disbursements(page=self._next_page)
+            data = res.get("data") or []
+            for item in data:
+                self._statuses[str(item.get("id"))] = item.get("status")
+            self._exhausted = not data or self._next_page >= (res.get("total_page") or self._next_page)
+            self._next_page += 1
+
+        missing = list(ids - self._statuses.keys())
+        results = await _gather_limited(missing, flip_disburse.get_disbursement, self.parallelism)
+        for disbursement_id, res in zip(missing, results):
+            if res and res.get("status"):
+                self._statuses[disbursement_id] = res["status"]
+        return {i: self._statuses[i] for i in ids if i in self._statuses}
+
+
+# ================= Engine =================
+async def _run_job(job, table, filters, check_chunk, checkpoint, min_age, page_size, apply=None) -> dict:
+    """
+    check_chunk(rows) → (updates, id row yang sudah final). `apply(updates)`
+    menulis hasilnya; default bulk update ke `table`.
+    """
+    config = get_reconcile_config()
+    cursor_column = config["cursor_column"]
+    min_age = config["min_age"] if min_age is None else min_age
+    page_size = page_size or config["page_size"]
+    until = (datetime.now(timezone.utc) - timedelta(seconds=min_age)).isoformat()
+    after = checkpoint.load(job)
+    stats = {"scanned": 0, "updated": 0, "unresolved": 0}
+    # Checkpoint berhenti di depan row belum final pertama yang ditemui run ini
+    blocked = False
+
+    while True:
+        rows = await repository.scan(
+            table, "*", filters, cursor_column, after=after, until=until, limit=page_size
+        )
+        if not rows:
+            break
+        updates, resolved = await check_chunk(rows)
+        if updates:
+            await (apply(updates) if apply is not None else repository.bulk_update(table, updates))
+        stats["scanned"] += len(rows)
+        stats["updated"] += len(updates)
+        stats["unresolved"] += sum(1 for row in rows if row["id"] not in resolved)
+
+        if not blocked:
+            done = None
+            for row in rows:
+                if row["id"] not in resolved:
+                    blocked = True
+                    break
+                done = row
+            if done is not None:
+                checkpoint.save(job, done[cursor_column], done["id"])
+
+        last = rows[-1]
+        after = (last[cursor_column], last["id"])
+        if len(rows) < page_size:
+            break
+
+    logger.info("🔄 Rekonsiliasi %s selesai: %s", job, stats)
+    return stats
+
+
+async def reconcile_payouts(checkpoint: Checkpoint | None = None, parallelism: int | None = None,
+                            min_age: float | None = None, page_size: int | None = None) -> dict:
+    """TransactionsJual yang masih waiting_callback → cek ke Flip / Midtrans IRIS."""
+    config = get_reconcile_config()
+    parallelism = parallelism or config["parallelism"]
+    from disbursement import midtrans_disburse
+
+    flip_index = _FlipDisbursementIndex(parallelism)
+
+    async def check_chunk(rows):
+        flip_rows = [r for r in rows if r.get("flip_ref_id")]
+        iris_rows = [r for r in rows if r.get("midtrans_ref_id") and not r.get("flip_ref_id")]
+        updates = []
+
+        flip_statuses = await flip_index.statuses({str(r["flip_ref_id"]) for r in flip_rows})
+        for row in flip_rows:
+            final = FLIP_DISBURSEMENT_FINAL.get((flip_statuses.get(str(row["flip_ref_id"])) or "").upper())
+            if final:
+                updates.append({"id": row["id"], "payout_status": final, "status": final})
+
+        iris_results = await _gather_limited(
+            [r["midtrans_ref_id"] for r in iris_rows], midtrans_disburse.get_payout, parallelism
+        )
+        for row, res in zip(iris_rows, iris_results):
+            final = IRIS_PAYOUT_FINAL.get(((res or {}).get("status") or "").lower())
+            if final:
+                updates.append({"id": row["id"], "payout_status": final, "status": final})
+        # Update payout selalu status final; row tanpa ref id juga dicek ulang run berikutnya
+        return updates, {update["id"] for update in updates}
+
+    return await _run_job(
+        "payouts", "TransactionsJual", {"status": "waiting_callback"}, check_chunk,
+        checkpoint or Checkpoint(), min_age, page_size,
+    )
+
+
+def default_transaction_gateway(row: dict) -> str:
+    return row.get("gateway") or ("flip" if row.get("source_bank") else "midtrans")
+
+
+async def reconcile_transactions(checkpoint: Checkpoint | None = None, parallelism: int | None = None,
+                                 min_age: float | None = None, page_size: int | None = None,
+                                 gateway_of=default_transaction_gateway,
+                                 on_settlement=None, on_status_change=None) -> dict:
+    """
+    Transactions dengan status belum final → cek ke Midtrans / Flip.
+
+    Status yang naik rank ditulis lewat jalur webhook (process_midtrans_payment
+    / process_flip_payment) dengan respons cek status sebagai payload, jadi
+    status_cache, event bus (PAYMENT_SETTLED dll.) dan callback ikut jalan
+    seperti callback gateway yang memang datang. Callback default-nya yang
+    didaftarkan handler webhook (lihat webhooks.journal.registered_callback).
+    """
+    config = get_reconcile_config()
+    parallelism = parallelism or config["parallelism"]
+    from gateaway.midtrans import get_midtrans_transaction_status
+    from gateaway.flip import FlipGateway
+    from webhooks.journal import registered_callback, MIDTRANS_PAYMENT, FLIP_PAYMENT
+    from webhooks.midtrans.payment import process_midtrans_payment
+    from webhooks.flip.payment import process_flip_payment
+
+    on_settlement = on_settlement or registered_callback(MIDTRANS_PAYMENT)
+    on_status_change = on_status_change or registered_callback(FLIP_PAYMENT)
+
+    flip = FlipGateway()
+    pending = [s for s, rank in MIDTRANS_PAYMENT_RANKS.items() if rank < 3]
+    pending += [s.upper() for s, rank in FLIP_PAYMENT_RANKS.items() if rank < 3]
+
+    async def check(row):
+        # Respons cek status = body callback gateway; key dari row kalau kosong
+        if gateway_of(row) == "flip":
+            res = await flip.get_transaction_status(row["transaction_id"])
+            return res.get("status"), FLIP_PAYMENT_RANKS, {"id": row["transaction_id"], **res}
+        res = await get_midtrans_transaction_status(row["order_id"])
+        return res.get("transaction_status"), MIDTRANS_PAYMENT_RANKS, {"order_id": row["order_id"], **res}
+
+    async def check_chunk(rows):
+        results = await _gather_limited(rows, check, parallelism)
+        updates, resolved = [], set()
+        for row, result in zip(rows, results):
+            if not result or not result[0]:
+                continue
+            new_status, ranks, body = result
+            new_rank = ranks.get(new_status.lower(), -1)
+            if new_rank > ranks.get((row.get("transaction_status") or "").lower(), -1):
+                updates.append((ranks, body))
+            if new_rank >= 3:
+                resolved.add(row["id"])
+        return updates, resolved
+
+    async def apply(updates):
+        # Gagal di sini menghentikan job sebelum checkpoint maju, sama seperti bulk_update gagal
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def run(ranks, body):
+            async with semaphore:
+                if ranks is FLIP_PAYMENT_RANKS:
+                    await process_flip_payment(body, on_status_change)
+                else:
+                    await process_midtrans_payment(body, on_settlement)
+
+        await asyncio.gather(*(run(ranks, body) for ranks, body in updates))
+
+    return await _run_job(
+        "transactions", "Transactions", {"transaction_status": pending}, check_chunk,
+        checkpoint or Checkpoint(), min_age, page_size, apply,
+    )
+
+
+async def resume_dispatching(parallelism: int | None = None, min_age: float | None = None,
+                             page_size: int | None = None) -> dict:
+    """
+    Kirim ulang order yang tertinggal di status 'dispatching' (proses mati /
+    timeout setelah claim outbox). Idempotency key-nya sama dengan kiriman
+    pertama, jadi gateway tidak membuat payout dobel. Batch IRIS dikirim ulang
+    utuh per payout_idempotency_key.
+    """
+    from disbursement import flip_disburse, midtrans_disburse
+    from disbursement.scheduler import default_gateway
+
+    config = get_reconcile_config()
+    parallelism = parallelism or config["parallelism"]
+    min_age = config["resume_min_age"] if min_age is None else min_age
+    page_size = page_size or config["page_size"]
+    until = (datetime.now(timezone.utc) - timedelta(seconds=min_age)).isoformat()
+    stats = {"scanned": 0, "resumed": 0}
+    after = None
+    carry: list[dict] = []  # batch IRIS yang mungkin berlanjut di halaman berikutnya
+
+    async def resend(rows):
+        flip_rows = [r for r in rows if default_gateway(r) == "flip"]
+        batches: dict[str, list[dict]] = {}
+        for row in rows:
+            if default_gateway(row) != "flip":
+                batches.setdefault(row.get("payout_idempotency_key") or row["id"], []).append(row)
+        await _gather_limited(flip_rows, flip_disburse.disburse, parallelism)
+        await _gather_limited(list(batches.values()), midtrans_disburse.disburse_many, parallelism)
+        stats["resumed"] += len(rows)
+
+    while True:
+        rows = await repository.scan(
+            "TransactionsJual", "*", {"status": "dispatching"}, "dispatched_at",
+            after=after, until=until, limit=page_size,
+        )
+        stats["scanned"] += len(rows)
+        last_page = len(rows) < page_size
+        rows, carry = carry + rows, []
+        if rows and not last_page:
+            tail_key = rows[-1].get("payout_idempotency_key")
+            while rows and tail_key and rows[-1].get("payout_idempotency_key") == tail_key:
+                carry.insert(0, rows.pop())
+        if rows:
+            await resend(rows)
+        if last_page:
+            if carry:
+                await resend(carry)
+            break
+        after = ((carry or rows)[-1]["dispatched_at"], (carry or rows)[-1]["id"])
+
+    logger.info("🔄 Resume dispatching selesai: %s", stats)
+    return stats
+
+
+async def run_reconciliation() -> dict:
+    checkpoint = Checkpoint()
+    payouts, transactions, dispatching = await asyncio.gather(
+        reconcile_payouts(checkpoint), reconcile_transactions(checkpoint), resume_dispatching()
+    )
+    return {"payouts": payouts, "transactions": transactions, "dispatching": dispatching}
+
+
+async def main():
+    from lib.lifespan import startup, shutdown
+
+    await startup()
+    try:
+        return await run_reconciliation()
+    finally:
+        await shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,252 @@
+# 📍 File: lib/bank_directory.py
+"""
+Direktori bank bersama untuk Flip & Midtrans IRIS.
+
+Nama bank dinormalisasi sekali saat index dibangun, jadi resolve nama → kode
+cukup satu lookup dict. Daftar bank Flip di-cache dengan TTL, di-refresh di
+background, dan disimpan ke snapshot di disk supaya cold start tidak perlu
+nunggu network.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+# 📌 Alias umum → nama kanonik (setelah normalisasi)
+ALIASES = {
+    "BANK CENTRAL ASIA": "BCA",
+    "BANK NEGARA INDONESIA": "BNI",
+    "BANK RAKYAT INDONESIA": "BRI",
+    "BANK TABUNGAN NEGARA": "BTN",
+    "BANK SYARIAH INDONESIA": "BSI",
+    "BANK MANDIRI": "MANDIRI",
+    "CIMB NIAGA": "CIMB",
+    "BANK CIMB NIAGA": "CIMB",
+    "PERMATA BANK": "PERMATA",
+    "BANK PERMATA": "PERMATA",
+    "BANK DANAMON": "DANAMON",
+    "OCBC NISP": "OCBC",
+    "BANK MUAMALAT": "MUAMALAT",
+    "SEA BANK": "SEABANK",
+    "BANK SEABANK": "SEABANK",
+    "BANK JAGO": "JAGO",
+    "GO PAY": "GOPAY",
+}
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+
+def normalize_bank_name(name: str) -> str:
+    """'PT. Bank Central Asia Tbk' → 'BANK CENTRAL ASIA'"""
+    key = _NON_ALNUM.sub(" ", (name or "").upper()).strip()
+    if key.startswith("PT "):
+        key = key[3:]
+    if key.endswith(" TBK"):
+        key = key[:-4]
+    return key
+
+
+def _index_keys(name: str, code: str) -> set[str]:
+    key = normalize_bank_name(name)
+    keys = {key, normalize_bank_name(code)}
+    if key.startswith("BANK "):
+        keys.add(key[5:])
+    keys.discard("")
+    return keys
+
+
+class BankDirectory:
+    """
+    Index nama bank → {gateway: bank_code}.
+    Sumber bisa static (dict) atau loader async yang return list
+    [{"name": ..., "bank_code": ...}] seperti v2/general/banks Flip.
+    """
+
+    def __init__(self, ttl: float | None = None, snapshot_path: str | None = None):
+        """
+        ttl / snapshot_path None → BANK_DIRECTORY_TTL / BANK_DIRECTORY_SNAPSHOT,
+        dibaca saat pertama dipakai (bukan saat import). snapshot_path="" → tanpa snapshot.
+        """
+        self._ttl = ttl
+        self._snapshot_path = snapshot_path
+        self._loaders = {}
+        self._banks: dict[str, list[dict]] = {}
+        self._fetched_at: dict[str, float] = {}
+        self._index: dict[str, dict[str, str]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._refresher: asyncio.Task | None = None
+        self._snapshot_loaded = False
+        self._snapshot_task: asyncio.Future | None = None
+        self._save_lock = asyncio.Lock()
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is None:
+            self._ttl = float(env("BANK_DIRECTORY_TTL", "3600"))
+        return self._ttl
+
+    @property
+    def snapshot_path(self) -> str | None:
+        if self._snapshot_path is None:
+            self._snapshot_path = env("BANK_DIRECTORY_SNAPSHOT", ".cache/bank_directory.json")
+        return self._snapshot_path or None
+
+    # ================= Sources =================
+    def register_static(self, gateway: str, mapping: dict[str, str]):
+        """Daftarkan mapping nama → kode yang tidak perlu di-fetch (mis. BANK_MAP IRIS)."""
+        banks = [{"name": name, "bank_code": code} for name, code in mapping.items()]
+        self._set_banks(gateway, banks, fetched_at=float("inf"))
+
+    def register_source(self, gateway: str, loader):
+        """Daftarkan loader async untuk gateway yang daftar banknya di-fetch dari API."""
+        self._loaders[gateway] = loader
+
+    # ================= Lookup =================
+    def lookup(self, bank_name: str, gateway: str) -> str | None:
+        """Lookup O(1) di index yang sudah ada, tanpa network."""
+        key = normalize_bank_name(bank_name)
+        codes = self._index.get(key) or self._index.get(ALIASES.get(key, ""))
+        return codes.get(gateway) if codes else None
+
+    async def resolve(self, bank_name: str, gateway: str) -> str | None:
+        """
+        Cari bank_code untuk gateway. Fetch hanya kalau index gateway masih
+        kosong; kalau sudah lewat TTL, refresh jalan di background.
+        """
+        await self._load_snapshot()
+        if gateway not in self._banks:
+            await self.refresh(gateway)
+        elif self._is_stale(gateway):
+            self._schedule_refresh(gateway)
+        return self.lookup(bank_name, gateway)
+
+    # ================= Refresh =================
+    async def refresh(self, gateway: str):
+        loader = self._loaders.get(gateway)
+        if loader is None:
+            return
+        lock = self._locks.setdefault(gateway, asyncio.Lock())
+        async with lock:
+            # Sudah di-refresh coroutine lain selagi nunggu lock
+            if gateway in self._banks and not self._is_stale(gateway):
+                return
+            banks = await loader()
+            if not isinstance(banks, list):
+                logger.error("❌ Gagal ambil daftar bank %s: %s", gateway, banks)
+                return
+            self._set_banks(gateway, banks, fetched_at=time.time())
+            await self._save_snapshot()
+            logger.info("🏦 Daftar bank %s diperbarui (%s bank)", gateway, len(banks))
+
+    def _schedule_refresh(self, gateway: str):
+        task = self._refresh_tasks.get(gateway)
+        if task and not task.done():
+            return
+        self._refresh_tasks[gateway] = asyncio.create_task(self._safe_refresh(gateway))
+
+    async def _safe_refresh(self, gateway: str):
+        try:
+            await self.refresh(gateway)
+        except Exception:
+            logger.exception("❌ Refresh daftar bank %s gagal", gateway)
+
+    def start_refresher(self, interval: float | None = None):
+        """Refresh semua sumber secara periodik di background."""
+        if self._refresher and not self._refresher.done():
+            return
+        self._refresher = asyncio.create_task(self._refresh_loop(interval or self.ttl))
+
+    async def stop_refresher(self):
+        if self._refresher:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            for gateway in list(self._loaders):
+                await self._safe_refresh(gateway)
+            await asyncio.sleep(interval)
+
+    # ================= Index =================
+    def _is_stale(self, gateway: str) -> bool:
+        return time.time() - self._fetched_at.get(gateway, 0) > self.ttl
+
+    def _set_banks(self, gateway: str, banks: list[dict], fetched_at: float):
+        self._banks[gateway] = banks
+        self._fetched_at[gateway] = fetched_at
+        for codes in self._index.values():
+            codes.pop(gateway, None)
+        for bank in banks:
+            name, code = bank.get("name"), bank.get("bank_code")
+            if not name or not code:
+                continue
+            for key in _index_keys(name, code):
+                self._index.setdefault(key, {}).setdefault(gateway, code)
+
+    # ================= Snapshot =================
+    # Baca / tulis file + JSON jalan di thread supaya event loop tidak ke-block
+    async def _load_snapshot(self):
+        if self._snapshot_loaded:
+            return
+        # resolve() yang bersamaan menunggu pembacaan yang sama
+        if self._snapshot_task is None:
+            self._snapshot_task = asyncio.ensure_future(self._read_snapshot())
+        await self._snapshot_task
+
+    async def _read_snapshot(self):
+        try:
+            path = self.snapshot_path
+            snapshot = await asyncio.to_thread(_read_json, path) if path else None
+            for gateway, entry in (snapshot or {}).items():
+                if gateway not in self._banks:
+                    self._set_banks(gateway, entry["banks"], fetched_at=entry["fetched_at"])
+        except Exception:
+            logger.exception("⚠️ Snapshot bank %s tidak bisa dibaca", self.snapshot_path)
+        finally:
+            self._snapshot_loaded = True
+
+    async def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            gateway: {"fetched_at": self._fetched_at[gateway], "banks": banks}
+            for gateway, banks in self._banks.items()
+            if gateway in self._loaders
+        }
+        # Refresh gateway berbeda bisa selesai bersamaan → satu penulis per file .tmp
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(_write_json, self.snapshot_path, snapshot)
+            except OSError:
+                logger.exception("⚠️ Gagal simpan snapshot bank %s", self.snapshot_path)
+
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# Instance global yang dipakai bareng adapter Flip & Midtrans
+bank_directory = BankDirectory()
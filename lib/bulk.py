@@ -0,0 +1,131 @@
+# 📍 File: lib/bulk.py
+"""
+Helper operasi bulk ke gateway:
+  - stream_limited : jalankan fn(item) untuk banyak item dengan concurrency
+                     terbatas, hasil di-yield begitu selesai (urutan selesai)
+  - BatchInserter  : kumpulkan row lalu insert per `batch_size` row, hasil
+                     insert dilaporkan per row
+
+Item dibaca dari iterable secara bertahap, jadi 10k item tidak membuat 10k
+task sekaligus.
+"""
+
+import asyncio
+import logging
+from functools import lru_cache
+
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+
+# 📌 Default dari env, dibaca saat pertama dipakai (bukan saat import)
+@lru_cache(maxsize=1)
+def bulk_create_concurrency() -> int:
+    return int(env("BULK_CREATE_CONCURRENCY", "20"))
+
+
+@lru_cache(maxsize=1)
+def bulk_insert_batch() -> int:
+    return int(env("BULK_INSERT_BATCH", "500"))
+
+
+_DONE = object()
+
+
+async def stream_limited(items, fn, concurrency: int | None = None):
+    """
+    Async iterator (index, item, result, error): error berisi exception kalau
+    fn(item) gagal (result None). Berhenti lebih awal (break) → sisa worker
+    dibatalkan. concurrency None → BULK_CREATE_CONCURRENCY.
+    """
+    concurrency = concurrency or bulk_create_concurrency()
+    source = enumerate(items)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        try:
+            for index, item in source:
+                try:
+                    results.put_nowait((index, item, await fn(item), None))
+                except Exception as e:
+                    results.put_nowait((index, item, None, e))
+        finally:
+            results.put_nowait(_DONE)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        running = len(workers)
+        while running:
+            entry = await results.get()
+            if entry is _DONE:
+                running -= 1
+                continue
+            yield entry
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+class BatchInserter:
+    """
+    Kumpulkan row lalu insert per `batch_size` row. add() / flush() return
+    [(tag, error)] untuk row yang baru saja ditulis (error None = masuk DB),
+    jadi caller baru melaporkan hasil item setelah row-nya benar-benar tersimpan.
+    Batch gagal (mis. satu order_id duplikat) → row di-insert satu per satu,
+    supaya yang gagal hanya row yang bermasalah.
+    """
+
+    def __init__(self, insert_fn, batch_size: int | None = None):
+        """insert_fn: async (rows) → insert banyak row dalam satu request, mis. repository.insert_transactions"""
+        self._insert_fn = insert_fn
+        self.batch_size = batch_size or bulk_insert_batch()
+        self._rows: list[tuple[dict, object]] = []
+        self.inserted = 0
+        self.failed = 0
+
+    async def add(self, row: dict, tag=None) -> list[tuple]:
+        self._rows.append((row, tag))
+        if len(self._rows) >= self.batch_size:
+            return await self.flush()
+        return []
+
+    async def flush(self) -> list[tuple]:
+        pending, self._rows = self._rows, []
+        if not pending:
+            return []
+        try:
+            await self._insert_fn([row for row, _ in pending])
+        except Exception:
+            logger.exception(
+                "❌ Gagal insert %s row (order_id %s ...), dicoba per row",
+                len(pending), [row.get("order_id") for row, _ in pending[:5]],
+            )
+        else:
+            self.inserted += len(pending)
+            return [(tag, None) for _, tag in pending]
+
+        done = []
+        for row, tag in pending:
+            try:
+                await self._insert_fn([row])
+            except Exception as e:
+                self.failed += 1
+                logger.error("❌ Gagal insert row order_id %s: %s", row.get("order_id"), e)
+                done.append((tag, e))
+            else:
+                self.inserted += 1
+                done.append((tag, None))
+        return done
+
+
+def mark_recorded(done: list[tuple]) -> list[dict]:
+    """Hasil add()/flush() dengan tag = dict hasil item → dict diberi "recorded" (dan error kalau gagal)."""
+    entries = []
+    for entry, error in done:
+        entry["recorded"] = error is None
+        if error is not None:
+            entry["error"] = f"Gagal insert Transactions: {error}"
+        entries.append(entry)
+    return entries
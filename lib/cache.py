@@ -0,0 +1,157 @@
+# 📍 File: lib/cache.py
+"""
+Helper cache bersama:
+  - SingleFlight : gabung call async yang bersamaan untuk key yang sama
+  - MemoryCache  : TTL cache in-process
+  - SQLiteCache  : TTL cache persisten di file SQLite lokal
+  - EnvCache     : SQLiteCache kalau env path diisi, selain itu MemoryCache
+
+Backend cache punya API async yang sama (get/set/delete), jadi bisa diganti
+backend lain (mis. Redis) tanpa ubah pemakainya.
+"""
+
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+
+from lib.settings import env
+
+
+class SingleFlight:
+    """Kalau ada call untuk `key` yang masih jalan, caller berikutnya ikut nunggu hasil yang sama."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn):
+        """fn: callable tanpa argumen yang return coroutine."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        # shield: caller yang di-cancel tidak ikut membatalkan call milik caller lain
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+class MemoryCache:
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._data: dict[str, tuple[float, object]] = {}
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        if len(self._data) >= self.max_entries and key not in self._data:
+            self._evict()
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._data.items() if expires_at < now]:
+            del self._data[key]
+        # Masih penuh → buang entry paling lama (urutan insert dict)
+        while len(self._data) >= self.max_entries:
+            del self._data[next(iter(self._data))]
+
+
+class SQLiteCache:
+    """TTL cache di file SQLite (WAL), value disimpan sebagai JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value, ttl: float):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+            conn.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            conn.commit()
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class EnvCache:
+    """
+    Backend dipilih saat pertama dipakai (bukan saat import, supaya .env ikut
+    terbaca): SQLiteCache di path env `path_var` kalau diisi, selain itu MemoryCache.
+    """
+
+    def __init__(self, path_var: str):
+        self.path_var = path_var
+        self._backend: MemoryCache | SQLiteCache | None = None
+
+    @property
+    def backend(self) -> MemoryCache | SQLiteCache:
+        if self._backend is None:
+            path = env(self.path_var)
+            self._backend = SQLiteCache(path) if path else MemoryCache()
+        return self._backend
+
+    async def get(self, key: str):
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value, ttl: float):
+        await self.backend.set(key, value, ttl)
+
+    async def delete(self, key: str):
+        await self.backend.delete(key)
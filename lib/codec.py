@@ -0,0 +1,43 @@
+# 📍 File: lib/codec.py
+"""
+Codec JSON bersama untuk payload webhook (masuk) dan request gateway (keluar).
+Pakai orjson kalau terpasang (opsional, `pip install orjson`), fallback ke
+modul json bawaan. Input/output selalu bytes supaya body request bisa
+langsung di-decode tanpa konversi ke str dulu.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - tergantung environment
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+class DecodeError(ValueError):
+    pass
+
+
+if orjson is not None:
+    def loads(data: bytes | str):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise DecodeError(str(e)) from None
+
+    def dumps(obj) -> bytes:
+        # OPT_NON_STR_KEYS: samakan dengan json.dumps yang menerima key int
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _encoder = json.JSONEncoder(default=str, ensure_ascii=False, separators=(",", ":"))
+
+    def loads(data: bytes | str):
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise DecodeError(str(e)) from None
+
+    def dumps(obj) -> bytes:
+        return _encoder.encode(obj).encode()
@@ -0,0 +1,333 @@
+# 📍 File: lib/http_client.py
+"""
+Transport HTTP bersama untuk semua gateway & disbursement.
+
+Satu AsyncClient long-lived per gateway (flip, bigflip, midtrans, iris),
+jadi koneksi TCP/TLS di-reuse lewat keep-alive dan tidak handshake ulang
+di setiap request.
+"""
+
+import time
+import socket
+import asyncio
+import logging
+import ipaddress
+import importlib.util
+from contextlib import asynccontextmanager
+
+import httpx
+import httpcore
+
+from lib import codec, metrics
+from lib.resilience import NO_RETRY, get_breaker, get_retry_policy, breaker_states
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+# Error setelah request dikirim yang tidak memberi tahu hasilnya (putus di
+# tengah, 5xx setelah retry, body tidak bisa dibaca): gateway mungkin sudah
+# memprosesnya, jadi request non-idempotent jangan dianggap gagal
+UNKNOWN_OUTCOME = (httpx.TransportError, httpx.HTTPStatusError, codec.DecodeError)
+
+
+# ================= DNS Cache =================
+class DNSCache:
+    """Cache semua alamat hasil getaddrinfo per (host, port) dengan TTL."""
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries: dict[tuple[str, int], tuple[float, list[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve_all(self, host: str, port: int) -> list[str]:
+        """Alamat untuk host, urutan getaddrinfo (alamat yang terakhir gagal connect di belakang)."""
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        cached = self._entries.get((host, port))
+        if cached and cached[0] > now:
+            self.hits += 1
+            return list(cached[1])
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._entries[(host, port)] = (now + self.ttl, addresses)
+        return list(addresses)
+
+    async def resolve(self, host: str, port: int) -> str:
+        return (await self.resolve_all(host, port))[0]
+
+    def demote(self, host: str, port: int, address: str):
+        """Alamat gagal connect → pindah ke urutan terakhir, connect berikutnya coba alamat lain dulu."""
+        cached = self._entries.get((host, port))
+        if cached and address in cached[1] and len(cached[1]) > 1:
+            cached[1].remove(address)
+            cached[1].append(address)
+
+
+class _CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Bungkus network backend httpcore: resolve host lewat DNSCache.
+    SNI & verifikasi sertifikat tetap pakai hostname asli (dikirim httpcore
+    saat start_tls), jadi aman walau connect ke IP.
+
+    Host dengan beberapa alamat dicoba ala happy eyeballs: alamat berikutnya
+    ikut dicoba kalau alamat sebelumnya gagal atau belum tersambung dalam
+    `attempt_delay` detik; koneksi pertama yang jadi dipakai.
+    """
+
+    def __init__(self, inner: httpcore.AsyncNetworkBackend, dns: DNSCache, stats: dict, attempt_delay: float = 0.25):
+        self._inner = inner
+        self._dns = dns
+        self._stats = stats
+        self.attempt_delay = attempt_delay
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await self._dns.resolve_all(host, port)
+        options = {"timeout": timeout, "local_address": local_address, "socket_options": socket_options}
+        if len(addresses) == 1:
+            stream = await self._inner.connect_tcp(addresses[0], port, **options)
+        else:
+            stream = await self._connect_any(host, port, addresses, options)
+        self._stats["connections_opened"] += 1
+        return stream
+
+    async def _connect_any(self, host, port, addresses: list[str], options: dict):
+        remaining = list(addresses)
+        attempts: dict[asyncio.Task, str] = {}
+        error: BaseException | None = None
+        try:
+            while remaining or attempts:
+                if remaining:
+                    address = remaining.pop(0)
+                    attempts[asyncio.create_task(self._inner.connect_tcp(address, port, **options))] = address
+                done, _ = await asyncio.wait(
+                    attempts, timeout=self.attempt_delay if remaining else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    address = attempts.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    self._dns.demote(host, port, address)
+                    logger.warning("⚠️ Connect %s (%s) gagal: %s, coba alamat lain", host, address, error)
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+            # Attempt lain yang kebetulan tersambung juga tidak dipakai
+            for result in await asyncio.gather(*attempts, return_exceptions=True):
+                if isinstance(result, httpcore.AsyncNetworkStream):
+                    await result.aclose()
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+class _PooledTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, dns: DNSCache, stats: dict, **kwargs):
+        super().__init__(**kwargs)
+        # httpx belum expose network_backend, jadi backend pool httpcore dibungkus di sini
+        self._pool._network_backend = _CachingNetworkBackend(self._pool._network_backend, dns, stats)
+
+
+# ================= Transport =================
+class HttpTransport:
+    """
+    Pool koneksi keep-alive per gateway host.
+    Panggil startup()/shutdown() dari lifespan FastAPI (lihat lifespan() di bawah).
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeout: float = 30.0,
+        dns_ttl: float = 300.0,
+    ):
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("⚠️ HTTP/2 diminta tapi package h2 tidak terpasang, fallback ke HTTP/1.1")
+            http2 = False
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.timeout = httpx.Timeout(timeout)
+        self.dns = DNSCache(ttl=dns_ttl)
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, dict] = {}
+
+    @classmethod
+    def from_env(cls) -> "HttpTransport":
+        return cls(
+            max_connections=int(env("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(env("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(env("HTTP_KEEPALIVE_EXPIRY", "30")),
+            http2=env("HTTP2_ENABLED", "false").lower() == "true",
+            timeout=float(env("HTTP_TIMEOUT", "30")),
+            dns_ttl=float(env("HTTP_DNS_TTL", "300")),
+        )
+
+    def client(self, gateway: str) -> httpx.AsyncClient:
+        """Ambil (atau buat) AsyncClient untuk gateway tertentu."""
+        client = self._clients.get(gateway)
+        if client is None or client.is_closed:
+            stats = self._stats.setdefault(
+                gateway, {"requests": 0, "in_flight": 0, "errors": 0, "connections_opened": 0}
+            )
+            transport = _PooledTransport(self.dns, stats, http2=self.http2, limits=self.limits)
+            client = httpx.AsyncClient(transport=transport, timeout=self.timeout, http2=self.http2)
+            self._clients[gateway] = client
+        return client
+
+    async def request(
+        self,
+        gateway: str,
+        method: str,
+        url: str,
+        endpoint: str | None = None,
+        idempotent: bool | None = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Kirim request lewat pool gateway, dijaga circuit breaker gateway tsb.
+        Retry (sesuai RetryPolicy gateway/endpoint) hanya untuk call idempotent:
+        GET/HEAD, atau request yang bawa header idempotency key.
+        """
+        if "json" in kwargs:
+            # Encode body sekali pakai codec bersama (orjson kalau ada), bukan json bawaan httpx
+            kwargs["content"] = codec.dumps(kwargs.pop("json"))
+            headers = kwargs.get("headers") or {}
+            if not any(k.lower() == "content-type" for k in headers):
+                kwargs["headers"] = {**headers, "Content-Type": "application/json"}
+        if idempotent is None:
+            headers = {k.lower() for k in (kwargs.get("headers") or {})}
+            idempotent = method.upper() in ("GET", "HEAD") or bool(
+                headers & {"idempotency-key", "x-idempotency-key"}
+            )
+        policy = get_retry_policy(gateway, endpoint) if idempotent else NO_RETRY
+        breaker = get_breaker(gateway)
+
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                response = await self._send(gateway, method, url, endpoint, **kwargs)
+            except policy.retry_exceptions as e:
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= policy.max_attempts:
+                    raise
+                logger.warning("🔁 %s %s gagal (%s), retry ke-%s", method, endpoint or url, e, attempt)
+            except asyncio.CancelledError:
+                # Tidak ada hasil sukses/gagal; tanpa ini slot half_open tertahan dan circuit tidak pernah pulih
+                breaker.release_trial()
+                raise
+            except Exception:
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code < 500:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                attempt += 1
+                if response.status_code not in policy.retry_statuses or attempt >= policy.max_attempts:
+                    return response
+                logger.warning(
+                    "🔁 %s %s status %s, retry ke-%s", method, endpoint or url, response.status_code, attempt
+                )
+            await asyncio.sleep(policy.delay(attempt))
+
+    async def _send(self, gateway: str, method: str, url: str, endpoint: str | None = None, **kwargs) -> httpx.Response:
+        client = self.client(gateway)
+        stats = self._stats[gateway]
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        started = metrics.start()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            stats["errors"] += 1
+            metrics.observe(metrics.GATEWAY_LATENCY, started, gateway, endpoint or method, "error")
+            raise
+        finally:
+            stats["in_flight"] -= 1
+        metrics.observe(metrics.GATEWAY_LATENCY, started, gateway, endpoint or method, response.status_code)
+        return response
+
+    async def startup(self, gateways: tuple[str, ...] = ()):
+        for gateway in gateways:
+            self.client(gateway)
+        logger.info("🔌 HTTP transport siap (http2=%s)", self.http2)
+
+    async def shutdown(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+        logger.info("🔌 HTTP transport ditutup")
+
+    def stats(self) -> dict:
+        """Statistik pool per gateway + DNS cache + state circuit breaker."""
+        return {
+            "gateways": {name: dict(s) for name, s in self._stats.items()},
+            "dns": {"hits": self.dns.hits, "misses": self.dns.misses},
+            "http2": self.http2,
+            "circuits": breaker_states(),
+        }
+
+
+# ================= Global Instance =================
+_transport: HttpTransport | None = None
+
+
+def get_transport() -> HttpTransport:
+    """Transport global, dibuat saat pertama dipakai."""
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport.from_env()
+    return _transport
+
+
+def configure_transport(**kwargs) -> HttpTransport:
+    """Ganti konfigurasi transport global (panggil sebelum startup)."""
+    global _transport
+    _transport = HttpTransport(**kwargs)
+    return _transport
+
+
+async def startup_http():
+    await get_transport().startup(("flip", "bigflip", "midtrans", "iris"))
+
+
+async def shutdown_http():
+    if _transport is not None:
+        await _transport.shutdown()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Contoh pemakaian (hanya HTTP; lib.lifespan.lifespan untuk semua resource):
+        app = FastAPI(lifespan=lifespan)
+    """
+    await startup_http()
+    try:
+        yield
+    finally:
+        await shutdown_http()
@@ -0,0 +1,232 @@
+# 📍 File: lib/journal.py
+"""
+Journal webhook lokal (SQLite WAL, append-only).
+
+Handler cukup append() body webhook yang sudah divalidasi lalu balas 200;
+shipper (webhooks/journal.py) yang me-replay event ke Supabase dan menyimpan
+checkpoint. Kalau Supabase lambat / down, webhook tetap diterima dan tidak
+ada event yang hilang; throughput ingest dibatasi disk lokal, bukan latency DB.
+
+Group commit: append() yang datang bersamaan ditulis dalam satu transaksi
+(synchronous=FULL → satu fsync per batch), dan append() baru return setelah
+batch-nya durable.
+"""
+
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookJournal:
+    def __init__(self, path: str, max_batch: int = 1000):
+        self.path = path
+        self.max_batch = max_batch
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._pending: list[tuple[str, bytes, asyncio.Future]] = []
+        self._writer: asyncio.Task | None = None
+        self._appended = asyncio.Event()
+        self.appended = 0
+        self.commits = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            # AUTOINCREMENT: seq tidak pernah dipakai ulang walau event lama sudah di-prune
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, body BLOB NOT NULL, "
+                "received_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)")
+            # Event yang terus gagal dikirim shipper `name`; bisa dikirim ulang dengan requeue_dead_letters()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letters ("
+                "name TEXT NOT NULL, seq INTEGER NOT NULL, kind TEXT NOT NULL, body BLOB NOT NULL, "
+                "attempts INTEGER NOT NULL, error TEXT, failed_at REAL NOT NULL, PRIMARY KEY (name, seq))"
+            )
+            self._conn = conn
+        return self._conn
+
+    # ================= Append (group commit) =================
+    async def append(self, kind: str, body: bytes) -> int:
+        """Tulis event ke journal; return seq setelah event durable di disk."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((kind, body, future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+        # shield: request yang di-cancel tidak membatalkan batch milik request lain
+        return await asyncio.shield(future)
+
+    async def _drain(self):
+        # Append yang masuk selama batch sebelumnya ditulis ikut batch berikutnya
+        while self._pending:
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch:]
+            try:
+                seqs = await asyncio.to_thread(self._write, [(kind, body) for kind, body, _ in batch])
+            except Exception as e:
+                logger.exception("❌ Gagal menulis %s event ke journal", len(batch))
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), seq in zip(batch, seqs):
+                if not future.done():
+                    future.set_result(seq)
+            self.appended += len(batch)
+            self.commits += 1
+            self._appended.set()
+
+    def _write(self, rows: list[tuple[str, bytes]]) -> list[int]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                seqs = [
+                    conn.execute(
+                        "INSERT INTO events (kind, body, received_at) VALUES (?, ?, ?)", (kind, body, now)
+                    ).lastrowid
+                    for kind, body in rows
+                ]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return seqs
+
+    async def wait_appended(self, timeout: float):
+        """Tunggu sampai ada event baru (maks `timeout` detik)."""
+        try:
+            await asyncio.wait_for(self._appended.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._appended.clear()
+
+    # ================= Baca & Checkpoint =================
+    def _read(self, after: int, limit: int) -> list[tuple[int, str, bytes]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT seq, kind, body FROM events WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)
+            ).fetchall()
+
+    def _checkpoint(self, name: str) -> int:
+        with self._lock:
+            row = self._connect().execute("SELECT seq FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _save_checkpoint(self, name: str, seq: int):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO checkpoints (name, seq) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET seq = excluded.seq",
+                    (name, seq),
+                )
+                # Event yang sudah dikirim semua shipper tidak dibutuhkan lagi
+                conn.execute("DELETE FROM events WHERE seq <= (SELECT MIN(seq) FROM checkpoints)")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _dead_letter(self, name: str, seq: int, kind: str, body: bytes, attempts: int, error: str | None):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO dead_letters (name, seq, kind, body, attempts, error, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, seq, kind, body, attempts, error, time.time()),
+            )
+
+    def _dead_letters(self, name: str, limit: int) -> list[tuple[int, str, bytes, int, str | None, float]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT seq, kind, body, attempts, error, failed_at FROM dead_letters "
+                "WHERE name = ? ORDER BY seq LIMIT ?", (name, limit)
+            ).fetchall()
+
+    def _delete_dead_letters(self, name: str, seqs: list[int]):
+        with self._lock:
+            self._connect().executemany(
+                "DELETE FROM dead_letters WHERE name = ? AND seq = ?", [(name, seq) for seq in seqs]
+            )
+
+    def _backlog(self, name: str) -> int:
+        after = self._checkpoint(name)
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM events WHERE seq > ?", (after,)).fetchone()[0]
+
+    async def read(self, after: int, limit: int = 500) -> list[tuple[int, str, bytes]]:
+        return await asyncio.to_thread(self._read, after, limit)
+
+    async def checkpoint(self, name: str) -> int:
+        return await asyncio.to_thread(self._checkpoint, name)
+
+    async def save_checkpoint(self, name: str, seq: int):
+        await asyncio.to_thread(self._save_checkpoint, name, seq)
+
+    async def backlog(self, name: str) -> int:
+        return await asyncio.to_thread(self._backlog, name)
+
+    async def dead_letter(self, name: str, seq: int, kind: str, body: bytes, attempts: int, error: str | None = None):
+        """Simpan event yang menyerah dikirim shipper `name` (checkpoint boleh melewatinya)."""
+        await asyncio.to_thread(self._dead_letter, name, seq, kind, body, attempts, error)
+
+    async def dead_letters(self, name: str, limit: int = 100) -> list[tuple[int, str, bytes, int, str | None, float]]:
+        return await asyncio.to_thread(self._dead_letters, name, limit)
+
+    async def requeue_dead_letters(self, name: str) -> int:
+        """Append ulang dead letter `name` sebagai event baru (mis. setelah bug-nya diperbaiki)."""
+        rows = await self.dead_letters(name, limit=-1)
+        # Append dulu baru hapus: gagal di tengah paling-paling event terkirim dua kali (update di-guard rank)
+        await asyncio.gather(*(self.append(kind, body) for _, kind, body, *_ in rows))
+        await asyncio.to_thread(self._delete_dead_letters, name, [seq for seq, *_ in rows])
+        return len(rows)
+
+    async def close(self):
+        """Tunggu append yang masih jalan, lalu tutup koneksi."""
+        if self._writer is not None:
+            await self._writer
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def metrics(self) -> dict:
+        return {"appended": self.appended, "commits": self.commits, "pending": len(self._pending)}
+
+
+# ================= Global Instance =================
+_journal: WebhookJournal | None = None
+
+
+def enable_journal(path: str | None = None, max_batch: int | None = None) -> WebhookJournal:
+    """Aktifkan journal untuk semua router webhook."""
+    global _journal
+    _journal = WebhookJournal(
+        path or env("WEBHOOK_JOURNAL_PATH", "webhook_journal.sqlite3"),
+        max_batch=max_batch or int(env("WEBHOOK_JOURNAL_MAX_BATCH", "1000")),
+    )
+    return _journal
+
+
+def get_journal() -> WebhookJournal | None:
+    """Journal aktif, atau None kalau tidak dipakai (default, WEBHOOK_JOURNAL_PATH kosong)."""
+    if _journal is None and env("WEBHOOK_JOURNAL_PATH"):
+        enable_journal()
+    return _journal
+
+
+async def close_journal():
+    if _journal is not None:
+        await _journal.close()
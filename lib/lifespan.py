@@ -0,0 +1,60 @@
+# 📍 File: lib/lifespan.py
+"""
+Startup/shutdown resource bersama package (HTTP pool, client Supabase async,
+pipeline webhook fast-ack, journal webhook + shipper, subscriber event bus).
+
+    from lib.lifespan import lifespan
+    app = FastAPI(lifespan=lifespan)
+"""
+
+from contextlib import asynccontextmanager
+
+from lib.http_client import startup_http, shutdown_http
+from lib.supabase_client import close_async_supabase
+from lib.pipeline import drain_pipeline
+from lib.repository import close_writes
+from lib.log import stop_logging
+from lib.journal import get_journal, close_journal
+
+
+async def startup(shipper: bool = True):
+    """
+    shipper=False untuk proses partisi pipeline (lib/pipeline): journal
+    cukup dikirim satu shipper, yaitu milik proses utama.
+    """
+    await startup_http()
+    if shipper and get_journal() is not None:
+        from webhooks.journal import start_shipper
+
+        start_shipper()
+
+
+async def shutdown():
+    # Drain dulu: worker webhook masih butuh HTTP & DB
+    await drain_pipeline()
+    if get_journal() is not None:
+        from webhooks.journal import stop_shipper
+
+        await stop_shipper()
+        await close_journal()
+    # Event terakhir dari pipeline / shipper diselesaikan subscriber dulu
+    from webhooks.events import drain_events
+
+    await drain_events()
+    try:
+        # FlushError (update yang tidak tertulis) dilempar setelah resource lain ditutup
+        await close_writes()
+    finally:
+        await shutdown_http()
+        await close_async_supabase()
+        # Flush log yang masih di queue (no-op kalau setup_logging tidak dipakai)
+        stop_logging()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
@@ -0,0 +1,203 @@
+# 📍 File: lib/log.py
+"""
+Logging terstruktur dengan overhead kecil di hot path:
+  - fields()        : payload dirender (allowlist + redaksi) hanya kalau record benar-benar ditulis
+  - SamplingFilter  : sampling per event (`extra={"event": ...}`), WARNING ke atas selalu lolos
+  - JsonFormatter   : satu baris JSON per record
+  - setup_logging() : QueueHandler di root + QueueListener, I/O handler jalan di thread terpisah
+
+Package ini tidak memasang handler sendiri; aplikasi yang memanggil:
+
+    from lib.log import setup_logging
+    setup_logging(level="INFO", sample_rates={"webhook.received": 0.1})
+"""
+
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+from lib.settings import env
+
+# Key yang value-nya tidak boleh masuk log (dibandingkan lowercase)
+REDACT_KEYS = frozenset({
+    "signature_key", "signature", "authorization", "api_key", "server_key", "secret",
+    "token", "callback_token", "password", "x-callback-token",
+})
+# Key yang cukup ditampilkan 4 digit terakhirnya
+MASK_KEYS = frozenset({"account_number", "beneficiary_account", "payout_account"})
+REDACTED = "***"
+
+
+def _mask(value) -> str:
+    text = str(value)
+    return f"{'*' * max(len(text) - 4, 0)}{text[-4:]}"
+
+
+def redact(data, allow: tuple | None = None, _depth: int = 0):
+    """Salinan `data` tanpa secret; kalau `allow` diisi, hanya key itu yang diambil (level teratas)."""
+    if isinstance(data, dict):
+        items = data.items() if allow is None else ((k, data[k]) for k in allow if k in data)
+        result = {}
+        for key, value in items:
+            lowered = str(key).lower()
+            if lowered in REDACT_KEYS:
+                result[key] = REDACTED
+            elif lowered in MASK_KEYS and value is not None:
+                result[key] = _mask(value)
+            elif _depth < 3:
+                result[key] = redact(value, None, _depth + 1)
+            else:
+                result[key] = "…"
+        return result
+    if isinstance(data, (list, tuple)):
+        return [redact(item, None, _depth + 1) for item in data[:20]]
+    return data
+
+
+class _Fields:
+    """Dirender ke JSON saat `str()` dipanggil, yaitu hanya waktu record diformat."""
+
+    __slots__ = ("data", "allow")
+
+    def __init__(self, data, allow):
+        self.data = data
+        self.allow = allow
+
+    def __str__(self):
+        return json.dumps(redact(self.data, self.allow), default=str, ensure_ascii=False)
+
+    __repr__ = __str__
+
+
+def fields(data, allow=None) -> _Fields:
+    """Argumen log lazy: `logger.info("📩 Webhook: %s", fields(body, MIDTRANS_LOG_FIELDS))`."""
+    return _Fields(data, tuple(allow) if allow is not None else None)
+
+
+# ================= Sampling =================
+def parse_sample_rates(spec: str) -> dict[str, float]:
+    """'webhook.received=0.1,gateway.response=0.01' → {event: rate}."""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, rate = part.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Record dengan atribut `event` ditulis dengan peluang `rates[event]`
+    (cocok juga prefix, mis. 'webhook' untuk 'webhook.received').
+    Record tanpa event atau level WARNING ke atas selalu lolos.
+    """
+
+    def __init__(self, rates: dict[str, float] | None = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved: dict[str, float] = {}
+        self.dropped = 0
+
+    def _rate(self, event: str) -> float:
+        rate = self._resolved.get(event)
+        if rate is None:
+            name = event
+            while name not in self.rates and "." in name:
+                name = name.rsplit(".", 1)[0]
+            rate = self._resolved[event] = self.rates.get(name, 1.0)
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(event)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+# ================= Formatter =================
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = redact(value) if isinstance(value, (dict, list)) else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler bawaan memformat message di thread pemanggil (prepare()).
+    Di sini record masuk queue apa adanya, format + I/O dikerjakan listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# ================= Setup =================
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging(
+    level: str | int | None = None,
+    sample_rates: dict[str, float] | None = None,
+    json_output: bool | None = None,
+    handlers: list[logging.Handler] | None = None,
+) -> SamplingFilter:
+    """
+    Pasang QueueHandler di root logger; handler asli (default: stderr) dijalankan
+    QueueListener di thread sendiri. Aman dipanggil ulang (setup lama diganti).
+    """
+    global _listener
+    stop_logging()
+
+    level = level or env("LOG_LEVEL", "INFO")
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(env("LOG_SAMPLE_RATES", ""))
+    if json_output is None:
+        json_output = env("LOG_FORMAT", "json").lower() == "json"
+
+    if handlers is None:
+        stream = logging.StreamHandler()
+        stream.setFormatter(
+            JsonFormatter() if json_output else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+        handlers = [stream]
+
+    sampler = SamplingFilter(sample_rates)
+    queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, _DeferredQueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return sampler
+
+
+def stop_logging():
+    """Flush record yang masih di queue lalu hentikan listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,153 @@
+# 📍 File: lib/metrics.py
+"""
+Metrics bawaan package: histogram latency + counter outcome.
+
+  payments_gateway_request_seconds{gateway,endpoint,status}  request HTTP ke gateway
+  payments_db_seconds{table,operation}                       call Supabase
+  payments_callback_seconds{callback,outcome}                callback user (on_settlement dll.)
+  payments_outcomes_total{kind,status}                       hasil webhook / disbursement
+
+Default mati: start() return 0.0 dan observe()/inc() langsung return, jadi
+biaya di hot path cuma satu pengecekan. Aktifkan dengan enable_metrics()
+atau env METRICS_ENABLED=true (dibaca sekali saat metrics pertama dipakai;
+reset() supaya dibaca ulang). Data dikirim ke sink (default PrometheusSink,
+yang dibaca router webhooks/metrics.py); sink lain cukup punya
+observe(name, labels, value) dan inc(name, labels, value).
+"""
+
+import time
+from bisect import bisect_left
+
+from lib.settings import env
+
+GATEWAY_LATENCY = "payments_gateway_request_seconds"
+DB_LATENCY = "payments_db_seconds"
+CALLBACK_LATENCY = "payments_callback_seconds"
+OUTCOMES = "payments_outcomes_total"
+
+# name → (tipe, help, nama label)
+METRICS = {
+    GATEWAY_LATENCY: ("histogram", "Latency request HTTP ke payment gateway", ("gateway", "endpoint", "status")),
+    DB_LATENCY: ("histogram", "Latency call Supabase per tabel & operasi", ("table", "operation")),
+    CALLBACK_LATENCY: ("histogram", "Latency callback user", ("callback", "outcome")),
+    OUTCOMES: ("counter", "Jumlah hasil webhook / disbursement per status", ("kind", "status")),
+}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class PrometheusSink:
+    """Agregasi in-process, dirender ke format text exposition Prometheus."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # name → {labels: [count per bucket..., +Inf], sum, count}
+        self._histograms: dict[str, dict[tuple, list]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+
+    def observe(self, name: str, labels: tuple, value: float):
+        series = self._histograms.setdefault(name, {})
+        entry = series.get(labels)
+        if entry is None:
+            entry = series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def inc(self, name: str, labels: tuple, value: float = 1):
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self._histograms.items():
+            _, help_text, label_names = METRICS.get(name, ("histogram", name, ()))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for labels, (counts, total, count) in series.items():
+                base = _labels(label_names, labels)
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{{{base + ',' if base else ''}{le}}} {cumulative}")
+                lines.append(f"{name}_sum{{{base}}} {total}")
+                lines.append(f"{name}_count{{{base}}} {count}")
+        for name, series in self._counters.items():
+            _, help_text, label_names = METRICS.get(name, ("counter", name, ()))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for labels, value in series.items():
+                lines.append(f"{name}{{{_labels(label_names, labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+
+
+# ================= Global Sink =================
+_sink = None
+_resolved = False  # METRICS_ENABLED sudah dibaca (atau sink di-set manual)
+
+
+def enable_metrics(sink=None):
+    """Aktifkan metrics ke `sink` (default PrometheusSink baru)."""
+    global _sink, _resolved
+    _sink = sink or PrometheusSink()
+    _resolved = True
+    return _sink
+
+
+def disable_metrics():
+    global _sink, _resolved
+    _sink = None
+    _resolved = True
+
+
+def reset():
+    """Lupakan sink & flag; METRICS_ENABLED dibaca ulang saat metrics berikutnya dipakai."""
+    global _sink, _resolved
+    _sink = None
+    _resolved = False
+
+
+def get_sink():
+    global _resolved
+    if not _resolved:
+        # Env hanya dibaca sekali; setelah itu hot path cukup cek _resolved / _sink
+        _resolved = True
+        if env("METRICS_ENABLED", "false").lower() == "true":
+            enable_metrics()
+    return _sink
+
+
+def start() -> float:
+    """Timestamp awal untuk observe(); 0.0 kalau metrics mati."""
+    sink = _sink if _resolved else get_sink()
+    return time.perf_counter() if sink is not None else 0.0
+
+
+def observe(name: str, started: float, *labels):
+    """Catat durasi sejak `started` (hasil start()) ke histogram `name`."""
+    if started and _sink is not None:
+        _sink.observe(name, labels, time.perf_counter() - started)
+
+
+def inc(name: str, *labels, value: float = 1):
+    sink = _sink if _resolved else get_sink()
+    if sink is not None:
+        sink.inc(name, labels, value)
+
+
+async def timed_callback(name: str, fn, *args):
+    """`await fn(*args)` sambil mencatat latency callback user (outcome ok/error)."""
+    started = start()
+    try:
+        result = await fn(*args)
+    except BaseException:
+        observe(CALLBACK_LATENCY, started, name, "error")
+        raise
+    observe(CALLBACK_LATENCY, started, name, "ok")
+    return result
@@ -0,0 +1,107 @@
+# 📍 File: lib/outbox.py
+"""
+Outbox disbursement di atas TransactionsJual.
+
+Alurnya:
+  1. begin()/begin_many() — claim order sebelum request ke gateway, yaitu
+     status='dispatching' + payout_idempotency_key + dispatched_at dalam satu
+     update. Order yang sudah final / sudah dikirim tidak ke-claim.
+  2. request ke gateway dengan idempotency key dari idempotency_key(), yang
+     deterministik dari gateway + id order. Retry atau kirim ulang order
+     yang sama selalu memakai key yang sama.
+  3. hasil gateway ditulis adapter ke kolom payout_* seperti biasa.
+
+Kalau proses mati, timeout, gateway balas 5xx, atau response-nya tidak
+bisa dibaca di antara langkah 2 dan 3, order tertinggal di 'dispatching'. jobs/reconcile.resume_dispatching mengirimnya ulang
+dengan key yang sama, dan gateway mengembalikan payout yang sudah ada, bukan
+membuat payout baru. Karena itu disburse aman dijalankan paralel dan di-retry
+agresif.
+
+Order yang gagal sebelum request dikirim (bank tidak support, rekening
+invalid) ditulis dengan failed_before_send(): key-nya dikosongkan, jadi
+order itu boleh di-claim lagi setelah datanya diperbaiki.
+"""
+
+import uuid
+import logging
+from datetime import datetime, timezone
+
+from lib import repository
+
+logger = logging.getLogger(__name__)
+
+# Namespace tetap: jangan diganti, key lama harus bisa dihitung ulang
+OUTBOX_NAMESPACE = uuid.UUID("5b0c4f4e-8d7a-4f3e-9a51-3f0d2b6c7e11")
+
+DISPATCHING = "dispatching"
+# Status order yang tidak boleh di-claim lagi
+DISPATCHED_STATUSES = ("waiting_callback", "success")
+# ... kecuali kalau request-nya belum pernah dikirim (payout_idempotency_key kosong)
+SENT_STATUSES = ("failed",)
+
+
+def idempotency_key(gateway: str, order_id) -> str:
+    return str(uuid.uuid5(OUTBOX_NAMESPACE, f"{gateway}:{order_id}"))
+
+
+def batch_idempotency_key(gateway: str, order_ids) -> str:
+    """
+    Key untuk satu request batch: isi batch sama (urutan apa pun) → key sama.
+    Batch berisi satu order memakai key yang sama dengan idempotency_key().
+    """
+    order_ids = sorted(map(str, order_ids))
+    if len(order_ids) == 1:
+        return idempotency_key(gateway, order_ids[0])
+    return str(uuid.uuid5(OUTBOX_NAMESPACE, f"{gateway}:batch:{','.join(order_ids)}"))
+
+
+def failed_before_send(payout_status: str, error: str) -> dict:
+    """
+    Update untuk order yang gagal sebelum request ke gateway. Key dikosongkan
+    supaya order bisa di-claim ulang; key yang sama aman dipakai lagi karena
+    belum pernah sampai ke gateway.
+    """
+    return {"payout_status": payout_status, "payout_error": error, "status": "failed", "payout_idempotency_key": None}
+
+
+def _intent(gateway: str, key: str | None) -> dict:
+    intent = {"status": DISPATCHING, "dispatched_at": datetime.now(timezone.utc).isoformat()}
+    if key is not None:
+        intent["payout_idempotency_key"] = key
+    return intent
+
+
+async def begin(order: dict, gateway: str) -> str | None:
+    """
+    Simpan intent sebelum request ke gateway. Return idempotency key, atau
+    None kalau order sudah dikirim / final (jangan dikirim lagi).
+    """
+    key = idempotency_key(gateway, order["id"])
+    claimed = await repository.claim_orders([order["id"]], _intent(gateway, key), DISPATCHED_STATUSES, SENT_STATUSES)
+    return key if claimed else None
+
+
+async def begin_many(orders: list[dict], gateway: str) -> tuple[list[dict], str | None]:
+    """
+    Claim satu batch dalam satu request. Return (order yang boleh dikirim,
+    idempotency key batch tsb). Semua row batch menyimpan key yang sama, jadi
+    resume bisa mengirim ulang batch yang persis sama.
+    """
+    if not orders:
+        return [], None
+    key = batch_idempotency_key(gateway, [o["id"] for o in orders])
+    rows = await repository.claim_orders([o["id"] for o in orders], _intent(gateway, key), DISPATCHED_STATUSES, SENT_STATUSES)
+    claimed_ids = {row["id"] for row in rows}
+    claimed = [order for order in orders if order["id"] in claimed_ids]
+    if claimed and len(claimed) < len(orders):
+        # Sebagian sudah dikirim proses lain → isi batch berubah, key juga harus ikut berubah
+        return await begin_many(claimed, gateway)
+    return claimed, key if claimed else None
+
+
+async def already_dispatched(order: dict) -> bool:
+    """Hasil untuk order yang tidak ke-claim: True kalau sudah diterima gateway sebelumnya."""
+    row = await repository.find_one("TransactionsJual", "id", order["id"], "status")
+    status = (row or {}).get("status")
+    logger.info("⏭️ Order %s tidak dikirim ulang, status sudah %s", order["id"], status)
+    return status in ("waiting_callback", "success")
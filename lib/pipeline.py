@@ -0,0 +1,311 @@
+# 📍 File: lib/pipeline.py
+"""
+Pipeline background untuk mode fast-ack webhook.
+
+Handler cukup validasi request lalu submit() ke queue; N worker async yang
+memproses DB update + callback. Queue dibatasi (bounded), jadi kalau penuh
+submit() return False dan handler bisa balas 503 + Retry-After.
+
+WebhookPipeline memproses job tanpa jaminan urutan. PartitionedPipeline
+(WEBHOOK_PARTITIONS > 0) meng-hash key entity (order_id, id Flip, ...) ke
+salah satu partisi; tiap partisi diproses satu worker secara berurutan, jadi
+callback untuk entity yang sama tidak pernah balapan, sementara entity
+berbeda tetap paralel. Dengan WEBHOOK_PARTITION_PROCESSES=true tiap partisi
+jalan di proses sendiri (pakai semua core); fn & args harus bisa di-pickle
+(fungsi level modul, bukan lambda/closure).
+
+Uvicorn multi-worker / multi-host tetap tidak menjamin urutan karena request
+untuk entity yang sama bisa masuk ke proses berbeda. Untuk itu cukup satu
+proses penerima (ack saja, ringan) + partisi proses, atau routing di load
+balancer dengan partition_of() yang sama.
+"""
+
+import pickle
+import asyncio
+import logging
+import itertools
+import multiprocessing
+import queue as queue_lib
+import zlib
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookPipeline:
+    def __init__(self, workers: int = 4, max_queue: int = 1000, retry_after: int = 5):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Jalankan worker (otomatis dipanggil saat submit pertama)."""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("🚚 Webhook pipeline jalan (%s worker, queue %s)", self.workers, self.max_queue)
+
+    def submit(self, fn, *args, key=None) -> bool:
+        """Enqueue `await fn(*args)`. Return False kalau queue penuh / sedang shutdown."""
+        if self._closing:
+            self.rejected += 1
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait((fn, args))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("⚠️ Webhook queue penuh (%s), request ditolak", self.max_queue)
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _worker(self, index: int):
+        while True:
+            fn, args = await self.queue.get()
+            try:
+                await fn(*args)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("❌ Worker %s gagal memproses %s", index, getattr(fn, "__name__", fn))
+            finally:
+                self.queue.task_done()
+
+    async def stop(self, timeout: float = 30.0):
+        """Tolak job baru, tunggu queue kosong (maks `timeout` detik), lalu matikan worker."""
+        self._closing = True
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Drain webhook pipeline timeout, %s job belum diproses", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("🚚 Webhook pipeline berhenti")
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_max": self.max_queue,
+            "workers": len(self._tasks),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+# ================= Partisi =================
+def partition_of(key, partitions: int) -> int:
+    """Partisi untuk `key`; stabil antar proses & restart (bukan hash() Python yang di-salt)."""
+    return zlib.crc32(str(key).encode()) % partitions
+
+
+async def _run_job(fn, args) -> bool:
+    try:
+        await fn(*args)
+        return True
+    except Exception:
+        logger.exception("❌ Gagal memproses %s", getattr(fn, "__name__", fn))
+        return False
+
+
+def _partition_process(index: int, jobs, processed, failed):
+    """Entry point proses partisi: event loop + resource (HTTP, Supabase) sendiri."""
+    from lib.log import setup_logging
+
+    setup_logging()
+    asyncio.run(_partition_loop(index, jobs, processed, failed))
+
+
+async def _partition_loop(index: int, jobs, processed, failed):
+    from lib.lifespan import startup, shutdown
+
+    # Shipper journal hanya di proses utama (checkpoint-nya satu nama)
+    await startup(shipper=False)
+    logger.info("🧩 Proses partisi %s jalan", index)
+    try:
+        while (item := await asyncio.to_thread(jobs.get)) is not None:
+            counter = processed if await _run_job(*pickle.loads(item)) else failed
+            with counter.get_lock():
+                counter.value += 1
+    finally:
+        await shutdown()
+
+
+class PartitionedPipeline:
+    """
+    Pipeline dengan urutan per key: job dengan key sama selalu masuk partisi
+    yang sama dan diproses berurutan. Job tanpa key dibagi round-robin.
+    """
+
+    def __init__(self, partitions: int = 4, max_queue: int = 1000, retry_after: int = 5,
+                 processes: bool = False):
+        self.partitions = partitions
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.processes = processes
+        # Batas queue dibagi rata per partisi
+        self.partition_queue = max(1, max_queue // partitions)
+        self.queues: list = []
+        self._tasks: list[asyncio.Task] = []
+        self._procs: list[multiprocessing.Process] = []
+        self._round_robin = itertools.count()
+        self._closing = False
+        self.enqueued = 0
+        self.rejected = 0
+        self._processed = 0
+        self._failed = 0
+        self._shared: tuple | None = None
+
+    @property
+    def processed(self) -> int:
+        return self._shared[0].value if self._shared else self._processed
+
+    @property
+    def failed(self) -> int:
+        return self._shared[1].value if self._shared else self._failed
+
+    def start(self):
+        """Jalankan worker / proses partisi (otomatis dipanggil saat submit pertama)."""
+        if self._tasks or self._procs:
+            return
+        if self.processes:
+            ctx = multiprocessing.get_context("spawn")
+            self._shared = (ctx.Value("q", 0), ctx.Value("q", 0))
+            self.queues = [ctx.Queue(self.partition_queue) for _ in range(self.partitions)]
+            self._procs = [
+                ctx.Process(target=_partition_process, args=(i, q, *self._shared),
+                            name=f"webhook-partition-{i}", daemon=True)
+                for i, q in enumerate(self.queues)
+            ]
+            for proc in self._procs:
+                proc.start()
+        else:
+            self.queues = [asyncio.Queue(maxsize=self.partition_queue) for _ in range(self.partitions)]
+            self._tasks = [asyncio.create_task(self._worker(i, q)) for i, q in enumerate(self.queues)]
+        logger.info(
+            "🚚 Webhook pipeline jalan (%s partisi %s, queue %s/partisi)",
+            self.partitions, "proses" if self.processes else "async", self.partition_queue,
+        )
+
+    def submit(self, fn, *args, key=None) -> bool:
+        """Enqueue `await fn(*args)` ke partisi milik `key`. Return False kalau partisi penuh / shutdown."""
+        if self._closing:
+            self.rejected += 1
+            return False
+        self.start()
+        index = partition_of(key, self.partitions) if key is not None else next(self._round_robin) % self.partitions
+        try:
+            # Proses: pickle di sini supaya error pickle langsung kelihatan di caller
+            self.queues[index].put_nowait(pickle.dumps((fn, args)) if self.processes else (fn, args))
+        except (asyncio.QueueFull, queue_lib.Full):
+            self.rejected += 1
+            logger.warning("⚠️ Partisi webhook %s penuh (%s), request ditolak", index, self.partition_queue)
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _worker(self, index: int, queue: asyncio.Queue):
+        while True:
+            fn, args = await queue.get()
+            try:
+                if await _run_job(fn, args):
+                    self._processed += 1
+                else:
+                    self._failed += 1
+            finally:
+                queue.task_done()
+
+    async def stop(self, timeout: float = 30.0):
+        """Tolak job baru, tunggu semua partisi kosong (maks `timeout` detik), lalu matikan worker."""
+        self._closing = True
+        if self._procs:
+            for jobs in self.queues:
+                await asyncio.to_thread(jobs.put, None)
+            deadline = asyncio.get_running_loop().time() + timeout
+            for proc in self._procs:
+                await asyncio.to_thread(proc.join, max(0.0, deadline - asyncio.get_running_loop().time()))
+                if proc.is_alive():
+                    logger.warning("⚠️ Drain %s timeout, proses dihentikan", proc.name)
+                    proc.terminate()
+            self._procs = []
+        if self._tasks:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Drain webhook pipeline timeout, %s job belum diproses", self._depth())
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        logger.info("🚚 Webhook pipeline berhenti")
+
+    def _depths(self) -> list[int]:
+        try:
+            return [q.qsize() for q in self.queues]
+        except NotImplementedError:  # multiprocessing.Queue.qsize di macOS
+            return []
+
+    def _depth(self) -> int:
+        return sum(self._depths())
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._depth(),
+            "queue_max": self.max_queue,
+            "partition_depths": self._depths(),
+            "partitions": self.partitions,
+            "workers": len(self._procs) or len(self._tasks),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+# ================= Global Instance =================
+_pipeline: WebhookPipeline | PartitionedPipeline | None = None
+
+
+def enable_fast_ack(workers: int | None = None, max_queue: int | None = None, retry_after: int | None = None,
+                    partitions: int | None = None, processes: bool | None = None):
+    """
+    Aktifkan mode fast-ack untuk semua router webhook. partitions > 0 →
+    PartitionedPipeline (urutan per entity terjaga), selain itu WebhookPipeline.
+    """
+    global _pipeline
+    max_queue = max_queue or int(env("WEBHOOK_QUEUE_SIZE", "1000"))
+    retry_after = retry_after or int(env("WEBHOOK_RETRY_AFTER", "5"))
+    partitions = partitions if partitions is not None else int(env("WEBHOOK_PARTITIONS", "0"))
+    if partitions > 0:
+        if processes is None:
+            processes = env("WEBHOOK_PARTITION_PROCESSES", "false").lower() == "true"
+        _pipeline = PartitionedPipeline(partitions, max_queue, retry_after, processes)
+    else:
+        _pipeline = WebhookPipeline(
+            workers=workers or int(env("WEBHOOK_WORKERS", "4")), max_queue=max_queue, retry_after=retry_after,
+        )
+    return _pipeline
+
+
+def get_pipeline() -> WebhookPipeline | PartitionedPipeline | None:
+    """Pipeline aktif, atau None kalau fast-ack tidak dipakai (default)."""
+    if _pipeline is None and env("WEBHOOK_FAST_ACK", "false").lower() == "true":
+        enable_fast_ack()
+    return _pipeline
+
+
+async def drain_pipeline(timeout: float = 30.0):
+    if _pipeline is not None:
+        await _pipeline.stop(timeout)
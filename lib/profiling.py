@@ -0,0 +1,219 @@
+# 📍 File: lib/profiling.py
+"""
+Sampling profiler opt-in untuk route webhook & fungsi disbursement.
+
+    @router.post("/midtrans")
+    @profiled("midtrans_webhook")
+    async def midtrans_webhook(request: Request, ...): ...
+
+Aktif hanya untuk nama yang ada di PROFILE_TARGETS (koma, atau "*"). Target
+& setting dibaca lewat env() saat call pertama, bukan saat import (jadi .env
+tetap dibaca lazy); nama yang tidak aktif setelah itu cuma langsung memanggil
+fungsi asli, aman dibiarkan ter-deploy. Mengubah target butuh restart.
+
+Call yang diprofile: PROFILE_SAMPLE_RATE (fraksi call), atau request yang
+membawa header PROFILE_HEADER berisi PROFILE_TOKEN (token wajib diisi,
+header tanpa token tidak dipercaya). Selama call jalan, thread sampler
+mengambil stack tiap PROFILE_INTERVAL detik:
+  - task sedang jalan di event loop → stack thread dari coroutine task itu
+  - task sedang menunggu I/O → rantai await coroutine, diberi prefix [await]
+jadi hasilnya wall-clock per call, bukan campuran task lain.
+
+Output: file folded stack (`frame;frame;frame count`, langsung bisa dibaca
+flamegraph.pl / speedscope / inferno) di PROFILE_DIR, maksimal
+PROFILE_MAX_FILES file (yang paling lama dihapus).
+"""
+
+import os
+import sys
+import hmac
+import time
+import random
+import asyncio
+import logging
+import threading
+import functools
+import contextvars
+from collections import Counter
+
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+_active: contextvars.ContextVar["Profile | None"] = contextvars.ContextVar("profile", default=None)
+
+
+def _targets() -> set[str]:
+    return {name.strip() for name in env("PROFILE_TARGETS", "").split(",") if name.strip()}
+
+
+def is_enabled(name: str) -> bool:
+    targets = _targets()
+    return name in targets or "*" in targets
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _await_chain(coro) -> list:
+    """Frame coroutine dari luar ke dalam, mengikuti cr_await / gi_yieldfrom."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+class Profile:
+    def __init__(self, name: str, task: asyncio.Task, root_frame, thread_id: int):
+        """root_frame: frame wrapper profiled(); stack di luar frame ini (framework) tidak dicatat."""
+        self.name = name
+        self.task = task
+        self.root_frame = root_frame
+        self.thread_id = thread_id
+        self.stacks: Counter[str] = Counter()
+        self.started = time.perf_counter()
+
+    def sample(self, frames: dict):
+        # Task sedang jalan: frame root ada di stack thread event loop
+        stack, frame = [], frames.get(self.thread_id)
+        while frame is not None:
+            stack.append(frame)
+            if frame is self.root_frame:
+                self.stacks[";".join(_frame_label(f) for f in reversed(stack))] += 1
+                return
+            frame = frame.f_back
+        # Task sedang menunggu (await I/O, sleep, lock, ...)
+        chain = _await_chain(self.task.get_coro())
+        if self.root_frame in chain:
+            chain = chain[chain.index(self.root_frame):]
+            self.stacks[";".join(["[await]"] + [_frame_label(f) for f in chain])] += 1
+
+
+class _Sampler:
+    """Satu thread untuk semua profile aktif; thread hanya hidup selama ada profile."""
+
+    def __init__(self):
+        self.interval = float(env("PROFILE_INTERVAL", "0.005"))
+        self._profiles: set[Profile] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                try:
+                    profile.sample(frames)
+                except Exception:  # frame berubah di tengah sampling, skip sample ini
+                    pass
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler: _Sampler | None = None
+
+
+def _get_sampler() -> _Sampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = _Sampler()
+    return _sampler
+
+
+# ================= Output =================
+def _write(profile: Profile, elapsed: float):
+    directory = env("PROFILE_DIR", ".profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{profile.name}-{time.strftime('%Y%m%dT%H%M%S')}-"
+                                   f"{os.getpid()}-{id(profile):x}-{elapsed * 1000:.0f}ms.folded")
+    with open(path, "w") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in profile.stacks.items())
+
+    max_files = int(env("PROFILE_MAX_FILES", "100"))
+    files = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".folded")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+    return path
+
+
+# ================= Decorator =================
+def _should_profile(kwargs: dict, rate: float, header: str, token: str | None) -> bool:
+    request = kwargs.get("request")
+    if token and request is not None and hmac.compare_digest(request.headers.get(header, ""), token):
+        return True
+    return rate > 0 and random.random() < rate
+
+
+def profiled(name: str):
+    """
+    Decorator untuk fungsi async (route FastAPI atau biasa). Tanpa efek kalau
+    `name` tidak ada di PROFILE_TARGETS (dicek saat call pertama). Header trusted hanya dicek kalau
+    fungsi menerima argumen `request`.
+    """
+    def decorator(fn):
+        settings = None  # (rate, header, token) kalau aktif, False kalau tidak; diisi saat call pertama
+
+        def resolve():
+            nonlocal settings
+            if not is_enabled(name):
+                settings = False
+                return settings
+            rate = float(env("PROFILE_SAMPLE_RATE", "0.01"))
+            settings = (rate, env("PROFILE_HEADER", "X-Profile"), env("PROFILE_TOKEN"))
+            logger.info("🔬 Profiling aktif untuk %s (rate %s)", name, rate)
+            return settings
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            current = resolve() if settings is None else settings
+            # Sudah di dalam call yang diprofile (mis. disburse dari route) → cukup sekali
+            if not current or _active.get() is not None or not _should_profile(kwargs, *current):
+                return await fn(*args, **kwargs)
+
+            profile = Profile(name, asyncio.current_task(), sys._getframe(), threading.get_ident())
+            token_var = _active.set(profile)
+            _get_sampler().add(profile)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _get_sampler().remove(profile)
+                _active.reset(token_var)
+                elapsed = time.perf_counter() - profile.started
+                if profile.stacks:
+                    try:
+                        path = await asyncio.to_thread(_write, profile, elapsed)
+                        logger.info("🔬 Profile %s (%.0fms) → %s", name, elapsed * 1000, path)
+                    except Exception:
+                        logger.exception("❌ Gagal menulis profile %s", name)
+
+        return wrapper
+
+    return decorator
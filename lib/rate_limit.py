@@ -0,0 +1,52 @@
+# 📍 File: lib/rate_limit.py
+"""Token bucket async + exception untuk HTTP 429 dari gateway."""
+
+import time
+import asyncio
+
+
+class RateLimited(Exception):
+    """Gateway balas 429. retry_after dalam detik (kalau ada header Retry-After)."""
+
+    def __init__(self, gateway: str, retry_after: float | None = None):
+        super().__init__(f"{gateway} rate limited (retry_after={retry_after})")
+        self.gateway = gateway
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers) -> float | None:
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """`rate` token per detik, maksimal `burst` token tersimpan."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # Lock supaya yang nunggu dilayani berurutan
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def set_rate(self, rate: float):
+        self._refill()
+        self.rate = rate
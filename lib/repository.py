@@ -0,0 +1,246 @@
+# 📍 File: lib/repository.py
+"""
+Data layer async untuk tabel Transactions, Payouts & TransactionsJual.
+Semua fungsi di sini di-await, jadi latency DB tidak nge-block webhook lain
+yang sedang jalan di worker yang sama.
+"""
+
+import logging
+from lib import metrics
+from lib.supabase_client import get_async_supabase
+from lib.write_coalescer import WriteCoalescer, FlushError
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+
+async def _table(name: str):
+    client = await get_async_supabase()
+    return client.table(name)
+
+
+async def find_one(table: str, column: str, value, columns: str = "*") -> dict | None:
+    started = metrics.start()
+    res = await (await _table(table)).select(columns).eq(column, value).limit(1).execute()
+    metrics.observe(metrics.DB_LATENCY, started, table, "select")
+    return res.data[0] if res.data else None
+
+
+async def update_where(table: str, column: str, value, changes: dict) -> list[dict] | None:
+    """Update row; kalau write coalescing aktif, update diantre (return None)."""
+    coalescer = get_coalescer()
+    if coalescer is not None:
+        await coalescer.submit(table, value, changes, key=column)
+        return None
+    started = metrics.start()
+    res = await (await _table(table)).update(changes).eq(column, value).execute()
+    metrics.observe(metrics.DB_LATENCY, started, table, "update")
+    return res.data
+
+
+async def scan(
+    table: str,
+    columns: str,
+    filters: dict,
+    cursor_column: str,
+    after: tuple | None = None,
+    until: str | None = None,
+    key: str = "id",
+    limit: int = 500,
+) -> list[dict]:
+    """
+    Satu halaman keyset pagination urut (cursor_column, key), mulai setelah
+    `after` = (cursor_value, key_value). Filter list → IN, selain itu → eq.
+    """
+    started = metrics.start()
+    query = (await _table(table)).select(columns)
+    for column, value in filters.items():
+        query = query.in_(column, value) if isinstance(value, (list, tuple)) else query.eq(column, value)
+    if after:
+        cursor_value, key_value = after
+        query = query.or_(
+            f'{cursor_column}.gt."{cursor_value}",'
+            f'and({cursor_column}.eq."{cursor_value}",{key}.gt."{key_value}")'
+        )
+    if until:
+        query = query.lte(cursor_column, until)
+    res = await query.order(cursor_column).order(key).limit(limit).execute()
+    metrics.observe(metrics.DB_LATENCY, started, table, "scan")
+    return res.data
+
+
+async def bulk_update(table: str, rows: list[dict], key: str = "id") -> int:
+    """
+    Update banyak row sekaligus dalam satu request lewat RPC bulk_update
+    (lihat sql/bulk_update.sql). Tiap row harus punya kolom `key`.
+    """
+    if not rows:
+        return 0
+    started = metrics.start()
+    client = await get_async_supabase()
+    res = await client.rpc("bulk_update", {"p_table": table, "p_key": key, "p_rows": rows}).execute()
+    metrics.observe(metrics.DB_LATENCY, started, table, "bulk_update")
+    return res.data
+
+
+async def insert_rows(table: str, rows: list[dict]) -> list[dict]:
+    """Insert banyak row dalam satu request."""
+    if not rows:
+        return []
+    started = metrics.start()
+    res = await (await _table(table)).insert(rows).execute()
+    metrics.observe(metrics.DB_LATENCY, started, table, "insert")
+    return res.data
+
+
+async def guarded_update(
+    table: str,
+    key: str,
+    value,
+    changes: dict,
+    status_column: str,
+    ranks: dict[str, int],
+    columns: list[str] | None = None,
+) -> tuple[dict | None, bool]:
+    """
+    Update status satu row dalam satu round-trip lewat RPC apply_status_update
+    (lihat sql/apply_status_update.sql). Transisi yang mundur (rank status baru
+    <= status sekarang) tidak ditulis.
+    Return (row sebelum update, applied). Row None kalau tidak ditemukan.
+    """
+    started = metrics.start()
+    client = await get_async_supabase()
+    res = await client.rpc(
+        "apply_status_update",
+        {
+            "p_table": table,
+            "p_key": key,
+            "p_value": str(value),
+            "p_changes": changes,
+            "p_status_column": status_column,
+            "p_ranks": ranks,
+            "p_columns": columns,
+        },
+    ).execute()
+    metrics.observe(metrics.DB_LATENCY, started, table, "guarded_update")
+    result = res.data or {}
+    return result.get("previous"), bool(result.get("applied"))
+
+
+# Kolom row lama yang dikirim ke callback (None = semua kolom).
+# Set ke list kolom yang benar-benar dipakai callback untuk memperkecil payload.
+CALLBACK_COLUMNS: dict[str, list[str] | None] = {
+    "Transactions": None,
+    "Payouts": None,
+}
+
+
+# ================= Write Coalescing =================
+_coalescer: WriteCoalescer | None = None
+
+
+def enable_write_coalescing(max_rows: int | None = None, max_delay: float | None = None) -> WriteCoalescer:
+    """
+    Aktifkan write-behind: update_transaction/update_payout/update_order
+    digabung per row dan di-flush sebagai bulk update.
+    """
+    global _coalescer
+    _coalescer = WriteCoalescer(
+        bulk_update,
+        max_rows=max_rows or int(env("DB_COALESCE_MAX_ROWS", "200")),
+        max_delay=max_delay or float(env("DB_COALESCE_MAX_DELAY", "0.05")),
+    )
+    return _coalescer
+
+
+def get_coalescer() -> WriteCoalescer | None:
+    if _coalescer is None and env("DB_WRITE_COALESCE", "false").lower() == "true":
+        enable_write_coalescing()
+    return _coalescer
+
+
+async def flush_writes():
+    """
+    Pastikan semua update yang diantre sudah tertulis (panggil sebelum callback / shutdown).
+    Raise FlushError kalau masih ada row yang gagal ditulis.
+    """
+    if _coalescer is not None:
+        unflushed = await _coalescer.flush()
+        if unflushed:
+            raise FlushError(unflushed)
+
+
+async def close_writes():
+    """Flush terakhir saat shutdown; raise FlushError kalau ada row yang tidak tertulis."""
+    if _coalescer is not None:
+        unflushed = await _coalescer.close()
+        if unflushed:
+            raise FlushError(unflushed)
+
+
+# ================= Transactions =================
+async def find_transaction(column: str, value) -> dict | None:
+    """column: order_id (Midtrans) atau transaction_id (Flip)"""
+    return await find_one("Transactions", column, value)
+
+
+async def insert_transactions(rows: list[dict]) -> list[dict]:
+    return await insert_rows("Transactions", rows)
+
+
+async def update_transaction(column: str, value, changes: dict):
+    return await update_where("Transactions", column, value, changes)
+
+
+async def apply_transaction_status(column: str, value, changes: dict, ranks: dict[str, int]):
+    """Guarded update Transactions.transaction_status, return (row lama, applied)."""
+    return await guarded_update(
+        "Transactions", column, value, changes, "transaction_status", ranks, CALLBACK_COLUMNS["Transactions"]
+    )
+
+
+# ================= Payouts =================
+async def find_payout(column: str, value) -> dict | None:
+    """column: flip_ref_id atau midtrans_ref_id"""
+    return await find_one("Payouts", column, value)
+
+
+async def update_payout(payout_id, changes: dict):
+    return await update_where("Payouts", "id", payout_id, changes)
+
+
+async def apply_payout_status(column: str, value, changes: dict, ranks: dict[str, int]):
+    """Guarded update Payouts.status, return (row lama, applied)."""
+    return await guarded_update("Payouts", column, value, changes, "status", ranks, CALLBACK_COLUMNS["Payouts"])
+
+
+# ================= TransactionsJual =================
+async def update_order(order_id, changes: dict):
+    """Update satu order withdraw (TransactionsJual) berdasarkan id."""
+    return await update_where("TransactionsJual", "id", order_id, changes)
+
+
+async def update_orders(rows: list[dict]) -> int:
+    """Bulk update TransactionsJual, tiap row berisi `id` + kolom yang berubah."""
+    return await bulk_update("TransactionsJual", rows)
+
+
+async def claim_orders(order_ids: list, changes: dict, exclude_statuses: tuple[str, ...],
+                       sent_statuses: tuple[str, ...] = ()) -> list[dict]:
+    """
+    Update TransactionsJual `id IN order_ids` yang status-nya belum ada di
+    `exclude_statuses`, langsung (tidak lewat write coalescing) dalam satu
+    request. Status di `sent_statuses` hanya dikecualikan kalau
+    payout_idempotency_key terisi (request-nya pernah dikirim). Return row
+    yang berhasil di-claim.
+    """
+    if not order_ids:
+        return []
+    started = metrics.start()
+    query = (await _table("TransactionsJual")).update(changes).in_("id", list(order_ids))
+    query = query.not_.in_("status", list(exclude_statuses))
+    if sent_statuses:
+        query = query.or_(f"status.not.in.({','.join(sent_statuses)}),payout_idempotency_key.is.null")
+    res = await query.execute()
+    metrics.observe(metrics.DB_LATENCY, started, "TransactionsJual", "claim")
+    return res.data or []
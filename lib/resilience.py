@@ -0,0 +1,146 @@
+# 📍 File: lib/resilience.py
+"""
+Retry policy (exponential backoff + jitter) dan circuit breaker per gateway.
+
+Retry hanya untuk call yang aman diulang: GET, atau POST yang bawa
+idempotency key. Circuit breaker membuat call ke gateway yang sedang down
+langsung gagal (CircuitOpen) tanpa nunggu timeout.
+"""
+
+import time
+import random
+import logging
+
+import httpx
+from lib.settings import env
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        retry_statuses: tuple[int, ...] = (502, 503, 504),
+        retry_exceptions: tuple[type[Exception], ...] = (httpx.TransportError,),
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.retry_exceptions = retry_exceptions
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter: acak antara 0 dan base * 2^attempt (maks max_delay)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, gateway: str, retry_after: float):
+        super().__init__(f"Circuit {gateway} open, coba lagi dalam {retry_after:.1f}s")
+        self.gateway = gateway
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    closed    → semua call jalan; `failure_threshold` gagal berturut-turut → open
+    open      → call langsung CircuitOpen sampai `reset_timeout` lewat → half_open
+    half_open → `half_open_max` call percobaan; sukses → closed, gagal → open lagi.
+                Percobaan yang dibatalkan (release_trial) atau menggantung lebih
+                dari `reset_timeout` membebaskan slot-nya untuk call berikutnya.
+    """
+
+    def __init__(self, gateway: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max: int = 1):
+        self.gateway = gateway
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_started = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = "half_open"
+            self._trial_calls = 0
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpen kalau call tidak boleh jalan."""
+        state = self.state
+        if state == "open":
+            raise CircuitOpen(self.gateway, self.reset_timeout - (time.monotonic() - self._opened_at))
+        if state == "half_open":
+            now = time.monotonic()
+            if self._trial_calls >= self.half_open_max:
+                if now - self._trial_started < self.reset_timeout:
+                    raise CircuitOpen(self.gateway, self.reset_timeout - (now - self._trial_started))
+                logger.warning("⚠️ Percobaan circuit %s tidak selesai dalam %ss, coba lagi", self.gateway, self.reset_timeout)
+                self._trial_calls = 0
+            self._trial_calls += 1
+            self._trial_started = now
+
+    def release_trial(self):
+        """Call dibatalkan sebelum ada hasil (mis. CancelledError): kembalikan slot percobaan half_open."""
+        if self._state == "half_open" and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def record_success(self):
+        if self._state != "closed":
+            logger.info("✅ Circuit %s closed lagi", self.gateway)
+        self._state = "closed"
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == "half_open" or self._failures >= self.failure_threshold:
+            if self._state != "open":
+                logger.warning("⛔ Circuit %s open setelah %s kegagalan", self.gateway, self._failures)
+            self._state = "open"
+            self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+# ================= Registry =================
+_breakers: dict[str, CircuitBreaker] = {}
+_policies: dict[tuple[str, str | None], RetryPolicy] = {}
+
+
+def get_breaker(gateway: str) -> CircuitBreaker:
+    breaker = _breakers.get(gateway)
+    if breaker is None:
+        breaker = _breakers[gateway] = CircuitBreaker(
+            gateway,
+            failure_threshold=int(env("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(env("CIRCUIT_RESET_TIMEOUT", "30")),
+        )
+    return breaker
+
+
+def configure_breaker(gateway: str, **kwargs) -> CircuitBreaker:
+    _breakers[gateway] = CircuitBreaker(gateway, **kwargs)
+    return _breakers[gateway]
+
+
+def set_retry_policy(gateway: str, policy: RetryPolicy, endpoint: str | None = None):
+    """Atur retry per gateway, atau per endpoint (mis. 'v3/disbursement') kalau diisi."""
+    _policies[(gateway, endpoint)] = policy
+
+
+def get_retry_policy(gateway: str, endpoint: str | None = None) -> RetryPolicy:
+    return _policies.get((gateway, endpoint)) or _policies.get((gateway, None)) or RetryPolicy()
+
+
+def breaker_states() -> dict:
+    return {gateway: breaker.snapshot() for gateway, breaker in _breakers.items()}
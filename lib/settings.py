@@ -0,0 +1,23 @@
+# 📍 File: lib/settings.py
+"""
+Akses environment tanpa side effect saat import.
+.env baru dibaca saat env() pertama kali dipanggil (biasanya dari factory
+client / config gateway), bukan saat module di-import.
+"""
+
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def load_env() -> bool:
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return False
+    return load_dotenv()
+
+
+def env(name: str, default: str | None = None) -> str | None:
+    load_env()
+    return os.getenv(name, default)
@@ -0,0 +1,43 @@
+# 📍 File: lib/status.py
+"""
+Urutan status (state machine monoton) per jenis transaksi.
+Rank lebih tinggi = lebih final. Dipakai RPC apply_status_update supaya
+callback yang telat / dobel tidak menimpa status yang sudah lebih maju.
+Key selalu lowercase.
+"""
+
+# Midtrans Snap → Transactions.transaction_status
+MIDTRANS_PAYMENT_RANKS = {
+    "pending": 0,
+    "authorize": 1,
+    "capture": 2,
+    "settlement": 3,
+    "deny": 3,
+    "cancel": 3,
+    "expire": 3,
+    "failure": 3,
+    "refund": 4,
+    "partial_refund": 4,
+    "chargeback": 4,
+    "partial_chargeback": 4,
+}
+
+# Flip → Transactions.transaction_status
+FLIP_PAYMENT_RANKS = {
+    "pending": 0,
+    "processed": 1,
+    "successful": 3,
+    "done": 3,
+    "cancelled": 3,
+    "failed": 3,
+}
+
+# Payouts.status (Flip & Midtrans IRIS)
+PAYOUT_RANKS = {
+    "pending": 0,
+    "queued": 0,
+    "waiting_callback": 1,
+    "processed": 1,
+    "success": 3,
+    "failed": 3,
+}
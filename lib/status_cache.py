@@ -0,0 +1,81 @@
+# 📍 File: lib/status_cache.py
+"""
+Cache hasil cek status transaksi ke gateway (Flip GET /transactions/{id},
+Midtrans GET /v2/{order_id}/status).
+
+  - call bersamaan untuk id yang sama digabung jadi satu request (SingleFlight)
+  - status belum final di-cache sebentar (STATUS_CACHE_TTL detik)
+  - status final (rank >= 3 di lib/status, mis. DONE / settlement) di-cache
+    tanpa kedaluwarsa
+  - webhook memanggil observe() setelah update DB: status final langsung
+    ditulis ke cache, selain itu entry lama dibuang supaya lookup berikutnya
+    ambil ke gateway
+
+Backend default MemoryCache, atau SQLiteCache kalau STATUS_CACHE_PATH diisi.
+Backend lain (mis. Redis) cukup di-assign ke `status_cache.backend`.
+"""
+
+from functools import lru_cache
+
+from lib.cache import EnvCache, SingleFlight
+from lib.settings import env
+from lib.status import FLIP_PAYMENT_RANKS, MIDTRANS_PAYMENT_RANKS
+
+FINAL_RANK = 3
+
+backend = EnvCache("STATUS_CACHE_PATH")  # mis. .cache/status.sqlite3
+
+
+@lru_cache(maxsize=1)
+def status_cache_ttl() -> float:
+    return float(env("STATUS_CACHE_TTL", "5"))
+
+
+class StatusCache:
+    def __init__(self, gateway: str, status_field: str, ranks: dict):
+        self.gateway = gateway
+        self.status_field = status_field
+        self.ranks = ranks
+        self._flight = SingleFlight()
+
+    def _key(self, key) -> str:
+        return f"status:{self.gateway}:{key}"
+
+    def is_final(self, data: dict) -> bool:
+        status = str(data.get(self.status_field) or "").lower()
+        return self.ranks.get(status, -1) >= FINAL_RANK
+
+    async def _store(self, key, data: dict):
+        if self.is_final(data):
+            await backend.set(self._key(key), data, float("inf"))
+        elif status_cache_ttl() > 0:
+            await backend.set(self._key(key), data, status_cache_ttl())
+
+    async def get(self, key, fetch):
+        """
+        Status untuk `key` dari cache, atau dari `fetch()` (callable tanpa
+        argumen yang return coroutine → dict response gateway).
+        """
+        cached = await backend.get(self._key(key))
+        if cached is not None:
+            return cached
+        return await self._flight.do(self._key(key), lambda: self._fetch(key, fetch))
+
+    async def _fetch(self, key, fetch):
+        data = await fetch()
+        await self._store(key, data)
+        return data
+
+    async def observe(self, key, data: dict):
+        """Dipanggil webhook setelah status baru masuk DB."""
+        if self.is_final(data):
+            await self._store(key, data)
+        else:
+            await self.invalidate(key)
+
+    async def invalidate(self, key):
+        await backend.delete(self._key(key))
+
+
+flip = StatusCache("flip", "status", FLIP_PAYMENT_RANKS)
+midtrans = StatusCache("midtrans", "transaction_status", MIDTRANS_PAYMENT_RANKS)
@@ -1,20 +1,68 @@
 # 📍 File: lib/supabase_client.py
 
-import os
+import asyncio
 import logging
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from lib.settings import env
+
+if TYPE_CHECKING:
+    from supabase import Client, AsyncClient
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    raise RuntimeError(f"❌ Gagal menghubungkan ke Supabase: {e}")
+def get_supabase_url() -> str | None:
+    return env("SUPABASE_URL")
+
+
+@lru_cache(maxsize=1)
+def get_supabase() -> "Client":
+    """Client Supabase sync, dibuat saat pertama dipakai."""
+    from supabase import create_client
+
+    try:
+        return create_client(get_supabase_url(), env("SUPABASE_KEY"))
+    except Exception as e:
+        raise RuntimeError(f"❌ Gagal menghubungkan ke Supabase: {e}")
+
+
+def __getattr__(name):
+    # Kompatibel dengan `from lib.supabase_client import supabase` / SUPABASE_URL lama
+    if name == "supabase":
+        return get_supabase()
+    if name == "SUPABASE_URL":
+        return get_supabase_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def generate_public_url(bucket_name: str, file_path: str) -> str:
-    return f"{SUPABASE_URL}/storage/v1/object/public/{bucket_name}/{file_path}"
+    return f"{get_supabase_url()}/storage/v1/object/public/{bucket_name}/{file_path}"
+
+
+# ================= Async Client =================
+_async_client: "AsyncClient | None" = None
+_async_lock = asyncio.Lock()
+
+
+async def get_async_supabase() -> "AsyncClient":
+    """
+    Client Supabase async (satu instance, pool httpx di-reuse) untuk dipakai
+    di dalam handler async supaya tidak nge-block event loop.
+    """
+    global _async_client
+    if _async_client is None:
+        async with _async_lock:
+            if _async_client is None:
+                from supabase import acreate_client
+
+                _async_client = await acreate_client(get_supabase_url(), env("SUPABASE_KEY"))
+    return _async_client
+
+
+async def close_async_supabase():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.postgrest.aclose()
+        _async_client = None
@@ -0,0 +1,130 @@
+# 📍 File: lib/write_coalescer.py
+"""
+Write-behind coalescer untuk update status.
+
+Update ke row yang sama digabung (kolom terakhir menang) lalu di-flush
+sebagai satu bulk_update per tabel saat jumlah row mencapai `max_rows`
+atau setelah `max_delay` detik. Jumlah write ke DB jadi sebanding dengan
+jumlah row yang berbeda, bukan jumlah event.
+
+Flush yang gagal mengembalikan row ke antrean dan menjadwalkan flush ulang
+dengan backoff (max_delay * 2^n, maks `max_retry_delay` detik). flush() /
+close() mengembalikan jumlah row yang belum tertulis, supaya pemanggil yang
+butuh write sudah terlihat (callback, shutdown) bisa gagal dengan jelas.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FlushError(RuntimeError):
+    """Masih ada row yang belum tertulis setelah flush (DB sedang bermasalah)."""
+
+    def __init__(self, unflushed: int):
+        super().__init__(f"{unflushed} row write coalescer belum tertulis")
+        self.unflushed = unflushed
+
+
+class WriteCoalescer:
+    def __init__(self, flush_fn, max_rows: int = 200, max_delay: float = 0.05, max_retry_delay: float = 30.0):
+        """flush_fn: async (table, rows, key) → bulk update, mis. repository.bulk_update"""
+        self._flush_fn = flush_fn
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_retry_delay = max_retry_delay
+        self._failures = 0  # flush gagal berturut-turut
+        self._pending: dict[tuple[str, str], dict] = {}
+        self._size = 0
+        self._timer: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.submitted = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+
+    async def submit(self, table: str, row_id, changes: dict, key: str = "id"):
+        """Antre update `changes` untuk row `key = row_id`, digabung dengan update sebelumnya."""
+        rows = self._pending.setdefault((table, key), {})
+        if row_id not in rows:
+            rows[row_id] = {}
+            self._size += 1
+        rows[row_id].update(changes)
+        self.submitted += 1
+
+        if self._size >= self.max_rows:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self, delay: float | None = None):
+        await asyncio.sleep(self.max_delay if delay is None else delay)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("❌ Flush write coalescer gagal")
+
+    async def flush(self) -> int:
+        """
+        Tulis semua update yang masih pending. Aman dipanggil kapan saja (mis.
+        sebelum callback). Return jumlah row yang masih pending setelahnya
+        (0 = semua tertulis); row yang gagal tetap diantre untuk retry.
+        """
+        async with self._lock:
+            pending, self._pending, self._size = self._pending, {}, 0
+            failed = False
+            for (table, key), rows in pending.items():
+                payload = [{key: row_id, **changes} for row_id, changes in rows.items()]
+                try:
+                    await self._flush_fn(table, payload, key)
+                except Exception:
+                    logger.exception("❌ Bulk update %s gagal (%s row), dicoba lagi di flush berikutnya", table, len(rows))
+                    self._requeue(table, key, rows)
+                    failed = True
+                    continue
+                self.flushes += 1
+                self.flushed_rows += len(payload)
+            if failed:
+                self._failures += 1
+                self._schedule_retry()
+            elif pending:
+                self._failures = 0
+            return self._size if failed else 0
+
+    def _schedule_retry(self):
+        """Tanpa ini row yang di-requeue baru ditulis kalau ada submit() baru."""
+        delay = min(self.max_retry_delay, self.max_delay * 2 ** self._failures)
+        if self._timer is not None and not self._timer.done() and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = asyncio.create_task(self._flush_later(delay))
+        logger.warning("🔁 %s row write coalescer di-flush ulang dalam %.2fs", self._size, delay)
+
+    def _requeue(self, table: str, key: str, rows: dict):
+        current = self._pending.setdefault((table, key), {})
+        for row_id, changes in rows.items():
+            if row_id not in current:
+                current[row_id] = {}
+                self._size += 1
+            # Update yang masuk setelah flush gagal tetap menang
+            current[row_id] = {**changes, **current[row_id]}
+
+    async def close(self) -> int:
+        """Flush terakhir; return jumlah row yang tidak tertulis."""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        unflushed = await self.flush()
+        # Flush terakhir gagal → jangan tinggalkan timer retry setelah close
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        if unflushed:
+            logger.error("❌ %s row write coalescer tidak tertulis saat close", unflushed)
+        return unflushed
+
+    def metrics(self) -> dict:
+        return {
+            "pending_rows": self._size,
+            "consecutive_failures": self._failures,
+            "submitted": self.submitted,
+            "flushed_rows": self.flushed_rows,
+            "flushes": self.flushes,
+        }
@@ -0,0 +1,76 @@
+-- 📍 File: sql/apply_status_update.sql
+-- Update status satu row dalam satu round-trip, dengan guard state machine.
+-- Dipanggil dari lib/repository.guarded_update.
+--
+--   p_table / p_key / p_value : row yang di-update, mis. 'Transactions', 'order_id', 'ORD-1'
+--   p_changes                 : kolom baru (jsonb object)
+--   p_status_column           : kolom status yang dijaga, mis. 'transaction_status'
+--   p_ranks                   : urutan status, mis. {"pending": 0, "settlement": 3}
+--   p_columns                 : kolom row lama yang dikembalikan (null = semua)
+--
+-- Status baru hanya ditulis kalau rank-nya lebih tinggi dari status sekarang,
+-- jadi callback telat / dobel (pending setelah settlement) jadi no-op.
+-- Status yang tidak ada di p_ranks selalu diizinkan.
+--
+-- Return: {"found": bool, "applied": bool, "previous": {...row sebelum update}}
+
+create or replace function apply_status_update(
+  p_table text,
+  p_key text,
+  p_value text,
+  p_changes jsonb,
+  p_status_column text,
+  p_ranks jsonb,
+  p_columns text[] default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  row_id tid;
+  prev jsonb;
+  projected jsonb;
+  old_rank integer;
+  new_rank integer;
+  sets text;
+begin
+  if p_table not in ('Transactions', 'Payouts', 'TransactionsJual') then
+    raise exception 'apply_status_update: table % tidak diizinkan', p_table;
+  end if;
+
+  -- Lock row & ambil state lama (value di-cast ke tipe kolom supaya index kepakai)
+  execute format(
+    'select t.ctid, to_jsonb(t) from %1$I t
+      where t.%2$I = (jsonb_populate_record(null::%1$I, jsonb_build_object(%2$L, $1))).%2$I
+      limit 1 for update',
+    p_table, p_key
+  ) into row_id, prev using p_value;
+
+  if row_id is null then
+    return jsonb_build_object('found', false, 'applied', false, 'previous', null);
+  end if;
+
+  if p_columns is null then
+    projected := prev;
+  else
+    select coalesce(jsonb_object_agg(key, value), '{}'::jsonb) into projected
+      from jsonb_each(prev) where key = any(p_columns);
+  end if;
+
+  old_rank := (p_ranks ->> lower(prev ->> p_status_column))::integer;
+  new_rank := (p_ranks ->> lower(p_changes ->> p_status_column))::integer;
+  if old_rank is not null and new_rank is not null and new_rank <= old_rank then
+    return jsonb_build_object('found', true, 'applied', false, 'previous', projected);
+  end if;
+
+  select string_agg(format('%1$I = (jsonb_populate_record(null::%2$I, $1)).%1$I', k, p_table), ', ')
+    into sets
+    from jsonb_object_keys(p_changes) as k;
+
+  if sets is not null then
+    execute format('update %1$I set %2$s where ctid = $2', p_table, sets) using p_changes, row_id;
+  end if;
+
+  return jsonb_build_object('found', true, 'applied', true, 'previous', projected);
+end;
+$$;
@@ -0,0 +1,39 @@
+-- 📍 File: sql/bulk_update.sql
+-- Update banyak row (tiap row boleh beda kolom) dalam satu round-trip.
+-- Dipanggil dari lib/repository.bulk_update:
+--   select bulk_update('TransactionsJual', 'id', '[{"id": 1, "status": "failed"}]');
+-- Hanya kolom yang ada di tiap object yang di-update, jadi tidak butuh
+-- kolom NOT NULL lain seperti upsert.
+
+create or replace function bulk_update(p_table text, p_key text, p_rows jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+  r jsonb;
+  sets text;
+  n integer;
+  updated integer := 0;
+begin
+  if p_table not in ('Transactions', 'Payouts', 'TransactionsJual') then
+    raise exception 'bulk_update: table % tidak diizinkan', p_table;
+  end if;
+
+  for r in select value from jsonb_array_elements(p_rows) loop
+    select string_agg(format('%1$I = (jsonb_populate_record(null::%2$I, $1)).%1$I', k, p_table), ', ')
+      into sets
+      from jsonb_object_keys(r) as k
+     where k <> p_key;
+    continue when sets is null;
+
+    execute format(
+      'update %1$I set %2$s where %3$I = (jsonb_populate_record(null::%1$I, $1)).%3$I',
+      p_table, sets, p_key
+    ) using r;
+    get diagnostics n = row_count;
+    updated := updated + n;
+  end loop;
+
+  return updated;
+end;
+$$;
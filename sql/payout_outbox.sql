@@ -0,0 +1,17 @@
+-- 📍 File: sql/payout_outbox.sql
+-- Kolom outbox di TransactionsJual untuk disbursement (lihat lib/outbox.py).
+--
+-- Sebelum request ke gateway, order di-claim: status = 'dispatching' +
+-- idempotency key deterministik (uuid5 dari gateway + id order). Hasil
+-- gateway ditulis ke kolom payout_* seperti biasa. Order yang tertinggal di
+-- 'dispatching' (proses crash / timeout) dikirim ulang oleh
+-- jobs/reconcile.resume_dispatching dengan key yang sama, jadi gateway tidak
+-- membuat payout dobel.
+
+alter table "TransactionsJual"
+  add column if not exists payout_idempotency_key text,
+  add column if not exists dispatched_at timestamptz;
+
+create index if not exists transactionsjual_dispatching_idx
+  on "TransactionsJual" (dispatched_at, id)
+  where status = 'dispatching';
@@ -0,0 +1,200 @@
+# 📍 payments/webhooks/events.py
+"""
+Event bus untuk consumer hasil webhook (notifikasi, ledger, analytics, ...).
+
+    from webhooks import events
+
+    @events.on(events.PAYMENT_SETTLED, concurrency=4, timeout=10)
+    async def kirim_notif(event: events.Event):
+        ...
+
+    events.subscribe(events.PAYOUT_FAILED, catat_ledger)  # fungsi sync → thread pool sendiri
+
+Handler webhook cuma publish() (non-blocking) setelah status baru masuk DB.
+Tiap subscriber punya queue sendiri (bounded), N worker dan timeout per
+event, jadi subscriber yang lambat tidak menambah latency response webhook
+maupun subscriber lain. Queue subscriber penuh → event untuk subscriber itu
+di-drop (dicatat di log & metrics outcome "dropped").
+
+Timeout tidak membatalkan handler: coroutine async di-cancel, tapi fungsi
+sync yang sudah jalan di thread tetap jalan sampai selesai (thread tidak
+bisa dihentikan dari luar). Karena itu tiap subscriber sync punya thread
+pool sendiri sebesar `concurrency`, bukan default executor bersama: handler
+yang macet hanya memakan slot subscriber itu (event berikutnya menunggu
+thread kosong, termasuk dalam timeout-nya), tidak ikut menahan
+asyncio.to_thread / DNS lookup di bagian lain aplikasi.
+
+Callback on_settlement / on_status_change di router tetap jalan seperti
+sebelumnya; bus ini tambahan, bukan pengganti.
+"""
+
+import asyncio
+import inspect
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from lib import metrics
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_SETTLED = "payment.settled"
+PAYMENT_STATUS_CHANGED = "payment.status_changed"
+PAYOUT_SUCCEEDED = "payout.succeeded"
+PAYOUT_FAILED = "payout.failed"
+
+
+@dataclass(slots=True, frozen=True)
+class Event:
+    type: str
+    gateway: str
+    key: str            # order_id / transaction_id / reference payout
+    status: str | None
+    transaction: dict   # row DB sebelum update
+    payload: dict       # body webhook mentah
+
+
+class Subscriber:
+    def __init__(self, event_type: str, fn, name: str | None = None, max_queue: int = 1000,
+                 concurrency: int = 1, timeout: float = 30.0):
+        self.event_type = event_type
+        self.fn = fn
+        self.name = name or getattr(fn, "__qualname__", repr(fn))
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None  # khusus subscriber sync
+        self.delivered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+    def offer(self, event: Event) -> bool:
+        """Antre event tanpa menunggu; False kalau queue subscriber penuh."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.inc(metrics.OUTCOMES, f"event.{self.name}", "dropped")
+            logger.warning("⚠️ Queue subscriber %s penuh (%s), event %s %s di-drop",
+                           self.name, self.max_queue, event.type, event.key)
+            return False
+        return True
+
+    async def _worker(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                await self._deliver(event)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, event: Event):
+        started = metrics.start()
+        try:
+            call = self.fn(event) if self.is_async else self._run_in_thread(event)
+            await asyncio.wait_for(call, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.observe(metrics.CALLBACK_LATENCY, started, self.name, "timeout")
+            logger.error("⏱️ Subscriber %s timeout (%ss) untuk %s %s", self.name, self.timeout, event.type, event.key)
+        except Exception:
+            self.failed += 1
+            metrics.observe(metrics.CALLBACK_LATENCY, started, self.name, "error")
+            logger.exception("❌ Subscriber %s gagal untuk %s %s", self.name, event.type, event.key)
+        else:
+            self.delivered += 1
+            metrics.observe(metrics.CALLBACK_LATENCY, started, self.name, "ok")
+
+    def _run_in_thread(self, event: Event) -> asyncio.Future:
+        """Seperti asyncio.to_thread, tapi di pool milik subscriber ini."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"event-{self.name}")
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self._executor, context.run, self.fn, event)
+
+    async def stop(self, timeout: float = 30.0):
+        """Tunggu queue kosong (maks `timeout` detik), lalu matikan worker."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Drain subscriber %s timeout, %s event belum diproses", self.name, self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            # Handler sync yang masih jalan (timeout) dibiarkan selesai sendiri
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "dropped": self.dropped,
+        }
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: dict[str, list[Subscriber]] = {}
+
+    def subscribe(self, event_type: str, fn, name: str | None = None, max_queue: int = 1000,
+                  concurrency: int = 1, timeout: float = 30.0) -> Subscriber:
+        """
+        Daftarkan `fn(event)` (async atau sync) untuk `event_type`. `timeout`
+        tidak menghentikan fungsi sync yang sudah jalan (lihat docstring modul).
+        """
+        subscriber = Subscriber(event_type, fn, name, max_queue, concurrency, timeout)
+        self._subscribers.setdefault(event_type, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.event_type, [])
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+
+    def on(self, event_type: str, **options):
+        """Versi decorator dari subscribe()."""
+        def decorator(fn):
+            self.subscribe(event_type, fn, **options)
+            return fn
+        return decorator
+
+    def publish(self, event_type: str, gateway: str, key, status: str | None,
+                transaction: dict, payload: dict) -> int:
+        """Kirim event ke semua subscriber `event_type`; return jumlah subscriber yang menerima."""
+        subscribers = self._subscribers.get(event_type)
+        if not subscribers:
+            return 0
+        event = Event(event_type, gateway, str(key), status, transaction, payload)
+        return sum(subscriber.offer(event) for subscriber in subscribers)
+
+    def subscribers(self) -> list[Subscriber]:
+        return [s for subscribers in self._subscribers.values() for s in subscribers]
+
+    async def drain(self, timeout: float = 30.0):
+        await asyncio.gather(*(s.stop(timeout) for s in self.subscribers()))
+
+
+# ================= Global Instance =================
+bus = EventBus()
+subscribe = bus.subscribe
+unsubscribe = bus.unsubscribe
+on = bus.on
+publish = bus.publish
+
+
+async def drain_events(timeout: float = 30.0):
+    """Dipanggil lifespan shutdown setelah pipeline & shipper berhenti."""
+    await bus.drain(timeout)
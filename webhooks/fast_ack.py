@@ -0,0 +1,23 @@
+# 📍 payments/webhooks/fast_ack.py
+from fastapi import HTTPException
+from lib.pipeline import get_pipeline
+
+
+def fast_ack(fn, *args) -> bool:
+    """
+    Kalau mode fast-ack aktif, enqueue `fn(*args)` ke pipeline dan return True
+    (handler langsung balas 200). Queue penuh → 503 + Retry-After.
+    Return False kalau fast-ack tidak aktif, handler proses seperti biasa.
+    Key partisi diambil dari `partition_key` payload (argumen pertama).
+    """
+    pipeline = get_pipeline()
+    if pipeline is None:
+        return False
+    key = getattr(args[0], "partition_key", None) if args else None
+    if not pipeline.submit(fn, *args, key=key):
+        raise HTTPException(
+            status_code=503,
+            detail="Webhook queue penuh, coba lagi nanti",
+            headers={"Retry-After": str(pipeline.retry_after)},
+        )
+    return True
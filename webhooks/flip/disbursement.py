@@ -1,89 +1,146 @@
 # 📍 payments/webhooks/flip/disbursement.py
 from fastapi import APIRouter, Request, HTTPException
 import logging
-import os
-import json
-from lib.supabase_client import supabase
+from lib import repository
+from lib.settings import env
+from lib import metrics
+from lib.profiling import profiled
+from lib.status import PAYOUT_RANKS
+from webhooks import events
+from webhooks.fast_ack import fast_ack
+from webhooks.journal import journal_ack, FLIP_DISBURSEMENT
+from webhooks.schemas import FlipDisbursement, FlipInquiry, PayloadError
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
 
 router = APIRouter()
 
 # ================= Flip Config =================
-FLIP_CALLBACK_TOKEN = os.getenv("FLIP_CALLBACK_TOKEN")
+def get_callback_token() -> str | None:
+    return env("FLIP_CALLBACK_TOKEN")
 
 
 async def default_callback(tx, payload):
     """Callback default, bisa diganti saat import package"""
-    logger.info(f"ℹ️ Default callback dipanggil untuk transaksi {tx['id']}")
+    logger.info("ℹ️ Default callback dipanggil untuk transaksi %s", tx["id"])
+
+
+async def process_flip_disbursement(payload: FlipDisbursement | dict, on_settlement=None):
+    """
+    Update tabel Payouts dari callback Flip + jalankan callback.
+    Dipanggil langsung oleh handler, atau oleh worker pipeline di mode fast-ack.
+    """
+    if isinstance(payload, dict):
+        payload = FlipDisbursement.from_dict(payload)
+    disbursement_id = payload.id
+    changes = payload.changes()
+
+    # Update DB + ambil row lama dalam satu round-trip
+    tx, applied = await repository.apply_payout_status("flip_ref_id", disbursement_id, changes, PAYOUT_RANKS)
+    if not tx:
+        logger.warning("❌ Transaksi dengan Flip ID %s tidak ditemukan di DB", disbursement_id)
+        metrics.inc(metrics.OUTCOMES, "webhook.flip.disbursement", "not_found")
+        return {"status": "ok", "note": "transaction not found"}
+
+    if not applied:
+        metrics.inc(metrics.OUTCOMES, "webhook.flip.disbursement", "ignored")
+        logger.info("⏭️ Callback Flip %s diabaikan, status sudah %s", disbursement_id, tx.get("status"))
+        return {"status": "ok", "note": "already final"}
+
+    metrics.inc(metrics.OUTCOMES, "webhook.flip.disbursement", changes["status"])
+
+    # Write yang masih diantre harus sudah terlihat oleh callback
+    await repository.flush_writes()
+
+    if not payload.final:
+        # Payout masih diproses gateway: belum ada event / callback sampai status final datang
+        return {"status": "ok"}
+
+    events.publish(
+        events.PAYOUT_SUCCEEDED if payload.success else events.PAYOUT_FAILED,
+        "flip", disbursement_id, changes["status"], tx, payload.raw,
+    )
+
+    # Jalankan callback opsional
+    callback_fn = on_settlement or default_callback
+    try:
+        await metrics.timed_callback("on_settlement", callback_fn, tx, payload.raw)
+    except Exception as e:
+        logger.error("❌ Gagal eksekusi callback: %s", e)
+
+    return {"status": "ok"}
 
 
 @router.post("/disbursement/flip")
+@profiled("flip_disbursement_callback")
 async def flip_disbursement_callback(request: Request, on_settlement=None):
     """
     Handler generic Flip Disbursement
     on_settlement: async callback(tx, payload) ketika payout sukses
     """
     try:
-        form = await request.form()
-        data = form.get("data")
-        token = form.get("token")
-
-        if not data or not token:
+        try:
+            data, token = FlipDisbursement.split_form(await request.body())
+        except PayloadError:
             logger.error("❌ Payload Flip callback invalid")
             raise HTTPException(status_code=400, detail="Invalid callback payload")
 
         # ✅ Verifikasi token callback
-        if token != FLIP_CALLBACK_TOKEN:
-            logger.warning("❌ Invalid callback token: %s", token)
+        if token != get_callback_token():
+            logger.warning("❌ Invalid callback token")
             raise HTTPException(status_code=401, detail="Unauthorized callback")
 
-        disbursement_data = json.loads(data)
-        status = disbursement_data.get("status")  # DONE / CANCELLED
-        disbursement_id = disbursement_data.get("id")
+        try:
+            payload = FlipDisbursement.decode(data)
+        except PayloadError as e:
+            logger.error("❌ Payload Flip callback invalid: %s", e)
+            raise HTTPException(status_code=400, detail="Invalid callback payload")
 
         logger.info(
             "📩 Flip Callback Received | ID: %s | Status: %s",
-            disbursement_id,
-            status,
+            payload.id,
+            payload.status,
+            extra={"event": "webhook.received", "gateway": "flip"},
         )
 
-        # Ambil transaksi dari DB
-        res = (
-            supabase.table("Payouts")
-            .select("*")
-            .eq("flip_ref_id", disbursement_id)
-            .execute()
-        )
-        if not res.data:
-            logger.warning(
-                f"❌ Transaksi dengan Flip ID {disbursement_id} tidak ditemukan di DB"
-            )
-            return {"status": "ok", "note": "transaction not found"}
-
-        tx = res.data[0]
-        new_status = "success" if status.upper() == "DONE" else "failed"
-
-        # Update DB
-        supabase.table("Payouts").update(
-            {
-                "status": new_status,
-                "payout_status": "success" if new_status == "success" else "failed",
-            }
-        ).eq("id", tx["id"]).execute()
-
-        # Jalankan callback opsional
-        callback_fn = on_settlement or default_callback
-        try:
-            await callback_fn(tx, disbursement_data)
-        except Exception as e:
-            logger.error(f"❌ Gagal eksekusi callback: {e}")
+        if await journal_ack(FLIP_DISBURSEMENT, data, on_settlement):
+            return {"status": "ok"}
+        if fast_ack(process_flip_disbursement, payload, on_settlement):
+            return {"status": "ok"}
 
-        return {"status": "ok"}
+        return await process_flip_disbursement(payload, on_settlement)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error processing Flip callback: {e}")
+        logger.error("❌ Error processing Flip callback: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.post("/disbursement/flip/inquiry")
+async def flip_inquiry_callback(request: Request):
+    """
+    Callback hasil bank account inquiry Flip (inquiry yang awalnya PENDING).
+    Hasil masuk inquiry cache dan diteruskan ke check_accounts_many yang
+    menunggu inquiry_key tsb.
+    """
+    try:
+        data, token = FlipDisbursement.split_form(await request.body())
+        if token != get_callback_token():
+            logger.warning("❌ Invalid callback token")
+            raise HTTPException(status_code=401, detail="Unauthorized callback")
+        payload = FlipInquiry.decode(data)
+    except PayloadError as e:
+        logger.error("❌ Payload Flip inquiry callback invalid: %s", e)
+        raise HTTPException(status_code=400, detail="Invalid callback payload")
+
+    logger.info(
+        "📩 Flip Inquiry Callback | Key: %s | Status: %s", payload.inquiry_key, payload.status,
+        extra={"event": "webhook.received", "gateway": "flip"},
+    )
+    # Import di sini: flip_disburse ikut import httpx, router tidak perlu memuatnya saat import
+    from disbursement.flip_disburse import resolve_inquiry
+
+    waiting = await resolve_inquiry(payload.raw)
+    metrics.inc(metrics.OUTCOMES, "webhook.flip.inquiry", payload.status.lower())
+    return {"status": "ok", "matched": waiting}
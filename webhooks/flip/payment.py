@@ -1,71 +1,102 @@
 # payments/webhooks/flip/payment.py
-from fastapi import APIRouter, Request
-from lib.supabase_client import supabase
+from fastapi import APIRouter, Request, HTTPException
+from lib import repository
+from lib.profiling import profiled
+from lib.status import FLIP_PAYMENT_RANKS
+from lib import metrics, status_cache
+from lib.log import fields
+from webhooks import events
+from webhooks.fast_ack import fast_ack
+from webhooks.journal import journal_ack, FLIP_PAYMENT
+from webhooks.schemas import FlipPayment, PayloadError
 import logging
-from datetime import datetime
 
 router = APIRouter()
 logger = logging.getLogger("webhooks.flip")
 
+# Field body webhook yang boleh masuk log
+FLIP_LOG_FIELDS = ("id", "status", "amount", "source_bank", "destination_bank", "account_number", "created_at")
+
+# Status Flip yang berarti pembayaran masuk (event PAYMENT_SETTLED)
+FLIP_SETTLED_STATUSES = ("SUCCESSFUL", "DONE")
+
+
+async def process_flip_payment(payload: FlipPayment | dict, on_status_change=None):
+    """
+    Update tabel Transactions dari payload webhook Flip + jalankan callback.
+    Dipanggil langsung oleh handler, atau oleh worker pipeline di mode fast-ack.
+    """
+    if isinstance(payload, dict):
+        payload = FlipPayment.from_dict(payload)
+    transaction_id = payload.id
+    transaction_status = payload.status
+
+    # Update transaksi + ambil row lama dalam satu round-trip
+    transaction, applied = await repository.apply_transaction_status(
+        "transaction_id", transaction_id, payload.changes(), FLIP_PAYMENT_RANKS
+    )
+    if not transaction:
+        logger.warning("❌ Transaksi dengan transaction_id %s tidak ditemukan.", transaction_id)
+        metrics.inc(metrics.OUTCOMES, "webhook.flip.payment", "not_found")
+        return {"message": "Transaksi tidak ditemukan"}
+
+    if not applied:
+        metrics.inc(metrics.OUTCOMES, "webhook.flip.payment", "ignored")
+        logger.info(
+            "⏭️ Status %s untuk %s diabaikan (status sekarang %s)",
+            transaction_status, transaction_id, transaction.get("transaction_status"),
+        )
+        return {"message": "OK"}
+    logger.info("📝 Transaksi %s berhasil diupdate.", transaction_id, extra={"event": "webhook.applied"})
+    metrics.inc(metrics.OUTCOMES, "webhook.flip.payment", transaction_status)
+
+    # Lookup status berikutnya tidak perlu polling ke gateway
+    await status_cache.flip.observe(transaction_id, payload.raw)
+
+    # Write yang masih diantre harus sudah terlihat oleh callback
+    await repository.flush_writes()
+
+    events.publish(events.PAYMENT_STATUS_CHANGED, "flip", transaction_id, transaction_status, transaction, payload.raw)
+    if str(transaction_status).upper() in FLIP_SETTLED_STATUSES:
+        events.publish(events.PAYMENT_SETTLED, "flip", transaction_id, transaction_status, transaction, payload.raw)
+
+    # Jalankan callback opsional
+    if on_status_change:
+        await metrics.timed_callback("on_status_change", on_status_change, transaction, payload.raw)
+
+    return {"message": "OK"}
+
 
 @router.post("/flip")
+@profiled("flip_webhook")
 async def flip_webhook(request: Request, on_status_change=None):
     """
     Webhook Flip generik
     on_status_change: callback async yang dipanggil saat status transaksi berubah
     """
-    logger.info("📥 Endpoint /flip dipanggil!")
+    logger.debug("📥 Endpoint /flip dipanggil!")
 
     try:
-        body = await request.json()
-        logger.info(f"📩 Webhook Flip diterima:\n{body}")
-
-        transaction_id = body.get("id")
-        if not transaction_id:
-            logger.warning("⚠️ transaction_id tidak ditemukan dalam body!")
-            return {"message": "transaction_id kosong"}
-
-        transaction_status = body.get("status")
-        transaction_time = body.get("created_at", datetime.utcnow().isoformat())
-
-        # Update data transaksi di tabel Transactions
-        update_data = {
-            "transaction_status": transaction_status,
-            "amount": body.get("amount"),
-            "currency": body.get("currency"),
-            "source_bank": body.get("source_bank"),
-            "destination_bank": body.get("destination_bank"),
-            "account_number": body.get("account_number"),
-            "account_name": body.get("account_name"),
-            "transaction_time": transaction_time,
-        }
-
-        # Ambil transaksi dari DB
-        res = (
-            supabase.table("Transactions")
-            .select("*")
-            .eq("transaction_id", transaction_id)
-            .execute()
+        raw = await request.body()
+        payload = FlipPayment.decode(raw)
+        logger.info(
+            "📩 Webhook Flip diterima: %s", fields(payload.raw, FLIP_LOG_FIELDS),
+            extra={"event": "webhook.received", "gateway": "flip"},
         )
-        transaction = res.data[0] if res.data else None
-        if not transaction:
-            logger.warning(
-                f"❌ Transaksi dengan transaction_id {transaction_id} tidak ditemukan."
-            )
-            return {"message": "Transaksi tidak ditemukan"}
-
-        # Update transaksi
-        supabase.table("Transactions").update(update_data).eq(
-            "transaction_id", transaction_id
-        ).execute()
-        logger.info(f"📝 Transaksi {transaction_id} berhasil diupdate.")
-
-        # Jalankan callback opsional
-        if on_status_change:
-            await on_status_change(transaction, body)
 
-        return {"message": "OK"}
+        if await journal_ack(FLIP_PAYMENT, raw, on_status_change):
+            return {"message": "OK"}
+        if fast_ack(process_flip_payment, payload, on_status_change):
+            return {"message": "OK"}
+
+        return await process_flip_payment(payload, on_status_change)
 
-    except Exception as e:
+    except PayloadError as e:
+        logger.warning("⚠️ Body webhook Flip invalid: %s", e)
+        return {"message": str(e)}
+    except HTTPException:
+        raise
+    except Exception:
+        # 5xx supaya Flip mengirim ulang webhook; balas 200 di sini = event hilang
         logger.exception("❌ Gagal memproses webhook Flip")
-        return {"message": f"Error: {e}"}
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -0,0 +1,320 @@
+# 📍 payments/webhooks/journal.py
+"""
+Mode journal webhook (aktif kalau WEBHOOK_JOURNAL_PATH diisi, lihat lib/journal).
+
+Handler: validasi → journal_ack() → balas 200 setelah event durable di disk.
+Shipper: baca event setelah checkpoint per batch, jalankan process_* yang
+sama dengan mode biasa (guarded update + callback), lalu simpan checkpoint.
+
+Callback (on_settlement / on_status_change) tidak ikut tersimpan di journal:
+shipper memakai callback yang didaftarkan per kind lewat register_callback()
+(callback yang dioper ke handler otomatis didaftarkan). Daftarkan saat
+startup supaya event yang di-replay setelah restart juga memanggilnya.
+
+Dalam satu batch event untuk entity yang sama (partition_key) diproses
+berurutan, entity berbeda paralel. Tiap event tetap lewat process_* sendiri
+(satu guarded update per row), bukan bulk_update per tabel: rank guard,
+event bus & callback butuh row lama per event, jadi batch-nya ada di baca
+journal + checkpoint, dan update-nya jalan paralel per entity.
+
+Gagal sementara (DB / network / 5xx, lihat _is_transient) → di-replay dari
+checkpoint dengan backoff eksponensial, berapa lama pun outage-nya; replay
+aman karena update status di-guard rank. Gagal deterministik (payload
+invalid, kind tidak dikenal, 4xx) langsung dipindah ke tabel dead_letters;
+exception lain dipindah setelah `max_attempts` kali. Kirim ulang dead letter
+dengan journal.requeue_dead_letters(name) setelah penyebabnya diperbaiki.
+"""
+
+import sys
+import asyncio
+import logging
+
+from fastapi import HTTPException
+
+from lib import metrics
+from lib.journal import WebhookJournal, get_journal
+from lib.settings import env
+from webhooks.schemas import PayloadError
+
+logger = logging.getLogger(__name__)
+
+MIDTRANS_PAYMENT = "midtrans.payment"
+FLIP_PAYMENT = "flip.payment"
+IRIS_DISBURSEMENT = "iris.disbursement"
+FLIP_DISBURSEMENT = "flip.disbursement"
+
+
+_callbacks: dict[str, object] = {}
+
+# Exception dari modul ini = DB / gateway / network sedang bermasalah, bukan event-nya.
+# Dicek lewat sys.modules supaya module ini tidak ikut import httpx / postgrest.
+_TRANSIENT_ERRORS = (
+    ("httpx", "TransportError"),
+    ("httpx", "HTTPStatusError"),
+    ("postgrest.exceptions", "APIError"),
+    ("lib.resilience", "CircuitOpen"),
+    ("lib.rate_limit", "RateLimited"),
+    ("lib.write_coalescer", "FlushError"),
+)
+
+
+def _is_transient(error: BaseException) -> bool:
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500
+    if isinstance(error, (OSError, asyncio.TimeoutError)):
+        return True
+    for module, name in _TRANSIENT_ERRORS:
+        cls = getattr(sys.modules.get(module), name, None)
+        if cls is not None and isinstance(error, cls):
+            return True
+    return False
+
+
+def register_callback(kind: str, callback):
+    """Callback yang dioper shipper ke process(payload, callback) untuk event `kind`."""
+    _callbacks[kind] = callback
+
+
+def registered_callback(kind: str):
+    """Callback yang terdaftar untuk event `kind` (None kalau belum ada)."""
+    return _callbacks.get(kind)
+
+
+def default_sinks() -> dict:
+    """kind → (decode(bytes) → payload, process(payload[, callback]))"""
+    from webhooks.midtrans.payment import process_midtrans_payment
+    from webhooks.flip.payment import process_flip_payment
+    from webhooks.midtrans.disbursement import process_midtrans_disbursement
+    from webhooks.flip.disbursement import process_flip_disbursement
+    from webhooks.schemas import MidtransPayment, FlipPayment, IrisDisbursement, FlipDisbursement
+
+    return {
+        MIDTRANS_PAYMENT: (MidtransPayment.decode, process_midtrans_payment),
+        FLIP_PAYMENT: (FlipPayment.decode, process_flip_payment),
+        IRIS_DISBURSEMENT: (IrisDisbursement.decode, process_midtrans_disbursement),
+        FLIP_DISBURSEMENT: (FlipDisbursement.decode, process_flip_disbursement),
+    }
+
+
+async def journal_ack(kind: str, raw: bytes, callback=None) -> bool:
+    """
+    Kalau journal aktif, tulis `raw` ke journal dan return True (handler
+    langsung balas 200). Journal gagal ditulis → 503 supaya gateway retry.
+    Return False kalau journal tidak aktif.
+
+    `callback` handler didaftarkan untuk `kind`; journal hanya bisa memakai
+    satu callback per kind, jadi callback berbeda untuk kind yang sama
+    ditolak dengan warning (callback pertama yang dipakai).
+    """
+    journal = get_journal()
+    if journal is None:
+        return False
+    if callback is not None:
+        registered = _callbacks.get(kind)
+        if registered is None:
+            register_callback(kind, callback)
+        elif registered is not callback:
+            logger.warning("⚠️ Mode journal: callback %s untuk %s diabaikan, yang dipakai %s",
+                           getattr(callback, "__qualname__", callback), kind,
+                           getattr(registered, "__qualname__", registered))
+    try:
+        await journal.append(kind, raw)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Webhook journal tidak tersedia, coba lagi nanti",
+                            headers={"Retry-After": "5"})
+    return True
+
+
+class JournalShipper:
+    def __init__(self, journal: WebhookJournal, sinks: dict | None = None, name: str = "supabase",
+                 batch_size: int = 500, concurrency: int = 16, interval: float = 0.5, retry_delay: float = 5.0,
+                 max_retry_delay: float = 300.0, max_attempts: int = 10):
+        self.journal = journal
+        self.sinks = sinks if sinks is not None else default_sinks()
+        self.name = name
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        # seq → jumlah gagal berturut-turut (hanya di memori, reset saat restart)
+        self._attempts: dict[int, int] = {}
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._wake = asyncio.Event()  # memotong sleep backoff saat stop()
+        self.shipped = 0
+        self.skipped = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("🚢 Journal shipper %s jalan", self.name)
+
+    async def _run(self):
+        failures = 0  # putaran gagal berturut-turut, untuk backoff
+        while not self._stopping:
+            try:
+                count, ok = await self.ship_once()
+            except Exception:
+                logger.exception("❌ Journal shipper %s gagal", self.name)
+                count, ok = 0, False
+            if not ok:
+                failures += 1
+                delay = min(self.max_retry_delay, self.retry_delay * 2 ** (failures - 1))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            failures = 0
+            if count < self.batch_size:
+                await self.journal.wait_appended(self.interval)
+
+    async def ship_once(self) -> tuple[int, bool]:
+        """
+        Kirim satu batch setelah checkpoint. Return (jumlah event dibaca,
+        True kalau semua berhasil). Checkpoint maju sampai sebelum event
+        pertama yang gagal.
+        """
+        after = await self.journal.checkpoint(self.name)
+        events = await self.journal.read(after, self.batch_size)
+        if not events:
+            return 0, True
+
+        # Urutan per entity dijaga: satu grup = satu partition_key
+        groups: dict[str, list] = {}
+        for seq, kind, body in events:
+            payload, process, error = self._decode(seq, kind, body)
+            key = payload.partition_key if payload is not None else f"#{seq}"
+            groups.setdefault(key, []).append((seq, kind, body, payload, process, error))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failed_seqs = await asyncio.gather(*(self._ship_group(group, semaphore) for group in groups.values()))
+        failed = [seq for seq in failed_seqs if seq is not None]
+
+        last = min(failed) - 1 if failed else events[-1][0]
+        if last > after:
+            await self.journal.save_checkpoint(self.name, last)
+        return len(events), not failed
+
+    def _decode(self, seq: int, kind: str, body: bytes):
+        """Return (payload, process, error); error diisi kalau event tidak akan pernah bisa diproses."""
+        sink = self.sinks.get(kind)
+        if sink is None:
+            return None, None, f"kind {kind} tidak dikenal"
+        decode, process = sink
+        try:
+            return decode(body), process, None
+        except PayloadError as e:
+            return None, None, f"payload invalid: {e}"
+
+    async def _ship_group(self, group: list, semaphore: asyncio.Semaphore) -> int | None:
+        """Proses event satu entity berurutan; return seq pertama yang gagal (None kalau semua ok)."""
+        async with semaphore:
+            for seq, kind, body, payload, process, error in group:
+                if payload is None:
+                    # Decode / validasi gagal: deterministik, replay tidak akan membantu
+                    if not await self._dead_letter(seq, kind, body, 1, error):
+                        return seq
+                    continue
+                callback = _callbacks.get(kind)
+                try:
+                    await (process(payload, callback) if callback is not None else process(payload))
+                except Exception as e:
+                    if _is_transient(e):
+                        # DB / network down: retry dengan backoff, tidak menghabiskan jatah attempt
+                        logger.warning("⚠️ Event journal %s gagal sementara (%r), di-retry nanti", seq, e)
+                        self.failed += 1
+                        return seq
+                    if isinstance(e, HTTPException):
+                        # 4xx (mis. order tidak ditemukan) tidak akan berhasil di-replay
+                        if not await self._dead_letter(seq, kind, body, 1, f"{e.status_code}: {e.detail}"):
+                            return seq
+                        continue
+                    logger.exception("❌ Event journal %s gagal diproses", seq)
+                    if not await self._give_up(seq, kind, body, repr(e)):
+                        return seq
+                else:
+                    self._attempts.pop(seq, None)
+                    self.shipped += 1
+                    metrics.inc(metrics.OUTCOMES, "journal.shipper", "shipped")
+        return None
+
+    async def _give_up(self, seq: int, kind: str, body: bytes, error: str) -> bool:
+        """
+        Catat satu kegagalan non-transient (bug di process_*, data aneh);
+        True kalau sudah `max_attempts` kali dan event dipindah ke dead_letters.
+        """
+        self.failed += 1
+        attempts = self._attempts.get(seq, 0) + 1
+        self._attempts[seq] = attempts
+        if attempts < self.max_attempts:
+            return False
+        return await self._dead_letter(seq, kind, body, attempts, error)
+
+    async def _dead_letter(self, seq: int, kind: str, body: bytes, attempts: int, error: str) -> bool:
+        """Pindah event ke dead_letters; True kalau berhasil (checkpoint boleh lewat)."""
+        try:
+            await self.journal.dead_letter(self.name, seq, kind, body, attempts, error)
+        except Exception:
+            logger.exception("❌ Gagal memindah event journal %s ke dead_letters", seq)
+            return False
+        self._attempts.pop(seq, None)
+        self.dead_lettered += 1
+        metrics.inc(metrics.OUTCOMES, "journal.shipper", "dead_letter")
+        logger.error("☠️ Event journal %s (%s) dipindah ke dead_letters setelah %s percobaan: %s",
+                     seq, kind, attempts, error)
+        return True
+
+    async def stop(self, timeout: float = 30.0):
+        """Selesaikan batch yang sedang jalan lalu berhenti; sisa event dikirim saat start berikutnya."""
+        self._stopping = True
+        self._wake.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            # Checkpoint belum maju → batch ini dikirim ulang saat start berikutnya
+            logger.warning("⚠️ Journal shipper %s tidak selesai dalam %ss", self.name, timeout)
+        self._task = None
+        logger.info("🚢 Journal shipper %s berhenti", self.name)
+
+    def metrics(self) -> dict:
+        return {"shipped": self.shipped, "skipped": self.skipped, "failed": self.failed,
+                "dead_lettered": self.dead_lettered}
+
+
+# ================= Global Instance =================
+_shipper: JournalShipper | None = None
+
+
+def start_shipper(sinks: dict | None = None) -> JournalShipper | None:
+    """Jalankan shipper untuk journal aktif (dipanggil lifespan startup)."""
+    global _shipper
+    journal = get_journal()
+    if journal is None:
+        return None
+    if _shipper is None:
+        _shipper = JournalShipper(
+            journal, sinks,
+            batch_size=int(env("WEBHOOK_JOURNAL_BATCH", "500")),
+            concurrency=int(env("WEBHOOK_JOURNAL_CONCURRENCY", "16")),
+            max_attempts=int(env("WEBHOOK_JOURNAL_MAX_ATTEMPTS", "10")),
+        )
+    _shipper.start()
+    return _shipper
+
+
+def get_shipper() -> JournalShipper | None:
+    return _shipper
+
+
+async def stop_shipper(timeout: float = 30.0):
+    global _shipper
+    if _shipper is not None:
+        await _shipper.stop(timeout)
+        _shipper = None
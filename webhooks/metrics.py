@@ -0,0 +1,63 @@
+# 📍 payments/webhooks/metrics.py
+"""
+Endpoint Prometheus, di-mount di samping router webhook:
+
+    from lib.metrics import enable_metrics
+    from webhooks.metrics import router as metrics_router
+
+    enable_metrics()
+    app.include_router(metrics_router)
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from lib import metrics
+from lib.pipeline import get_pipeline
+from lib.repository import get_coalescer
+from lib.journal import get_journal
+from webhooks.journal import get_shipper
+from webhooks.events import bus
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _gauges() -> str:
+    """Gauge dari komponen yang sudah punya stats sendiri (queue webhook, write coalescer, journal, event bus)."""
+    lines = []
+    pipeline = get_pipeline()
+    if pipeline is not None:
+        for key, value in pipeline.metrics().items():
+            if key == "partition_depths":
+                lines.extend(
+                    f'payments_webhook_pipeline_partition_depth{{partition="{i}"}} {depth}'
+                    for i, depth in enumerate(value)
+                )
+            elif isinstance(value, (int, float)):
+                lines.append(f"payments_webhook_pipeline_{key} {value}")
+    coalescer = get_coalescer()
+    if coalescer is not None:
+        for key, value in coalescer.metrics().items():
+            if isinstance(value, (int, float)):
+                lines.append(f"payments_write_coalescer_{key} {value}")
+    journal = get_journal()
+    if journal is not None:
+        lines.extend(f"payments_webhook_journal_{key} {value}" for key, value in journal.metrics().items())
+    shipper = get_shipper()
+    if shipper is not None:
+        lines.extend(f"payments_journal_shipper_{key} {value}" for key, value in shipper.metrics().items())
+    for subscriber in bus.subscribers():
+        labels = f'event="{subscriber.event_type}",subscriber="{subscriber.name}"'
+        lines.extend(
+            f"payments_event_subscriber_{key}{{{labels}}} {value}" for key, value in subscriber.metrics().items()
+        )
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    sink = metrics.get_sink()
+    body = sink.render() if isinstance(sink, metrics.PrometheusSink) else ""
+    return PlainTextResponse(body + _gauges(), media_type=CONTENT_TYPE)
@@ -1,56 +1,43 @@
 # 📍 payments/webhooks/midtrans/disbursement.py
 from fastapi import APIRouter, Request, HTTPException
-from lib.supabase_client import supabase
+from lib import repository
+from lib.profiling import profiled
+from lib.status import PAYOUT_RANKS
+from lib import metrics
+from lib.log import fields
+from webhooks import events
+from webhooks.fast_ack import fast_ack
+from webhooks.journal import journal_ack, IRIS_DISBURSEMENT
+from webhooks.schemas import IrisDisbursement, PayloadError
 import logging
 
 logger = logging.getLogger("webhooks.disbursement")
 router = APIRouter()
 
+# Field callback IRIS yang boleh masuk log
+IRIS_LOG_FIELDS = ("id", "disbursement_id", "reference_no", "status", "amount", "error_code", "error_message")
+
 
 async def default_callback(tx, payload):
     """Callback default, bisa diganti saat import package"""
-    logger.info(f"ℹ️ Default callback dipanggil untuk transaksi {tx['id']}")
+    logger.info("ℹ️ Default callback dipanggil untuk transaksi %s", tx["id"])
 
 
-@router.post("/disbursement/midtrans")
-async def disbursement_webhook(request: Request, on_settlement=None):
+async def process_midtrans_disbursement(payload: IrisDisbursement | dict, on_settlement=None):
     """
-    Webhook generic untuk disbursement
-    on_settlement: async callback(tx, payload) ketika payout sukses
+    Update tabel Payouts dari callback IRIS + jalankan callback.
+    Dipanggil langsung oleh handler, atau oleh worker pipeline di mode fast-ack.
     """
-    try:
-        payload = await request.json()
-    except Exception as e:
-        logger.error(f"❌ Payload invalid: {e}")
-        raise HTTPException(status_code=400, detail="Invalid payload")
-
-    logger.info(f"📩 Webhook callback diterima: {payload}")
+    if isinstance(payload, dict):
+        payload = IrisDisbursement.from_dict(payload)
+    midtrans_ref_id = payload.reference_no
+    changes = payload.changes()
 
-    # Ambil reference ID: production / sandbox
-    midtrans_ref_id = (
-        payload.get("id")
-        or payload.get("disbursement_id")
-        or payload.get("reference_no")
-    )
-    status = payload.get("status")  # success / pending / failed / test
-
-    if not midtrans_ref_id or not status:
-        logger.error("❌ Missing disbursement_id atau status di payload")
-        raise HTTPException(status_code=400, detail="Missing required fields")
-
-    if status.lower() == "test":
-        status = "success"
-
-    res = (
-        supabase.table("Payouts")
-        .select("*")
-        .eq("midtrans_ref_id", midtrans_ref_id)
-        .execute()
-    )
-    if not res.data:
-        logger.warning(
-            f"❌ Transaksi dengan ref {midtrans_ref_id} tidak ditemukan di DB"
-        )
+    # Update DB + ambil row lama dalam satu round-trip
+    tx, applied = await repository.apply_payout_status("midtrans_ref_id", midtrans_ref_id, changes, PAYOUT_RANKS)
+    if not tx:
+        logger.warning("❌ Transaksi dengan ref %s tidak ditemukan di DB", midtrans_ref_id)
+        metrics.inc(metrics.OUTCOMES, "webhook.iris.disbursement", "not_found")
         if "test-reference" in midtrans_ref_id:
             logger.info(
                 "ℹ️ Sandbox test, transaksi tidak ada di DB. Melewati update dan notif."
@@ -58,20 +45,57 @@ async def disbursement_webhook(request: Request, on_settlement=None):
             return {"status": "ok", "sandbox_test": True}
         raise HTTPException(status_code=404, detail="Order not found")
 
-    tx = res.data[0]
-    new_status = "success" if status.lower() == "success" else "failed"
-    supabase.table("Payouts").update(
-        {
-            "status": new_status,
-            "payout_status": "success" if new_status == "success" else "failed",
-        }
-    ).eq("id", tx["id"]).execute()
+    if not applied:
+        metrics.inc(metrics.OUTCOMES, "webhook.iris.disbursement", "ignored")
+        logger.info("⏭️ Callback IRIS %s diabaikan, status sudah %s", midtrans_ref_id, tx.get("status"))
+        return {"status": "ok", "note": "already final"}
+
+    metrics.inc(metrics.OUTCOMES, "webhook.iris.disbursement", changes["status"])
+
+    # Write yang masih diantre harus sudah terlihat oleh callback
+    await repository.flush_writes()
+
+    if not payload.final:
+        # Payout masih diproses gateway: belum ada event / callback sampai status final datang
+        return {"status": "ok"}
+
+    events.publish(
+        events.PAYOUT_SUCCEEDED if payload.success else events.PAYOUT_FAILED,
+        "iris", midtrans_ref_id, changes["status"], tx, payload.raw,
+    )
 
     # Jalankan callback opsional
     callback_fn = on_settlement or default_callback
     try:
-        await callback_fn(tx, payload)
+        await metrics.timed_callback("on_settlement", callback_fn, tx, payload.raw)
     except Exception as e:
-        logger.error(f"❌ Gagal eksekusi callback: {e}")
+        logger.error("❌ Gagal eksekusi callback: %s", e)
 
     return {"status": "ok"}
+
+
+@router.post("/disbursement/midtrans")
+@profiled("disbursement_webhook")
+async def disbursement_webhook(request: Request, on_settlement=None):
+    """
+    Webhook generic untuk disbursement
+    on_settlement: async callback(tx, payload) ketika payout sukses
+    """
+    try:
+        raw = await request.body()
+        payload = IrisDisbursement.decode(raw)
+    except PayloadError as e:
+        logger.error("❌ Payload invalid: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(
+        "📩 Webhook callback diterima: %s", fields(payload.raw, IRIS_LOG_FIELDS),
+        extra={"event": "webhook.received", "gateway": "iris"},
+    )
+
+    if await journal_ack(IRIS_DISBURSEMENT, raw, on_settlement):
+        return {"status": "ok"}
+    if fast_ack(process_midtrans_disbursement, payload, on_settlement):
+        return {"status": "ok"}
+
+    return await process_midtrans_disbursement(payload, on_settlement)
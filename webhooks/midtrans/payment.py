@@ -1,71 +1,102 @@
 # payments/webhooks/midtrans/payment.py
-from fastapi import APIRouter, Request
-from lib.supabase_client import supabase
+from fastapi import APIRouter, Request, HTTPException
+from lib import repository
+from lib.profiling import profiled
+from lib.status import MIDTRANS_PAYMENT_RANKS
+from lib import metrics, status_cache
+from lib.log import fields
+from webhooks import events
+from webhooks.fast_ack import fast_ack
+from webhooks.journal import journal_ack, MIDTRANS_PAYMENT
+from webhooks.schemas import MidtransPayment, PayloadError
 import logging
-from datetime import datetime
 
 router = APIRouter()
 logger = logging.getLogger("webhooks.midtrans")
 
+# Field body webhook yang boleh masuk log (signature_key dll. tidak ikut)
+MIDTRANS_LOG_FIELDS = (
+    "order_id", "transaction_id", "transaction_status", "fraud_status", "payment_type",
+    "gross_amount", "status_code", "transaction_time", "settlement_time",
+)
+
+
+async def process_midtrans_payment(payload: MidtransPayment | dict, on_settlement=None):
+    """
+    Update tabel Transactions dari payload webhook Midtrans + jalankan callback.
+    Dipanggil langsung oleh handler, atau oleh worker pipeline di mode fast-ack.
+    """
+    if isinstance(payload, dict):
+        payload = MidtransPayment.from_dict(payload)
+    order_id = payload.order_id
+    transaction_status = payload.transaction_status
+
+    # Update transaksi + ambil row lama dalam satu round-trip
+    transaction, applied = await repository.apply_transaction_status(
+        "order_id", order_id, payload.changes(), MIDTRANS_PAYMENT_RANKS
+    )
+    if not transaction:
+        logger.warning("❌ Transaksi dengan order_id %s tidak ditemukan.", order_id)
+        metrics.inc(metrics.OUTCOMES, "webhook.midtrans.payment", "not_found")
+        return {"message": "Transaksi tidak ditemukan"}
+
+    if not applied:
+        metrics.inc(metrics.OUTCOMES, "webhook.midtrans.payment", "ignored")
+        logger.info(
+            "⏭️ Status %s untuk %s diabaikan (status sekarang %s)",
+            transaction_status, order_id, transaction.get("transaction_status"),
+        )
+        return {"message": "OK"}
+    logger.info("📝 Transaksi %s berhasil diupdate.", order_id, extra={"event": "webhook.applied"})
+    metrics.inc(metrics.OUTCOMES, "webhook.midtrans.payment", transaction_status)
+
+    # Lookup status berikutnya tidak perlu polling ke gateway
+    await status_cache.midtrans.observe(order_id, payload.raw)
+
+    # Write yang masih diantre harus sudah terlihat oleh callback
+    await repository.flush_writes()
+
+    events.publish(events.PAYMENT_STATUS_CHANGED, "midtrans", order_id, transaction_status, transaction, payload.raw)
+    if transaction_status == "settlement":
+        events.publish(events.PAYMENT_SETTLED, "midtrans", order_id, transaction_status, transaction, payload.raw)
+
+    # Jalankan callback opsional jika settlement
+    if transaction_status == "settlement" and on_settlement:
+        await metrics.timed_callback("on_settlement", on_settlement, transaction, payload.raw)
+
+    return {"message": "OK"}
+
 
 @router.post("/midtrans")
+@profiled("midtrans_webhook")
 async def midtrans_webhook(request: Request, on_settlement=None):
     """
     Webhook Midtrans generik
     on_settlement: callback async yang dipanggil saat transaction_status = 'settlement'
     """
-    logger.info("📥 Endpoint /midtrans dipanggil!")
+    logger.debug("📥 Endpoint /midtrans dipanggil!")
 
     try:
-        body = await request.json()
-        logger.info(f"📩 Webhook Midtrans diterima:\n{body}")
-
-        order_id = body.get("order_id")
-        if not order_id:
-            logger.warning("⚠️ order_id tidak ditemukan dalam body!")
-            return {"message": "order_id kosong"}
-
-        transaction_status = body.get("transaction_status")
-        settlement_time = body.get("settlement_time", datetime.utcnow().isoformat())
-
-        # Update data transaksi di tabel Transactions
-        update_data = {
-            "transaction_status": transaction_status,
-            "fraud_status": body.get("fraud_status"),
-            "settlement_time": settlement_time,
-            "transaction_id": body.get("transaction_id"),
-            "payment_type": body.get("payment_type"),
-            "currency": body.get("currency"),
-            "transaction_time": body.get("transaction_time"),
-            "status_message": body.get("status_message"),
-            "signature_key": body.get("signature_key"),
-            "merchant_id": body.get("merchant_id"),
-        }
-
-        # Ambil transaksi dari DB
-        res = (
-            supabase.table("Transactions")
-            .select("*")
-            .eq("order_id", order_id)
-            .execute()
+        raw = await request.body()
+        payload = MidtransPayment.decode(raw)
+        logger.info(
+            "📩 Webhook Midtrans diterima: %s", fields(payload.raw, MIDTRANS_LOG_FIELDS),
+            extra={"event": "webhook.received", "gateway": "midtrans"},
         )
-        transaction = res.data[0] if res.data else None
-        if not transaction:
-            logger.warning(f"❌ Transaksi dengan order_id {order_id} tidak ditemukan.")
-            return {"message": "Transaksi tidak ditemukan"}
 
-        # Update transaksi
-        supabase.table("Transactions").update(update_data).eq(
-            "order_id", order_id
-        ).execute()
-        logger.info(f"📝 Transaksi {order_id} berhasil diupdate.")
+        if await journal_ack(MIDTRANS_PAYMENT, raw, on_settlement):
+            return {"message": "OK"}
+        if fast_ack(process_midtrans_payment, payload, on_settlement):
+            return {"message": "OK"}
 
-        # Jalankan callback opsional jika settlement
-        if transaction_status == "settlement" and on_settlement:
-            await on_settlement(transaction, body)
-
-        return {"message": "OK"}
+        return await process_midtrans_payment(payload, on_settlement)
 
-    except Exception as e:
+    except PayloadError as e:
+        logger.warning("⚠️ Body webhook Midtrans invalid: %s", e)
+        return {"message": str(e)}
+    except HTTPException:
+        raise
+    except Exception:
+        # 5xx supaya Midtrans mengirim ulang webhook; balas 200 di sini = event hilang
         logger.exception("❌ Gagal memproses webhook Midtrans")
-        return {"message": f"Error: {e}"}
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -0,0 +1,249 @@
+# 📍 payments/webhooks/schemas.py
+"""
+Schema payload webhook (dataclass slots), di-decode langsung dari body
+mentah. Decode, validasi field wajib dan mapping ke kolom DB dikerjakan
+sekali jalan di from_dict(); handler & worker pipeline cukup pakai
+`payload.changes()`.
+
+`raw` tetap menyimpan dict asli supaya callback user (on_settlement dll.)
+menerima body yang sama seperti sebelumnya. `partition_key` menentukan
+partisi pipeline fast-ack (urutan per entity, lihat lib/pipeline).
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from lib import codec
+
+
+class PayloadError(ValueError):
+    """Body webhook tidak bisa di-decode atau field wajib kosong."""
+
+
+def _decode_object(raw: bytes) -> dict:
+    try:
+        data = codec.loads(raw)
+    except codec.DecodeError as e:
+        raise PayloadError(f"JSON invalid: {e}") from None
+    if not isinstance(data, dict):
+        raise PayloadError("Body harus JSON object")
+    return data
+
+
+@dataclass(slots=True, frozen=True)
+class MidtransPayment:
+    order_id: str
+    transaction_status: str | None
+    transaction_id: str | None
+    fraud_status: str | None
+    payment_type: str | None
+    currency: str | None
+    transaction_time: str | None
+    settlement_time: str | None
+    status_message: str | None
+    signature_key: str | None
+    merchant_id: str | None
+    raw: dict = field(repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, body: dict) -> "MidtransPayment":
+        get = body.get
+        order_id = get("order_id")
+        if not order_id:
+            raise PayloadError("order_id kosong")
+        return cls(
+            order_id, get("transaction_status"), get("transaction_id"), get("fraud_status"),
+            get("payment_type"), get("currency"), get("transaction_time"), get("settlement_time"),
+            get("status_message"), get("signature_key"), get("merchant_id"), body,
+        )
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "MidtransPayment":
+        return cls.from_dict(_decode_object(raw))
+
+    @property
+    def partition_key(self) -> str:
+        return str(self.order_id)
+
+    def changes(self) -> dict:
+        """Kolom Transactions yang di-update."""
+        return {
+            "transaction_status": self.transaction_status,
+            "fraud_status": self.fraud_status,
+            "settlement_time": self.settlement_time or datetime.utcnow().isoformat(),
+            "transaction_id": self.transaction_id,
+            "payment_type": self.payment_type,
+            "currency": self.currency,
+            "transaction_time": self.transaction_time,
+            "status_message": self.status_message,
+            "signature_key": self.signature_key,
+            "merchant_id": self.merchant_id,
+        }
+
+
+@dataclass(slots=True, frozen=True)
+class FlipPayment:
+    id: str
+    status: str | None
+    amount: int | None
+    currency: str | None
+    source_bank: str | None
+    destination_bank: str | None
+    account_number: str | None
+    account_name: str | None
+    created_at: str | None
+    raw: dict = field(repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, body: dict) -> "FlipPayment":
+        get = body.get
+        transaction_id = get("id")
+        if not transaction_id:
+            raise PayloadError("transaction_id kosong")
+        return cls(
+            transaction_id, get("status"), get("amount"), get("currency"), get("source_bank"),
+            get("destination_bank"), get("account_number"), get("account_name"), get("created_at"), body,
+        )
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "FlipPayment":
+        return cls.from_dict(_decode_object(raw))
+
+    @property
+    def partition_key(self) -> str:
+        return str(self.id)
+
+    def changes(self) -> dict:
+        return {
+            "transaction_status": self.status,
+            "amount": self.amount,
+            "currency": self.currency,
+            "source_bank": self.source_bank,
+            "destination_bank": self.destination_bank,
+            "account_number": self.account_number,
+            "account_name": self.account_name,
+            "transaction_time": self.created_at or datetime.utcnow().isoformat(),
+        }
+
+
+# Status callback payout gateway → Payouts.status (lihat PAYOUT_RANKS). Status
+# lain (pending / queued / approved / ...) belum final → "processed", supaya
+# callback final yang datang belakangan tidak ditolak rank guard.
+IRIS_PAYOUT_STATUS = {"success": "success", "completed": "success", "failed": "failed", "rejected": "failed"}
+FLIP_PAYOUT_STATUS = {"DONE": "success", "CANCELLED": "failed", "FAILED": "failed"}
+PAYOUT_IN_PROGRESS = "processed"
+
+
+def _payout_changes(status: str) -> dict:
+    return {"status": status, "payout_status": status}
+
+
+@dataclass(slots=True, frozen=True)
+class IrisDisbursement:
+    reference_no: str
+    status: str
+    raw: dict = field(repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "IrisDisbursement":
+        # Reference ID: production / sandbox
+        reference_no = payload.get("id") or payload.get("disbursement_id") or payload.get("reference_no")
+        status = payload.get("status")  # success / pending / failed / test
+        if not reference_no or not status:
+            raise PayloadError("Missing disbursement_id atau status di payload")
+        return cls(reference_no, "success" if status.lower() == "test" else status, payload)
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "IrisDisbursement":
+        return cls.from_dict(_decode_object(raw))
+
+    @property
+    def partition_key(self) -> str:
+        return str(self.reference_no)
+
+    @property
+    def payout_status(self) -> str:
+        return IRIS_PAYOUT_STATUS.get(self.status.lower(), PAYOUT_IN_PROGRESS)
+
+    @property
+    def final(self) -> bool:
+        return self.payout_status != PAYOUT_IN_PROGRESS
+
+    @property
+    def success(self) -> bool:
+        return self.payout_status == "success"
+
+    def changes(self) -> dict:
+        return _payout_changes(self.payout_status)
+
+
+@dataclass(slots=True, frozen=True)
+class FlipDisbursement:
+    id: str
+    status: str
+    raw: dict = field(repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FlipDisbursement":
+        disbursement_id, status = data.get("id"), data.get("status")  # DONE / CANCELLED
+        if not disbursement_id or not status:
+            raise PayloadError("Payload Flip callback invalid")
+        return cls(disbursement_id, status, data)
+
+    @staticmethod
+    def split_form(raw: bytes) -> tuple[bytes, str]:
+        """
+        Body callback Flip: form-urlencoded `data=<json>&token=<callback token>`.
+        Return (data, token); token dicek handler sebelum data di-decode.
+        """
+        form = dict(parse_qsl(raw.decode()))
+        data, token = form.get("data"), form.get("token")
+        if not data or not token:
+            raise PayloadError("Payload Flip callback invalid")
+        return data.encode(), token
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "FlipDisbursement":
+        return cls.from_dict(_decode_object(raw))
+
+    @property
+    def partition_key(self) -> str:
+        return str(self.id)
+
+    @property
+    def payout_status(self) -> str:
+        return FLIP_PAYOUT_STATUS.get(self.status.upper(), PAYOUT_IN_PROGRESS)
+
+    @property
+    def final(self) -> bool:
+        return self.payout_status != PAYOUT_IN_PROGRESS
+
+    @property
+    def success(self) -> bool:
+        return self.payout_status == "success"
+
+    def changes(self) -> dict:
+        return _payout_changes(self.payout_status)
+
+
+@dataclass(slots=True, frozen=True)
+class FlipInquiry:
+    inquiry_key: str
+    bank_code: str | None
+    account_number: str | None
+    account_holder: str | None
+    status: str
+    raw: dict = field(repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FlipInquiry":
+        get = data.get
+        inquiry_key, status = get("inquiry_key"), get("status")  # SUCCESS / INVALID_ACCOUNT_NUMBER / ...
+        if not inquiry_key or not status:
+            raise PayloadError("Payload Flip inquiry callback invalid")
+        return cls(inquiry_key, get("bank_code"), get("account_number"), get("account_holder"), status, data)
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "FlipInquiry":
+        return cls.from_dict(_decode_object(raw))